@@ -0,0 +1,299 @@
+"""ASGI entry point that serves the JSON task API with async SQLAlchemy sessions.
+
+Run it with an ASGI worker, for example::
+
+    GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn -c gunicorn.conf.py app.asgi:app
+
+JSON requests to the task endpoints are handled on the event loop, so a slow
+query only parks one coroutine instead of a whole worker. Everything else
+(HTMX fragments, streaming, batch, health, metrics, the index page) is passed
+through to the regular Flask app running in a thread pool. Responses carry
+the same validators as the Flask views, answer conditional GETs with 304 and
+are compressed by the Flask app's compressor.
+"""
+import json
+import logging
+import re
+from datetime import datetime
+from urllib.parse import parse_qs
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from werkzeug.http import parse_accept_header
+from werkzeug.sansio.http import is_resource_modified
+from werkzeug.wrappers import Response
+from app.conditional import collection_validators, latest_change, task_validators, version_of
+from app.engine import engine_options as profile_options, init_engine
+from app.events import task_event
+from app.models import Task
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, parse_limit
+from app.queries import build_select, decode_keyset, encode_keyset, parse_task_query, row_to_dict
+
+logger = logging.getLogger('app')
+
+TASK_PATH = re.compile(r'^/api/tasks/(\d+)$')
+
+# Sync drivers in DATABASE_URL mapped to their asyncio counterparts
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'sqlite+pysqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'postgresql+psycopg2': 'postgresql+asyncpg',
+}
+
+
+def async_database_url(database_url):
+    """Rewrite a sync SQLAlchemy URL to use the matching asyncio driver."""
+    url = make_url(database_url)
+    driver = ASYNC_DRIVERS.get(url.drivername, url.drivername)
+    return url.set(drivername=driver).render_as_string(hide_password=False)
+
+
+class AsyncTaskAPI:
+    """ASGI application handling JSON task requests with an async engine."""
+
+    def __init__(self, flask_app, database_url=None, engine_options=None):
+        from asgiref.wsgi import WsgiToAsgi
+
+        self.flask_app = flask_app
+        self.fallback = WsgiToAsgi(flask_app)
+        # Same pool sizing, pragmas and pool metrics as the Flask app's engine
+        url = async_database_url(database_url or flask_app.config['SQLALCHEMY_DATABASE_URI'])
+        options = profile_options(url, flask_app.config)
+        options.update(engine_options or {})
+        self.engine = create_async_engine(url, **options)
+        init_engine(self.engine.sync_engine, flask_app.config, getattr(flask_app, 'pool_metrics', None))
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+
+        if scope['type'] == 'http':
+            handler = self.route(scope)
+            if handler is not None:
+                return await self.dispatch(handler, scope, receive, send)
+
+        await self.fallback(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def route(self, scope):
+        """Pick the async handler for a request, or None to use the Flask app."""
+        headers = dict(scope.get('headers') or [])
+        if b'hx-request' in headers:
+            return None
+        method = scope['method']
+        path = scope['path']
+
+        if path == '/api/tasks':
+            query = self._query_args(scope)
+            if method == 'GET' and 'stream' not in query \
+                    and b'ndjson' not in headers.get(b'accept', b''):
+                return self.list_tasks
+            if method == 'POST' and headers.get(b'content-type', b'').startswith(b'application/json'):
+                return self.create_task
+            return None
+
+        match = TASK_PATH.match(path)
+        if match:
+            return {
+                'GET': self.get_task,
+                'PUT': self.update_task,
+                'DELETE': self.delete_task,
+            }.get(method)
+        return None
+
+    async def dispatch(self, handler, scope, receive, send):
+        body = b''
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+
+        try:
+            status, payload, *validators = await handler(scope, body)
+        except Exception as e:
+            logger.error(f"Error handling {scope['method']} {scope['path']}: {str(e)}")
+            status, payload, validators = 500, {"error": str(e)}, None
+
+        response = Response(status=status)
+        if payload is not None:
+            response.set_data(self.flask_app.json.dumps(payload))
+            response.mimetype = 'application/json'
+        else:
+            del response.headers['Content-Type']
+        if validators:
+            etag, last_modified = validators[0]
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            # HTMX requests get HTML from the Flask app
+            response.vary.add('HX-Request')
+        compressor = getattr(self.flask_app, 'compressor', None)
+        if compressor is not None:
+            accept_encoding = self._header(scope, b'accept-encoding')
+            compressor.compress(response, parse_accept_header(accept_encoding))
+
+        headers = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response.headers]
+        await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': response.get_data()})
+
+    @staticmethod
+    def _header(scope, name):
+        for key, value in scope.get('headers') or []:
+            if key == name:
+                return value.decode('latin-1')
+        return None
+
+    def _not_modified(self, scope, etag, last_modified):
+        """Check the request's If-None-Match/If-Modified-Since against the validators."""
+        return not is_resource_modified(
+            http_if_none_match=self._header(scope, b'if-none-match'),
+            http_if_modified_since=self._header(scope, b'if-modified-since'),
+            etag=etag, last_modified=last_modified,
+        )
+
+    def _count(self, operation):
+        self.flask_app.task_counter.labels(operation=operation).inc()
+
+    def _publish(self, event):
+        if self.flask_app.task_events is not None:
+            self.flask_app.task_events.publish([event])
+
+    @staticmethod
+    def _query_args(scope):
+        """First value of each query parameter, blank ones included as Flask's ``request.args`` does."""
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True)
+        return {name: values[0] for name, values in query.items()}
+
+    @staticmethod
+    def _task_id(scope):
+        return int(TASK_PATH.match(scope['path']).group(1))
+
+    async def list_tasks(self, scope, body):
+        args = self._query_args(scope)
+        paged = 'limit' in args or 'cursor' in args
+        limit = after = None
+        try:
+            query = parse_task_query(args)
+            if paged:
+                limit = parse_limit(
+                    args.get('limit'),
+                    default=self.flask_app.config.get('TASKS_PAGE_SIZE', DEFAULT_PAGE_SIZE),
+                    maximum=self.flask_app.config.get('TASKS_MAX_PAGE_SIZE', MAX_PAGE_SIZE),
+                )
+                cursor = args.get('cursor')
+                after = decode_keyset(query, cursor) if cursor else None
+        except ValueError as e:
+            return 400, {"error": str(e)}
+
+        # Fetch one extra row to learn whether another page exists
+        statement = build_select(query, self.engine.dialect.name, after=after,
+                                 limit=limit + 1 if limit else None)
+        async with self.sessions() as session:
+            version = version_of((await session.execute(latest_change())).first())
+            validators = collection_validators('json', scope.get('query_string', b'').decode('latin-1'), version)
+            if self._not_modified(scope, *validators):
+                self._count('read')
+                return 304, None, validators
+            rows = (await session.execute(statement)).all()
+
+        self._count('read')
+        if not paged:
+            return 200, [row_to_dict(row, query.fields) for row in rows], validators
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_keyset(query, rows[-1])
+        return 200, {'tasks': [row_to_dict(row, query.fields) for row in rows], 'next_cursor': next_cursor}, validators
+
+    async def create_task(self, scope, body):
+        try:
+            data = json.loads(body or b'null')
+        except ValueError:
+            return 400, {"error": "Invalid JSON body"}
+        if not isinstance(data, dict) or 'title' not in data:
+            return 400, {"error": "Title is required"}
+        if not isinstance(data['title'], str):
+            return 400, {"error": "Title must be a string"}
+
+        try:
+            task = Task(title=data['title'], description=data.get('description', ''))
+        except ValueError as e:
+            return 400, {"error": str(e)}
+
+        async with self.sessions() as session:
+            session.add(task)
+            await session.commit()
+
+        self._publish(task_event('create', task.id, task.to_dict()))
+        self._count('create')
+        logger.info(f"Created new task: {task.title}")
+        return 201, task.to_dict()
+
+    async def get_task(self, scope, body):
+        async with self.sessions() as session:
+            task = await session.get(Task, self._task_id(scope))
+        if not task:
+            return 404, {"error": "Task not found"}
+        self._count('read')
+        validators = task_validators(task, 'json')
+        if self._not_modified(scope, *validators):
+            return 304, None, validators
+        return 200, task.to_dict(), validators
+
+    async def update_task(self, scope, body):
+        task_id = self._task_id(scope)
+        async with self.sessions() as session:
+            task = await session.get(Task, task_id)
+            if not task:
+                return 404, {"error": "Task not found"}
+            task.done = not task.done
+            task.updated_at = datetime.utcnow()
+            await session.commit()
+
+        self._publish(task_event('update', task_id, task.to_dict()))
+        self._count('update')
+        logger.info(f"Updated task {task_id} completion status to {task.done}")
+        return 200, task.to_dict()
+
+    async def delete_task(self, scope, body):
+        task_id = self._task_id(scope)
+        async with self.sessions() as session:
+            task = await session.get(Task, task_id)
+            if not task:
+                return 404, {"error": "Task not found"}
+            await session.delete(task)
+            await session.commit()
+
+        self._publish(task_event('delete', task_id))
+        self._count('delete')
+        logger.info(f"Deleted task {task_id}")
+        return 204, None
+
+
+def create_asgi_app(flask_app=None):
+    """Wrap a Flask app (by default a new one from create_app) in the async API."""
+    if flask_app is None:
+        from app.main import create_app
+        flask_app = create_app()[0]
+    return AsyncTaskAPI(flask_app)
+
+
+def __getattr__(name):
+    """Create the global ASGI app on first access, so importing is side-effect free."""
+    if name != 'app':
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    global app
+    app = create_asgi_app()
+    return app
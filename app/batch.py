@@ -0,0 +1,151 @@
+from datetime import datetime
+from sqlalchemy import delete, insert, select, update
+from app.changes import record_changes
+from app.database import db
+from app.models import Task
+
+OPERATIONS = ('create', 'update', 'delete')
+
+# Upper bound on operations accepted in one batch request
+MAX_BATCH_OPERATIONS = 5000
+
+
+class BatchValidationError(Exception):
+    """Raised when one or more operations in a batch are invalid."""
+
+    def __init__(self, errors):
+        super().__init__("Batch validation failed")
+        self.errors = errors
+
+
+def _clean_description(description):
+    if description is None:
+        return ''
+    if not isinstance(description, str):
+        raise ValueError("Description must be a string")
+    if len(description) > 500:
+        raise ValueError("Description cannot be longer than 500 characters")
+    return description
+
+
+def _validate_operation(item):
+    """Validate one operation and return it in normalised form."""
+    if not isinstance(item, dict):
+        raise ValueError("Operation must be an object")
+    op = item.get('op')
+    if op not in OPERATIONS:
+        raise ValueError(f"Operation must be one of: {', '.join(OPERATIONS)}")
+
+    if op == 'create':
+        if 'title' not in item:
+            raise ValueError("Title is required")
+        return {
+            'op': op,
+            'title': Task.clean_title(item['title']),
+            'description': _clean_description(item.get('description')),
+        }
+
+    task_id = item.get('id')
+    if not isinstance(task_id, int) or isinstance(task_id, bool):
+        raise ValueError("Task id must be an integer")
+    if op == 'delete':
+        return {'op': op, 'id': task_id}
+
+    return {'op': op, 'id': task_id, 'values': _update_values(item)}
+
+
+def _update_values(item):
+    """Validate the fields an update operation sets."""
+    values = {}
+    if 'title' in item:
+        values['title'] = Task.clean_title(item['title'])
+    if 'description' in item:
+        values['description'] = _clean_description(item['description'])
+    if 'done' in item:
+        if not isinstance(item['done'], bool):
+            raise ValueError("Done must be a boolean")
+        values['done'] = item['done']
+    if not values:
+        raise ValueError("Update requires at least one of: title, description, done")
+    return values
+
+
+def validate_batch(items):
+    """Validate every operation up front so that nothing is applied on error."""
+    operations = []
+    errors = []
+    referenced = {}
+    for index, item in enumerate(items):
+        try:
+            operation = _validate_operation(item)
+        except ValueError as e:
+            errors.append({'index': index, 'status': 400, 'error': str(e)})
+            continue
+        if 'id' in operation:
+            if operation['id'] in referenced:
+                errors.append({
+                    'index': index,
+                    'status': 400,
+                    'error': f"Task {operation['id']} is referenced more than once"
+                })
+                continue
+            referenced[operation['id']] = index
+        operations.append((index, operation))
+
+    if referenced:
+        existing = set(db.session.scalars(
+            select(Task.id).where(Task.id.in_(list(referenced)))
+        ))
+        for task_id, index in referenced.items():
+            if task_id not in existing:
+                errors.append({'index': index, 'status': 404, 'error': "Task not found"})
+
+    if errors:
+        raise BatchValidationError(sorted(errors, key=lambda error: error['index']))
+    return operations
+
+
+def apply_batch(operations):
+    """Apply validated operations with one statement per kind and a single commit."""
+    now = datetime.utcnow()
+    creates = [(index, op) for index, op in operations if op['op'] == 'create']
+    updates = [(index, op) for index, op in operations if op['op'] == 'update']
+    deletes = [(index, op) for index, op in operations if op['op'] == 'delete']
+    results = {}
+
+    if creates:
+        rows = [{
+            'title': op['title'],
+            'description': op['description'],
+            'done': False,
+            'created_at': now,
+            'updated_at': now,
+        } for _, op in creates]
+        new_ids = db.session.scalars(
+            insert(Task).returning(Task.id, sort_by_parameter_order=True), rows
+        ).all()
+        for (index, _), task_id in zip(creates, new_ids):
+            results[index] = {'index': index, 'op': 'create', 'status': 201, 'id': task_id}
+
+    if updates:
+        db.session.execute(
+            update(Task),
+            [dict(op['values'], id=op['id'], updated_at=now) for _, op in updates]
+        )
+        for index, op in updates:
+            results[index] = {'index': index, 'op': 'update', 'status': 200, 'id': op['id']}
+
+    if deletes:
+        db.session.execute(
+            delete(Task).where(Task.id.in_([op['id'] for _, op in deletes]))
+        )
+        for index, op in deletes:
+            results[index] = {'index': index, 'op': 'delete', 'status': 204, 'id': op['id']}
+
+    # Bulk statements skip the ORM flush hooks, so log the changes here
+    record_changes(db.session.connection(), [
+        (result['id'], 'delete' if result['op'] == 'delete' else 'upsert')
+        for result in results.values()
+    ])
+    db.session.commit()
+    return [results[index] for index, _ in operations]
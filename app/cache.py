@@ -0,0 +1,138 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """In-process LRU cache with a per-entry time to live."""
+
+    def __init__(self, max_entries=1024, ttl=30, on_evict=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        evicted = 0
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        if evicted and self.on_evict:
+            self.on_evict(evicted)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SharedCache:
+    """Cache stored in a shared key/value server reached through a redis-style client.
+
+    The client only needs ``get``, ``set(key, value, ex=seconds)`` and
+    ``delete``, so a small in-memory stand-in works for local runs and tests.
+    """
+
+    def __init__(self, client, ttl=30, prefix='task-cache:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=ttl or None)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+
+class TaskCache:
+    """Read-through cache for task responses, keyed on their validators.
+
+    A list's ETag comes from the latest sequence number in the task change
+    log and a task's from its ``updated_at``; both are read from the database
+    before the cache is consulted. A write made through any worker therefore
+    changes the key every worker looks up, so nothing needs invalidating:
+    superseded entries are never read again and fall out of the LRU or expire
+    after the TTL. A response is stored under the version read before it was
+    built, so a write racing the read can only file newer data under an old
+    key.
+    """
+
+    def __init__(self, backend, counter=None):
+        self.backend = backend
+        self.counter = counter
+
+    def _count(self, event, amount=1):
+        if self.counter is not None:
+            self.counter.labels(event=event).inc(amount)
+
+    def response_key(self, etag):
+        return f'response:{etag}'
+
+    def get(self, key):
+        value = self.backend.get(key)
+        self._count('hit' if value is not None else 'miss')
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value)
+
+
+def create_task_cache(config, counter=None):
+    """Build the task cache described by the app config, or None if disabled."""
+    backend_name = config.get('TASK_CACHE_BACKEND', 'memory')
+    ttl = config.get('TASK_CACHE_TTL', 30)
+
+    if backend_name in (None, '', 'none'):
+        return None
+    if backend_name == 'memory':
+        backend = LRUCache(
+            max_entries=config.get('TASK_CACHE_MAX_ENTRIES', 1024),
+            ttl=ttl,
+            on_evict=lambda count: counter.labels(event='eviction').inc(count) if counter else None
+        )
+    elif backend_name == 'shared':
+        client = config.get('TASK_CACHE_CLIENT')
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError("TASK_CACHE_BACKEND=shared needs the redis package or TASK_CACHE_CLIENT")
+            client = redis.Redis.from_url(config.get('TASK_CACHE_URL', 'redis://localhost:6379/0'))
+        backend = SharedCache(client, ttl=ttl)
+    else:
+        raise ValueError(f"Unknown TASK_CACHE_BACKEND: {backend_name}")
+
+    return TaskCache(backend, counter)
@@ -0,0 +1,125 @@
+from datetime import datetime
+import click
+from sqlalchemy import delete, event, func, insert, select, text
+from sqlalchemy.orm import Session
+from app.database import db
+from app.migrate import db_cli
+from app.models import Task, TaskChange
+from app.pagination import InvalidCursor, decode_cursor, encode_cursor
+from app.queries import FIELDS, row_to_dict
+
+
+# Postgres advisory lock serialising change log writers (the migration lock
+# in app.migrate is 7243871)
+CHANGE_LOG_LOCK_ID = 7243872
+
+
+def record_changes(connection, changes):
+    """Append ``(task_id, op)`` pairs to the change log on ``connection``.
+
+    On Postgres the transaction first takes CHANGE_LOG_LOCK_ID until it
+    commits or rolls back. A sequence number is only drawn by the lock
+    holder, so entries become visible in sequence order: a reader that has
+    seen seq N will never later find a committed entry below N. SQLite
+    already allows a single writer at a time.
+    """
+    if not changes:
+        return
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': CHANGE_LOG_LOCK_ID})
+    now = datetime.utcnow()
+    connection.execute(
+        insert(TaskChange.__table__),
+        [{'task_id': task_id, 'op': op, 'changed_at': now} for task_id, op in changes]
+    )
+
+
+@event.listens_for(Session, 'after_flush')
+def record_flushed_changes(session, flush_context):
+    """Log every Task the ORM inserted, updated or deleted in this flush.
+
+    Bulk statements bypass flush events, so callers issuing them must use
+    record_changes themselves.
+    """
+    changes = [(obj.id, 'upsert') for obj in session.new if isinstance(obj, Task)]
+    changes += [(obj.id, 'upsert') for obj in session.dirty
+                if isinstance(obj, Task) and session.is_modified(obj)]
+    changes += [(obj.id, 'delete') for obj in session.deleted if isinstance(obj, Task)]
+    record_changes(session.connection(), changes)
+
+
+def encode_since(seq):
+    return encode_cursor({'seq': seq})
+
+
+def decode_since(token):
+    """Return the change sequence a sync token points at; no token means from the start."""
+    if not token:
+        return 0
+    seq = decode_cursor(token).get('seq')
+    if not isinstance(seq, int) or isinstance(seq, bool) or seq < 0:
+        raise InvalidCursor("Invalid sync token")
+    return seq
+
+
+def read_changes(since, limit):
+    """Return (changes, last seq, has_more) for up to ``limit`` log entries after ``since``.
+
+    Several entries for one task collapse into its latest state: the current
+    row for an upsert, or a tombstone for a delete. If a later page deletes a
+    task, it is simply skipped here and delivered as a tombstone there.
+
+    Sync tokens can skip nothing because record_changes makes entries
+    commit in sequence order, including those of long batch transactions.
+    """
+    entries = db.session.execute(
+        select(TaskChange.seq, TaskChange.task_id, TaskChange.op)
+        .where(TaskChange.seq > since)
+        .order_by(TaskChange.seq)
+        .limit(limit + 1)
+    ).all()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    if not entries:
+        return [], since, False
+
+    latest = {}
+    for entry in entries:
+        latest.pop(entry.task_id, None)
+        latest[entry.task_id] = entry
+
+    upserts = [task_id for task_id, entry in latest.items() if entry.op == 'upsert']
+    rows = {}
+    if upserts:
+        rows = {row.id: row for row in db.session.execute(
+            select(*[getattr(Task, field) for field in FIELDS]).where(Task.id.in_(upserts))
+        )}
+
+    changes = []
+    for task_id, entry in latest.items():
+        if entry.op == 'delete':
+            changes.append({'op': 'delete', 'id': task_id})
+        elif task_id in rows:
+            changes.append({'op': 'upsert', 'task': row_to_dict(rows[task_id], FIELDS)})
+    return changes, entries[-1].seq, has_more
+
+
+def compact_changes():
+    """Delete log entries superseded by a later entry for the same task.
+
+    The latest entry per task (including tombstones) is kept, so every sync
+    token stays valid. Returns the number of entries removed.
+    """
+    latest = select(func.max(TaskChange.seq)).group_by(TaskChange.task_id)
+    result = db.session.execute(
+        delete(TaskChange).where(TaskChange.seq.not_in(latest)),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+@db_cli.command('compact-changes')
+def compact_changes_command():
+    """Remove superseded task change log entries."""
+    click.echo(f"Removed {compact_changes()} superseded change(s)")
@@ -0,0 +1,214 @@
+"""Response compression.
+
+Responses of a compressible type (JSON, NDJSON, HTML and other text) are
+compressed with the encoding the client prefers among COMPRESSION_ALGORITHMS.
+Brotli and zstd are used when their packages are installed; gzip is always
+available. Bodies shorter than COMPRESSION_MIN_SIZE are sent as they are.
+
+Streamed responses, such as the NDJSON export, are compressed chunk by chunk
+and every chunk is flushed, so rows still reach the client as they are
+produced. The event stream is left alone: its keep-alives must not wait in a
+compressor.
+
+Levels are tuned per content type (COMPRESSION_LEVELS). Bodies built in one
+piece use levels that pay for themselves on large task lists; the NDJSON
+export uses the fastest level so the compressor keeps up with the database.
+"""
+import logging
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - exercised when brotli is missing
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - exercised when zstandard is missing
+    zstandard = None
+
+logger = logging.getLogger('app')
+
+COMPRESSION_MIN_SIZE = 500
+
+# Preference order when the client accepts several encodings equally
+COMPRESSION_ALGORITHMS = ('br', 'zstd', 'gzip')
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/x-ndjson',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/xml',
+    'text/javascript',
+}
+
+# Levels for types without an entry below
+DEFAULT_LEVELS = {'gzip': 6, 'br': 4, 'zstd': 3}
+
+COMPRESSION_LEVELS = {
+    'application/json': {'gzip': 6, 'br': 5, 'zstd': 6},
+    'text/html': {'gzip': 6, 'br': 5, 'zstd': 6},
+    'application/x-ndjson': {'gzip': 1, 'br': 1, 'zstd': 1},
+}
+
+
+class GzipEncoder:
+    """gzip framing around zlib, flushed with Z_SYNC_FLUSH."""
+
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliEncoder:
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class ZstdEncoder:
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+ENCODERS = {'gzip': GzipEncoder}
+if brotli is not None:
+    ENCODERS['br'] = BrotliEncoder
+if zstandard is not None:
+    ENCODERS['zstd'] = ZstdEncoder
+
+
+class Compressor:
+    """Negotiates an encoding and compresses Flask responses."""
+
+    def __init__(self, algorithms=COMPRESSION_ALGORITHMS, min_size=COMPRESSION_MIN_SIZE,
+                 levels=None, mimetypes=COMPRESSIBLE_MIMETYPES):
+        self.algorithms = [name for name in algorithms if name in ENCODERS]
+        self.min_size = min_size
+        self.levels = {**COMPRESSION_LEVELS, **(levels or {})}
+        self.mimetypes = set(mimetypes)
+
+    def level(self, mimetype, algorithm):
+        return self.levels.get(mimetype, {}).get(algorithm, DEFAULT_LEVELS[algorithm])
+
+    def negotiate(self, accept_encodings):
+        """Pick the accepted encoding, preferring ``algorithms`` order on ties."""
+        best = None
+        best_quality = 0
+        for name in self.algorithms:
+            quality = accept_encodings[name]
+            if quality > best_quality:
+                best, best_quality = name, quality
+        return best
+
+    def should_compress(self, response):
+        if response.status_code < 200 or response.status_code in (204, 206, 304):
+            return False
+        if 'Content-Encoding' in response.headers or response.direct_passthrough:
+            return False
+        if response.mimetype not in self.mimetypes:
+            return False
+        if 'no-transform' in (response.headers.get('Cache-Control') or ''):
+            return False
+        return True
+
+    def compress(self, response, accept_encodings):
+        """Compress ``response`` in place if it qualifies and return it."""
+        if not self.should_compress(response):
+            return response
+        # Whether or not this response ends up compressed, another client's
+        # copy of it may be
+        response.vary.add('Accept-Encoding')
+        algorithm = self.negotiate(accept_encodings)
+        if algorithm is None:
+            return response
+        encoder = ENCODERS[algorithm](self.level(response.mimetype, algorithm))
+
+        if response.is_streamed:
+            response.response = self._stream(response.response, encoder)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            response.set_data(encoder.compress(data) + encoder.finish())
+
+        response.headers['Content-Encoding'] = algorithm
+        # The bytes differ from the uncompressed representation
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    @staticmethod
+    def _stream(chunks, encoder):
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                data = encoder.compress(chunk) + encoder.flush()
+                if data:
+                    yield data
+            yield encoder.finish()
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+
+
+def init_compression(app):
+    """Compress responses according to the COMPRESSION_* settings."""
+    if not app.config.get('COMPRESSION_ENABLED', True):
+        return None
+    algorithms = app.config.get('COMPRESSION_ALGORITHMS', COMPRESSION_ALGORITHMS)
+    if isinstance(algorithms, str):
+        algorithms = [name.strip() for name in algorithms.split(',') if name.strip()]
+    unknown = [name for name in algorithms if name not in COMPRESSION_ALGORITHMS]
+    if unknown:
+        raise ValueError(f"Unknown COMPRESSION_ALGORITHMS: {', '.join(unknown)}")
+    compressor = Compressor(
+        algorithms=algorithms,
+        min_size=app.config.get('COMPRESSION_MIN_SIZE', COMPRESSION_MIN_SIZE),
+        levels=app.config.get('COMPRESSION_LEVELS'),
+    )
+    missing = [name for name in algorithms if name not in compressor.algorithms]
+    if missing:
+        logger.info(f"Compression packages not installed, skipping: {', '.join(missing)}")
+    app.compressor = compressor
+
+    @app.after_request
+    def compress_response(response):
+        return compressor.compress(response, request.accept_encodings)
+
+    return compressor
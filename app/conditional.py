@@ -0,0 +1,60 @@
+import hashlib
+from flask import Response, request
+from sqlalchemy import select
+from werkzeug.http import is_resource_modified
+from app.database import db
+from app.models import TaskChange
+
+
+def _digest(*parts):
+    return hashlib.sha1(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def task_validators(task, variant):
+    """Return the (etag, last_modified) pair for one task representation."""
+    updated_at = task.updated_at.isoformat() if task.updated_at else ''
+    return _digest('task', task.id, updated_at, variant), task.updated_at
+
+
+def latest_change():
+    """SELECT of the latest (seq, changed_at) in the task change log."""
+    return select(TaskChange.seq, TaskChange.changed_at).order_by(TaskChange.seq.desc()).limit(1)
+
+
+def collection_version():
+    """Read the latest (seq, changed_at) from the task change log.
+
+    Every create, update and delete appends to the log, so its highest
+    sequence number moves whenever any listed task does. Writers append
+    under app.changes.CHANGE_LOG_LOCK_ID, so on Postgres every commit
+    raises it: an entry can never commit below one that is already
+    visible and leave the version, the ETag and cached lists unchanged.
+    Reading it is a single primary key lookup.
+    """
+    return version_of(db.session.execute(latest_change()).first())
+
+
+def version_of(latest):
+    """The (seq, changed_at) version for a ``latest_change()`` row; (0, None) for an empty log."""
+    return (latest.seq, latest.changed_at) if latest else (0, None)
+
+
+def collection_validators(variant, query_string, version=None):
+    """Return the (etag, last_modified) pair for a task list representation."""
+    seq, changed_at = version if version is not None else collection_version()
+    return _digest('tasks', seq, variant, query_string), changed_at
+
+
+def is_not_modified(etag, last_modified=None):
+    """Check the request's If-None-Match/If-Modified-Since against the validators."""
+    return not is_resource_modified(request.environ, etag=etag, last_modified=last_modified)
+
+
+def not_modified_response(etag, last_modified=None):
+    """Build an empty 304 response carrying the current validators."""
+    response = Response(status=304)
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.vary.add('HX-Request')
+    return response
@@ -22,10 +22,94 @@ class Config:
     if SQLALCHEMY_DATABASE_URI and SQLALCHEMY_DATABASE_URI.startswith('postgres://'):
         SQLALCHEMY_DATABASE_URI = SQLALCHEMY_DATABASE_URI.replace('postgres://', 'postgresql://', 1)
 
-    SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_pre_ping': True,
-        'pool_recycle': 300,
-    }
+    # Skip schema creation and introspection at startup; run `flask init-db` instead
+    FAST_BOOT = os.getenv('FAST_BOOT', 'false').lower() in ('1', 'true', 'yes')
+
+    # Apply pending schema migrations at startup; otherwise only warn about them
+    AUTO_MIGRATE = os.getenv('AUTO_MIGRATE', 'true').lower() in ('1', 'true', 'yes')
+
+    # Keyset pagination for GET /api/tasks
+    TASKS_PAGE_SIZE = int(os.getenv('TASKS_PAGE_SIZE', '50'))
+    TASKS_MAX_PAGE_SIZE = int(os.getenv('TASKS_MAX_PAGE_SIZE', '500'))
+
+    # Tasks rendered on the index page before infinite scroll takes over
+    TASKS_INDEX_PAGE_SIZE = int(os.getenv('TASKS_INDEX_PAGE_SIZE', '50'))
+
+    # Rows fetched per round trip by the streaming NDJSON export
+    TASKS_STREAM_BATCH_SIZE = int(os.getenv('TASKS_STREAM_BATCH_SIZE', '500'))
+
+    # Upper bound on operations accepted by POST /api/tasks/batch
+    TASKS_BATCH_MAX_OPERATIONS = int(os.getenv('TASKS_BATCH_MAX_OPERATIONS', '5000'))
+
+    # Task response cache: 'memory' (per-process LRU), 'shared' (redis) or 'none'
+    TASK_CACHE_BACKEND = os.getenv('TASK_CACHE_BACKEND', 'memory')
+    TASK_CACHE_TTL = int(os.getenv('TASK_CACHE_TTL', '30'))
+    TASK_CACHE_MAX_ENTRIES = int(os.getenv('TASK_CACHE_MAX_ENTRIES', '1024'))
+    TASK_CACHE_URL = os.getenv('TASK_CACHE_URL', 'redis://localhost:6379/0')
+
+    # Add a Server-Timing header with the DB/serialization/template breakdown
+    SERVER_TIMING = os.getenv('SERVER_TIMING', 'false').lower() in ('1', 'true', 'yes')
+
+    # Seconds a rendered /metrics payload is reused; 0 renders every scrape
+    METRICS_CACHE_SECONDS = int(os.getenv('METRICS_CACHE_SECONDS', '5'))
+
+    # Response compression: bodies of COMPRESSION_MIN_SIZE bytes or more are
+    # compressed with the first of COMPRESSION_ALGORITHMS the client accepts
+    # (br and zstd need the brotli and zstandard packages). COMPRESSION_LEVELS
+    # maps a mimetype to per-algorithm levels, e.g.
+    # {'application/json': {'gzip': 9}}, over the defaults in app/compression.py
+    COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    COMPRESSION_ALGORITHMS = os.getenv('COMPRESSION_ALGORITHMS', 'br,zstd,gzip')
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '500'))
+    COMPRESSION_LEVELS = {}
+
+    # Compiled templates are cached on disk (in TEMPLATE_BYTECODE_CACHE_DIR,
+    # by default a per-user temp directory) and rendered task fragments in
+    # memory, up to TEMPLATE_FRAGMENT_CACHE_SIZE of them (0 disables)
+    TEMPLATE_BYTECODE_CACHE = os.getenv('TEMPLATE_BYTECODE_CACHE', 'true').lower() in ('1', 'true', 'yes')
+    TEMPLATE_BYTECODE_CACHE_DIR = os.getenv('TEMPLATE_BYTECODE_CACHE_DIR') or None
+    TEMPLATE_FRAGMENT_CACHE_SIZE = int(os.getenv('TEMPLATE_FRAGMENT_CACHE_SIZE', '10000'))
+
+    # Slow query / N+1 detection: 'warn' logs and counts, 'raise' also fails
+    # the request (used by the tests), 'off' disables it
+    QUERY_DETECTOR_MODE = os.getenv('QUERY_DETECTOR_MODE', 'warn')
+    SLOW_QUERY_THRESHOLD_MS = int(os.getenv('SLOW_QUERY_THRESHOLD_MS', '100'))
+    N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', '5'))
+
+    # JSON encoder: 'auto' (orjson if installed), 'orjson' or 'stdlib'
+    JSON_BACKEND = os.getenv('JSON_BACKEND', 'auto')
+
+    # Live task events: 'local' (this process only), 'socket' (unix sockets
+    # between workers on one host) or 'none'
+    TASK_EVENTS_BACKEND = os.getenv('TASK_EVENTS_BACKEND', 'local')
+    TASK_EVENTS_SOCKET_DIR = os.getenv('TASK_EVENTS_SOCKET_DIR')
+    TASK_EVENTS_QUEUE_SIZE = int(os.getenv('TASK_EVENTS_QUEUE_SIZE', '100'))
+    TASK_EVENTS_HEARTBEAT = int(os.getenv('TASK_EVENTS_HEARTBEAT', '15'))
+
+    # Optional read replica for the GET views; clients read from the primary
+    # for REPLICA_STICKY_SECONDS after they write
+    SQLALCHEMY_REPLICA_URI = os.getenv('DATABASE_REPLICA_URL')
+    if SQLALCHEMY_REPLICA_URI and SQLALCHEMY_REPLICA_URI.startswith('postgres://'):
+        SQLALCHEMY_REPLICA_URI = SQLALCHEMY_REPLICA_URI.replace('postgres://', 'postgresql://', 1)
+    REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '5'))
+
+    # Engine settings come from the profile for the database backend (see
+    # app/engine.py); options set here override them
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+
+    # Postgres pool: one connection per gunicorn thread plus a little overflow
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', os.getenv('GUNICORN_THREADS', '1')))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '2'))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '10'))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+    # Ping a pooled connection before use only after this many idle seconds
+    DB_PING_AFTER_IDLE = int(os.getenv('DB_PING_AFTER_IDLE', '60'))
+
+    # SQLite connection settings
+    SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
 
     def __init__(self):
         # Update database URI from environment if available
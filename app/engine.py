@@ -0,0 +1,255 @@
+"""Per-backend engine profiles and connection pool metrics.
+
+``engine_options`` picks the engine settings for the database URL:
+
+- Postgres: a LIFO queue pool sized from the worker's thread count, TCP
+  keepalives and a ``SELECT 1`` only for connections that sat idle in the
+  pool longer than DB_PING_AFTER_IDLE, instead of ``pool_pre_ping`` on
+  every checkout.
+- SQLite files: WAL journaling, ``synchronous=NORMAL``, a memory-mapped
+  read window and a busy timeout, set on every new connection.
+- Anything else: ``pool_pre_ping`` and a 300 second recycle as before.
+
+Options in SQLALCHEMY_ENGINE_OPTIONS override the profile. The replica and
+the async engine of ``app.asgi`` are built from the same profiles. Queue pools
+report how long a checkout took (including opening a connection), how many
+connections are checked out and how often a checkout timed out. Every
+process that connects reports its own pools' capacity, so under gunicorn the
+capacity and the checked out connections are both summed over the workers.
+"""
+import os
+import time
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from app.instrumentation import SECONDS_BUCKETS
+
+DB_POOL_SIZE = 1
+DB_MAX_OVERFLOW = 2
+DB_POOL_TIMEOUT = 10
+DB_POOL_RECYCLE = 1800
+DB_PING_AFTER_IDLE = 60
+
+SQLITE_JOURNAL_MODE = 'WAL'
+SQLITE_SYNCHRONOUS = 'NORMAL'
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+SQLITE_BUSY_TIMEOUT_MS = 5000
+
+# libpq keepalives, so a dead server is noticed while a connection is idle
+POSTGRES_KEEPALIVES = {
+    'keepalives': 1,
+    'keepalives_idle': 30,
+    'keepalives_interval': 10,
+    'keepalives_count': 3,
+}
+
+# create_app replaces SQLALCHEMY_ENGINE_OPTIONS with the primary engine's
+# profile and keeps the configured options here for engines built later
+CONFIGURED_OPTIONS_KEY = 'SQLALCHEMY_ENGINE_OPTIONS_CONFIGURED'
+
+# The engine settings used before profiles existed
+DEFAULT_OPTIONS = {
+    'pool_pre_ping': True,
+    'pool_recycle': 300,
+}
+
+
+class PoolMetrics:
+    """Prometheus metrics shared by the app's connection pools."""
+
+    def __init__(self, registry):
+        self.checkout_seconds = Histogram(
+            'task_db_pool_checkout_seconds', 'Time to obtain a pooled database connection',
+            registry=registry, buckets=SECONDS_BUCKETS
+        )
+        self.checked_out = Gauge(
+            'task_db_pool_checked_out', 'Database connections currently checked out',
+            registry=registry, multiprocess_mode='livesum'
+        )
+        self.capacity = Gauge(
+            'task_db_pool_capacity', 'Most connections the pools may open (pool size plus overflow)',
+            registry=registry, multiprocess_mode='livesum'
+        )
+        self.timeouts = Counter(
+            'task_db_pool_timeouts_total', 'Checkouts that gave up waiting for a connection',
+            registry=registry
+        )
+        # Capacity of each pool in this process; see report_capacity
+        self._capacities = {}
+        self._capacity_pid = None
+
+    def report_capacity(self, pool_key, capacity):
+        """Record the capacity of a pool this process has connected with.
+
+        The gauge holds this process's own total, so with livesum the
+        merged value covers exactly the pools of the live workers. Pools
+        recorded before a fork belong to the parent and are dropped.
+        """
+        pid = os.getpid()
+        if pid != self._capacity_pid:
+            self._capacities = {}
+            self._capacity_pid = pid
+        self._capacities[pool_key] = capacity
+        self.capacity.set(sum(self._capacities.values()))
+
+    def clear_capacity(self):
+        """Stop counting this process's pools, e.g. in a master that forks workers."""
+        self._capacities = {}
+        self._capacity_pid = os.getpid()
+        self.capacity.set(0)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that times checkouts into ``metrics`` once it is set."""
+
+    metrics = None
+    # Log as sqlalchemy.pool rather than under the 'app' logger
+    _sqla_logger_namespace = 'sqlalchemy.pool.impl.QueuePool'
+
+    def connect(self):
+        if self.metrics is None:
+            return super().connect()
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.metrics.timeouts.inc()
+            raise
+        finally:
+            self.metrics.checkout_seconds.observe(time.perf_counter() - started)
+
+    def recreate(self):
+        # Engine.dispose() replaces the pool; keep reporting from the new one
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class InstrumentedAsyncQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    """InstrumentedQueuePool for asyncio engines."""
+
+    _sqla_logger_namespace = 'sqlalchemy.pool.impl.AsyncAdaptedQueuePool'
+
+
+def _is_sqlite_file(url):
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def configured_options(config):
+    """The configured SQLALCHEMY_ENGINE_OPTIONS, before create_app merged them into the profile."""
+    return config.get(CONFIGURED_OPTIONS_KEY, config.get('SQLALCHEMY_ENGINE_OPTIONS')) or {}
+
+
+def engine_options(database_url, config):
+    """Return the engine options for ``database_url``, with SQLALCHEMY_ENGINE_OPTIONS applied on top.
+
+    Asyncio URLs (``sqlite+aiosqlite``, ``postgresql+asyncpg``) get the same
+    profile with the asyncio variant of the pool.
+    """
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    queue_pool = InstrumentedQueuePool
+    if backend in ('postgresql', 'sqlite') and url.get_dialect().is_async:
+        queue_pool = InstrumentedAsyncQueuePool
+    if backend == 'postgresql':
+        options = {
+            'poolclass': queue_pool,
+            'pool_size': config.get('DB_POOL_SIZE', DB_POOL_SIZE),
+            'max_overflow': config.get('DB_MAX_OVERFLOW', DB_MAX_OVERFLOW),
+            'pool_timeout': config.get('DB_POOL_TIMEOUT', DB_POOL_TIMEOUT),
+            'pool_recycle': config.get('DB_POOL_RECYCLE', DB_POOL_RECYCLE),
+            'pool_use_lifo': True,
+            'pool_pre_ping': False,
+        }
+        if url.get_driver_name() == 'psycopg2':
+            options['connect_args'] = dict(POSTGRES_KEEPALIVES)
+    elif _is_sqlite_file(url):
+        # A local file cannot drop the connection; no ping or recycle needed
+        options = {'poolclass': queue_pool}
+    elif backend == 'sqlite':
+        # In-memory databases get a StaticPool from Flask-SQLAlchemy
+        options = {}
+    else:
+        options = dict(DEFAULT_OPTIONS)
+    options.update(configured_options(config))
+    return options
+
+
+def _sqlite_pragmas(config, url):
+    pragmas = [
+        f"PRAGMA synchronous={config.get('SQLITE_SYNCHRONOUS', SQLITE_SYNCHRONOUS)}",
+        f"PRAGMA busy_timeout={int(config.get('SQLITE_BUSY_TIMEOUT_MS', SQLITE_BUSY_TIMEOUT_MS))}",
+    ]
+    if _is_sqlite_file(url):
+        # WAL and mmap only apply to databases backed by a file
+        pragmas.insert(0, f"PRAGMA journal_mode={config.get('SQLITE_JOURNAL_MODE', SQLITE_JOURNAL_MODE)}")
+        pragmas.append(f"PRAGMA mmap_size={int(config.get('SQLITE_MMAP_SIZE', SQLITE_MMAP_SIZE))}")
+    return pragmas
+
+
+def _init_sqlite(engine, config):
+    pragmas = _sqlite_pragmas(config, engine.url)
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def _init_postgres(engine, config):
+    ping_after = config.get('DB_PING_AFTER_IDLE', DB_PING_AFTER_IDLE)
+
+    @event.listens_for(engine, 'checkin')
+    def mark_idle(dbapi_connection, connection_record):
+        connection_record.info['checked_in_at'] = time.monotonic()
+
+    @event.listens_for(engine, 'checkout')
+    def ping_if_idle(dbapi_connection, connection_record, connection_proxy):
+        checked_in_at = connection_record.info.pop('checked_in_at', None)
+        if checked_in_at is None or time.monotonic() - checked_in_at < ping_after:
+            return
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute('SELECT 1')
+        except Exception:
+            # The pool discards this connection and checks out another
+            raise exc.DisconnectionError("connection was dropped while idle")
+        finally:
+            cursor.close()
+
+
+def _init_pool_metrics(engine, metrics):
+    @event.listens_for(engine, 'checkout')
+    def count_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.checked_out.inc()
+
+    @event.listens_for(engine, 'checkin')
+    def count_checkin(dbapi_connection, connection_record):
+        metrics.checked_out.dec()
+
+    pool = engine.pool
+    if isinstance(pool, InstrumentedQueuePool):
+        pool.metrics = metrics
+        capacity = pool.size() + max(pool._max_overflow, 0)
+
+        # Reported by each process once it opens a connection, not where the
+        # engine was created: a preloaded gunicorn master forks the workers
+        @event.listens_for(engine, 'connect')
+        def report_capacity(dbapi_connection, connection_record):
+            metrics.report_capacity(engine, capacity)
+
+
+def init_engine(engine, config, metrics=None):
+    """Attach the profile's connection hooks and pool metrics to ``engine``."""
+    backend = engine.url.get_backend_name()
+    if backend == 'sqlite':
+        _init_sqlite(engine, config)
+    elif backend == 'postgresql':
+        _init_postgres(engine, config)
+    if metrics is not None:
+        _init_pool_metrics(engine, metrics)
@@ -0,0 +1,201 @@
+import json
+import logging
+import os
+import queue
+import socket
+import tempfile
+import threading
+
+logger = logging.getLogger('app')
+
+# Largest payload forwarded between workers in one datagram; bigger bursts
+# are replaced with a resync event
+MAX_DATAGRAM_SIZE = 64 * 1024
+
+RESYNC = {'op': 'resync'}
+
+
+class Subscription:
+    """One listener's bounded queue of task events."""
+
+    def __init__(self, hub, max_queue):
+        self.hub = hub
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.overflowed = False
+
+    def put(self, events):
+        if self.overflowed:
+            return
+        for event in events:
+            try:
+                self.queue.put_nowait(event)
+            except queue.Full:
+                # A slow client misses events rather than holding memory;
+                # it is told to resync and disconnected
+                self.overflowed = True
+                return
+
+    def get(self, timeout=None):
+        """Return the next event, RESYNC after an overflow, or None on timeout."""
+        if self.overflowed and self.queue.empty():
+            return RESYNC
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return RESYNC if self.overflowed else None
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class EventHub:
+    """In-process publish/subscribe for task events.
+
+    ``publish`` delivers to this process's subscribers and hands the events to
+    the fan-out backend, which delivers them to the other workers' hubs.
+    """
+
+    def __init__(self, fanout=None, max_queue=100):
+        self.fanout = fanout
+        self.max_queue = max_queue
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        if self.fanout is not None:
+            self.fanout.start(self)
+        subscription = Subscription(self, self.max_queue)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def dispatch(self, events):
+        """Deliver ``events`` to local subscribers only."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.put(events)
+
+    def publish(self, events):
+        if not events:
+            return
+        self.dispatch(events)
+        if self.fanout is not None:
+            try:
+                self.fanout.send(self, events)
+            except Exception as e:
+                # Live updates are best effort; the write itself succeeded
+                logger.warning(f"Could not forward task events: {str(e)}")
+
+    def __len__(self):
+        return len(self._subscribers)
+
+
+class UnixSocketFanout:
+    """Carry events between workers on one host over unix datagram sockets.
+
+    Each worker binds a socket named after its pid in ``directory`` the
+    first time it publishes or gets a subscriber, and a daemon thread feeds
+    received events into its hub. Publishing sends one datagram to every other socket in the
+    directory; sockets of workers that have exited are removed on the way.
+    Binding happens lazily, after gunicorn forks, so workers never share one.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._socket = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f'{self._pid}-{id(self):x}.sock')
+
+    def start(self, hub):
+        with self._lock:
+            if self._socket is not None and self._pid == os.getpid():
+                return
+            if self._socket is not None:
+                # Inherited from the parent across a fork
+                self._socket.close()
+            os.makedirs(self.directory, exist_ok=True)
+            self._pid = os.getpid()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._socket.bind(self.path)
+            threading.Thread(
+                target=self._receive, args=(hub, self._socket), name='task-events', daemon=True
+            ).start()
+
+    def _receive(self, hub, sock):
+        while True:
+            try:
+                data = sock.recv(MAX_DATAGRAM_SIZE)
+            except OSError:
+                return
+            try:
+                hub.dispatch(json.loads(data))
+            except ValueError:
+                logger.warning("Discarded malformed task event datagram")
+
+    def send(self, hub, events):
+        self.start(hub)
+        data = json.dumps(events).encode('utf-8')
+        if len(data) > MAX_DATAGRAM_SIZE:
+            data = json.dumps([RESYNC]).encode('utf-8')
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not name.endswith('.sock') or path == self.path:
+                continue
+            try:
+                self._socket.sendto(data, socket.MSG_DONTWAIT, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Nobody is bound there any more
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            except BlockingIOError:
+                logger.warning(f"Task event queue full for {name}; dropping events")
+
+    def close(self):
+        with self._lock:
+            if self._socket is not None and self._pid == os.getpid():
+                self._socket.close()
+                try:
+                    os.unlink(self.path)
+                except FileNotFoundError:
+                    pass
+            self._socket = None
+
+
+def task_event(op, task_id, task=None):
+    """Build the event published for a write to one task."""
+    event = {'op': op, 'id': task_id}
+    if task is not None:
+        event['task'] = task
+    return event
+
+
+def create_event_hub(config):
+    """Build the task event hub described by the app config, or None if disabled."""
+    backend_name = config.get('TASK_EVENTS_BACKEND', 'local')
+    max_queue = config.get('TASK_EVENTS_QUEUE_SIZE', 100)
+
+    if backend_name in (None, '', 'none'):
+        return None
+    if backend_name == 'local':
+        fanout = None
+    elif backend_name == 'socket':
+        fanout = UnixSocketFanout(
+            config.get('TASK_EVENTS_SOCKET_DIR') or os.path.join(tempfile.gettempdir(), 'task-events')
+        )
+    else:
+        raise ValueError(f"Unknown TASK_EVENTS_BACKEND: {backend_name}")
+
+    return EventHub(fanout, max_queue=max_queue)
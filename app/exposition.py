@@ -0,0 +1,104 @@
+"""Cached Prometheus exposition.
+
+Rendering the registry (or, under gunicorn, merging every worker's metric
+files) costs the same whether one Prometheus or five scrape it, so the
+rendered payload is kept for METRICS_CACHE_SECONDS and rendered by one
+request at a time; scrapes arriving meanwhile wait for that render instead
+of starting their own. A gzip copy is kept next to it for clients that
+accept it.
+
+With METRICS_PORT set, gunicorn.conf.py serves the same payload from a
+thread in the master process, so scrapes never take a worker away from
+task traffic.
+"""
+import gzip
+import logging
+import threading
+import time
+from prometheus_client.exposition import choose_encoder
+from werkzeug.http import parse_accept_header
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+logger = logging.getLogger('app')
+
+METRICS_CACHE_SECONDS = 5
+GZIP_LEVEL = 6
+
+
+def accepts_gzip(accept_encoding):
+    """Return True if an Accept-Encoding header value allows gzip."""
+    return parse_accept_header(accept_encoding).quality('gzip') > 0
+
+
+class MetricsExposition:
+    """Render metrics with ``render(accept_header) -> (text, content_type)`` at most once per ``ttl``."""
+
+    def __init__(self, render, ttl=METRICS_CACHE_SECONDS, clock=time.monotonic):
+        self.render = render
+        self.ttl = ttl
+        self.clock = clock
+        self.renders = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, accept_header):
+        # One entry per exposition format (text or OpenMetrics)
+        key = choose_encoder(accept_header)[1]
+        entry = self._entries.get(key)
+        if entry is not None and self.clock() < entry[0]:
+            return entry
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.clock() < entry[0]:
+                return entry
+            text, content_type = self.render(accept_header)
+            self.renders += 1
+            body = text.encode('utf-8') if isinstance(text, str) else text
+            entry = (self.clock() + self.ttl, content_type, body, gzip.compress(body, GZIP_LEVEL))
+            if self.ttl > 0:
+                self._entries[key] = entry
+            return entry
+
+    def response(self, accept_header=None, accept_encoding=None):
+        """Return ``(body, headers)`` for a scrape with the given request headers."""
+        _, content_type, body, compressed = self._entry(accept_header)
+        headers = {'Content-Type': content_type, 'Vary': 'Accept-Encoding'}
+        if accept_encoding and accepts_gzip(accept_encoding):
+            headers['Content-Encoding'] = 'gzip'
+            body = compressed
+        return body, headers
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    """Request handler that does not log every scrape."""
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def metrics_wsgi_app(exposition):
+    """A WSGI app answering every request with the cached exposition."""
+    def application(environ, start_response):
+        body, headers = exposition.response(environ.get('HTTP_ACCEPT'), environ.get('HTTP_ACCEPT_ENCODING'))
+        headers['Content-Length'] = str(len(body))
+        start_response('200 OK', list(headers.items()))
+        return [body]
+    return application
+
+
+def start_metrics_server(exposition, port, host='0.0.0.0'):
+    """Serve ``exposition`` on ``host:port`` from a daemon thread and return the server."""
+    server = make_server(host, port, metrics_wsgi_app(exposition), threaded=True,
+                         request_handler=_QuietRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True)
+    thread.start()
+    logger.info(f"Serving metrics on {host}:{server.server_port}")
+    return server
+
+
+def create_metrics_exposition(config, render):
+    """Build the exposition for ``render`` with the METRICS_CACHE_SECONDS window."""
+    ttl = config.get('METRICS_CACHE_SECONDS', METRICS_CACHE_SECONDS)
+    if ttl < 0:
+        raise ValueError("METRICS_CACHE_SECONDS must not be negative")
+    return MetricsExposition(render, ttl)
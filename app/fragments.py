@@ -0,0 +1,117 @@
+"""Cached task fragments and the template bytecode cache.
+
+Every task renders to the same HTML until it changes, so ``task.html`` is
+rendered once per ``(id, updated_at, done)`` and kept in an in-process LRU
+cache of TEMPLATE_FRAGMENT_CACHE_SIZE entries. Templates call
+``task_fragment(task)`` instead of including ``task.html``, which turns a
+list of thousands of tasks into a join of cached strings. Every write sets
+``updated_at``, so a changed task gets a new key; old entries age out.
+
+Compiled templates are also written to a FileSystemBytecodeCache, which
+``flask templates compile`` fills ahead of time, so a fresh worker loads
+them instead of compiling them again.
+"""
+import logging
+from datetime import datetime
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+from app.cache import LRUCache
+from app.queries import DATETIME_FIELDS, FIELDS, TaskRecord
+
+logger = logging.getLogger('app')
+
+TEMPLATE_FRAGMENT_CACHE_SIZE = 10000
+
+TASK_TEMPLATE = 'task.html'
+
+templates_cli = AppGroup('templates', help="Template cache commands.")
+
+
+class FragmentCache:
+    """Rendered task fragments keyed on the fields that change them."""
+
+    def __init__(self, jinja_env, max_entries=TEMPLATE_FRAGMENT_CACHE_SIZE):
+        self.jinja_env = jinja_env
+        self.entries = LRUCache(max_entries=max_entries, ttl=None) if max_entries else None
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, task):
+        """Return the ``task.html`` fragment for ``task``, rendering it on a miss."""
+        if self.entries is None:
+            return self._render(task)
+        key = (task.id, task.updated_at, task.done)
+        fragment = self.entries.get(key)
+        if fragment is not None:
+            self.hits += 1
+            return fragment
+        self.misses += 1
+        fragment = self._render(task)
+        self.entries.set(key, fragment)
+        return fragment
+
+    def _render(self, task):
+        return Markup(self.jinja_env.get_template(TASK_TEMPLATE).render(task=task))
+
+
+def task_fragment(task):
+    """Jinja global rendering one task through the app's fragment cache."""
+    return current_app.fragment_cache.render(task)
+
+
+def task_event_html(event, fragment_cache):
+    """Render a task event for the index page as an SSE message.
+
+    The data is HTML that htmx swaps in out of band: a created task goes to
+    the top of ``#task-list``, an updated one replaces ``#task-<id>`` and a
+    deleted one is removed. Events without the task (batch writes) and
+    ``resync`` become an ``event: resync``, on which the page reloads its
+    first page.
+    """
+    task = event.get('task')
+    if event['op'] == 'delete':
+        html = f'<div id="task-{int(event["id"])}" hx-swap-oob="delete"></div>'
+    elif task is None or event['op'] not in ('create', 'update'):
+        return 'event: resync\ndata: \n\n'
+    else:
+        values = {field: task.get(field) for field in FIELDS}
+        for field in DATETIME_FIELDS:
+            if values[field]:
+                values[field] = datetime.fromisoformat(values[field])
+        fragment = fragment_cache.render(TaskRecord(**values))
+        if event['op'] == 'create':
+            html = (f'<div hx-swap-oob="afterbegin:#task-list">{fragment}</div>'
+                    '<div id="task-list-empty" hx-swap-oob="delete"></div>')
+        else:
+            # The fragment's root element carries the id it replaces
+            html = str(fragment).replace('<div', '<div hx-swap-oob="true"', 1)
+    # An SSE data field cannot contain a newline; each line gets its own
+    data = '\n'.join(f'data: {line}' for line in html.splitlines())
+    return f'event: task\n{data}\n\n'
+
+
+def init_templates(app):
+    """Set up the bytecode cache and the fragment cache on ``app``."""
+    if app.config.get('TEMPLATE_BYTECODE_CACHE', True):
+        # None uses a per-user directory under the system temp dir
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config.get('TEMPLATE_BYTECODE_CACHE_DIR'))
+    app.fragment_cache = FragmentCache(
+        app.jinja_env, app.config.get('TEMPLATE_FRAGMENT_CACHE_SIZE', TEMPLATE_FRAGMENT_CACHE_SIZE)
+    )
+    app.jinja_env.globals['task_fragment'] = task_fragment
+    app.cli.add_command(templates_cli)
+
+
+@templates_cli.command('compile')
+def compile_templates():
+    """Compile every template into the bytecode cache."""
+    env = current_app.jinja_env
+    if env.bytecode_cache is None:
+        raise click.ClickException("TEMPLATE_BYTECODE_CACHE is disabled")
+    names = env.list_templates(extensions=['html'])
+    for name in names:
+        env.get_template(name)
+    click.echo(f"Compiled {len(names)} template(s)")
@@ -0,0 +1,147 @@
+"""Per-request latency breakdown.
+
+Each request accumulates time spent in the database (and the number of SQL
+statements), in JSON serialization and in Jinja rendering. After the request
+these are observed in Prometheus histograms labelled by endpoint and, when
+SERVER_TIMING is enabled, returned in a ``Server-Timing`` header that browser
+dev tools display. Work done while a streamed body is sent happens after the
+request is observed and is not included.
+"""
+import time
+from flask import before_render_template, g, has_app_context, request, template_rendered
+from prometheus_client import Histogram
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SECONDS_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class RequestTimings:
+    """Time spent per component during one request, in seconds."""
+    __slots__ = ('started', 'db', 'sql_statements', 'serialize', 'template', 'template_started')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db = 0.0
+        self.sql_statements = 0
+        self.serialize = 0.0
+        self.template = 0.0
+        self.template_started = None
+
+    def server_timing(self):
+        """Format the timings as a Server-Timing header value."""
+        total = time.perf_counter() - self.started
+        return ', '.join([
+            f'db;dur={self.db * 1000:.2f};desc="{self.sql_statements} statements"',
+            f'serialize;dur={self.serialize * 1000:.2f}',
+            f'template;dur={self.template * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+
+
+def current_timings():
+    """Return the RequestTimings for the active request, or None outside one."""
+    if not has_app_context():
+        return None
+    return g.get('request_timings')
+
+
+def observe_statements(observer):
+    """Call ``observer(statement, parameters, context, elapsed)`` after every SQL statement.
+
+    Statements are timed once, here, for the request breakdown and every
+    observer. Usable as a decorator.
+    """
+    _statement_observers.append(observer)
+    return observer
+
+
+_statement_observers = []
+
+
+def record_serialization(elapsed):
+    timings = current_timings()
+    if timings is not None:
+        timings.serialize += elapsed
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    timings = current_timings()
+    if timings is not None:
+        timings.db += elapsed
+        timings.sql_statements += 1
+    for observer in _statement_observers:
+        observer(statement, parameters, context, elapsed)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(exception_context):
+    # after_cursor_execute does not run for a failed statement
+    stack = exception_context.connection.info.get('query_started') if exception_context.connection else None
+    if stack:
+        stack.pop()
+
+
+def _before_render(sender, template, context, **extra):
+    timings = current_timings()
+    if timings is not None:
+        timings.template_started = time.perf_counter()
+
+
+def _rendered(sender, template, context, **extra):
+    timings = current_timings()
+    if timings is not None and timings.template_started is not None:
+        timings.template += time.perf_counter() - timings.template_started
+        timings.template_started = None
+
+
+def init_request_timing(app, registry):
+    """Register the latency breakdown histograms and request hooks on ``app``."""
+    histograms = {
+        'db': Histogram(
+            'task_request_db_seconds', 'Time spent executing SQL per request',
+            ['endpoint'], registry=registry, buckets=SECONDS_BUCKETS
+        ),
+        'sql_statements': Histogram(
+            'task_request_sql_statements', 'SQL statements executed per request',
+            ['endpoint'], registry=registry, buckets=STATEMENT_BUCKETS
+        ),
+        'serialize': Histogram(
+            'task_request_serialization_seconds', 'Time spent encoding JSON per request',
+            ['endpoint'], registry=registry, buckets=SECONDS_BUCKETS
+        ),
+        'template': Histogram(
+            'task_request_template_seconds', 'Time spent rendering Jinja templates per request',
+            ['endpoint'], registry=registry, buckets=SECONDS_BUCKETS
+        ),
+    }
+    app.timing_histograms = histograms
+
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+
+    @app.before_request
+    def start_request_timing():
+        g.request_timings = RequestTimings()
+
+    @app.after_request
+    def observe_request_timing(response):
+        timings = g.pop('request_timings', None)
+        if timings is None:
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        for name, histogram in histograms.items():
+            histogram.labels(endpoint=endpoint).observe(getattr(timings, name))
+        if app.config.get('SERVER_TIMING', False):
+            response.headers['Server-Timing'] = timings.server_timing()
+        return response
+
+    return histograms
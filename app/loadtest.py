@@ -0,0 +1,380 @@
+"""Load generator for sizing gunicorn deployments.
+
+Starts gunicorn from ``gunicorn.conf.py`` for each worker configuration,
+drives it with concurrent keep-alive clients issuing a weighted mix of JSON
+reads, writes and HTMX requests, and reports throughput and p50/p95/p99
+latency::
+
+    python -m app.loadtest --configs sync:2,gthread:2x4,uvicorn:2 --concurrency 32 --duration 30
+
+    # Or drive a server that is already running
+    python -m app.loadtest --url http://localhost:5000 --mix read=80,write=10,htmx=10
+
+Clients are threads in this process. Past a few hundred requests per second
+per core the generator itself becomes the bottleneck, so run it on a
+different machine, or in several processes, when sizing a large deployment.
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MIX = {'read': 70, 'write': 20, 'htmx': 10}
+
+# Tasks created before measuring, so reads have something to return
+DEFAULT_SEED_TASKS = 1000
+
+# Seconds to wait for gunicorn to answer /health
+STARTUP_TIMEOUT = 30
+
+ServerConfig = namedtuple('ServerConfig', ['worker_class', 'workers', 'threads'])
+
+LoadResult = namedtuple('LoadResult', [
+    'requests', 'errors', 'duration', 'throughput', 'p50', 'p95', 'p99', 'by_kind'
+])
+
+# Short names accepted by --configs, mapped to (gunicorn worker class, app)
+WORKER_CLASSES = {
+    'sync': ('sync', 'app.main:app'),
+    'gthread': ('gthread', 'app.main:app'),
+    'uvicorn': ('uvicorn.workers.UvicornWorker', 'app.asgi:app'),
+}
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = math.ceil(fraction * len(sorted_values)) - 1
+    return sorted_values[max(0, min(index, len(sorted_values) - 1))]
+
+
+def parse_mix(text):
+    """Parse ``read=70,write=20,htmx=10`` into a weight dict."""
+    mix = {}
+    for part in text.split(','):
+        kind, _, weight = part.partition('=')
+        kind = kind.strip()
+        if kind not in DEFAULT_MIX:
+            raise ValueError(f"Request kind must be one of: {', '.join(DEFAULT_MIX)}")
+        mix[kind] = float(weight)
+    if not any(weight > 0 for weight in mix.values()):
+        raise ValueError("At least one request kind needs a positive weight")
+    return mix
+
+
+def parse_configs(text):
+    """Parse ``sync:2,gthread:2x4`` into ServerConfigs (class:workers[xthreads])."""
+    configs = []
+    for part in text.split(','):
+        worker_class, _, size = part.strip().partition(':')
+        if worker_class not in WORKER_CLASSES:
+            raise ValueError(f"Worker class must be one of: {', '.join(WORKER_CLASSES)}")
+        workers, _, threads = (size or '1').partition('x')
+        configs.append(ServerConfig(worker_class, int(workers), int(threads or 1)))
+    return configs
+
+
+class Client:
+    """One keep-alive HTTP connection issuing the request mix."""
+
+    def __init__(self, base_url, task_ids, rng, timeout=30):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.task_ids = task_ids
+        self.rng = rng
+        self.timeout = timeout
+        self.connection = None
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        for attempt in (1, 2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.connection.request(method, path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                data = response.read()
+                if response.getheader('Connection', '').lower() == 'close':
+                    self.close()
+                return response.status, data
+            except (http.client.HTTPException, ConnectionError):
+                # The server closed an idle keep-alive connection; retry once
+                self.close()
+                if attempt == 2:
+                    raise
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def read(self):
+        if self.task_ids and self.rng.random() < 0.5:
+            return self.request('GET', f'/api/tasks/{self.rng.choice(self.task_ids)}')
+        return self.request('GET', '/api/tasks?limit=50')
+
+    def write(self):
+        if self.task_ids and self.rng.random() < 0.5:
+            return self.request('PUT', f'/api/tasks/{self.rng.choice(self.task_ids)}')
+        return self.request('POST', '/api/tasks', body={'title': 'Load test task'})
+
+    def htmx(self):
+        if self.rng.random() < 0.5:
+            return self.request('GET', '/')
+        return self.request('GET', '/api/tasks?limit=50', headers={'HX-Request': 'true'})
+
+
+def seed_tasks(base_url, count):
+    """Create ``count`` tasks through the batch endpoint and return all task ids."""
+    client = Client(base_url, [], random.Random(0))
+    try:
+        for offset in range(0, count, 500):
+            operations = [{'op': 'create', 'title': f'Seeded task {i}'}
+                          for i in range(offset, min(offset + 500, count))]
+            status, _ = client.request('POST', '/api/tasks/batch', body=operations)
+            if status != 200:
+                raise RuntimeError(f"Seeding tasks failed with status {status}")
+        status, data = client.request('GET', '/api/tasks?fields=id')
+        return [task['id'] for task in json.loads(data)]
+    finally:
+        client.close()
+
+
+def run_load(base_url, concurrency=8, duration=10.0, mix=None, task_ids=None, seed=0):
+    """Drive ``base_url`` with ``concurrency`` clients for ``duration`` seconds.
+
+    Any status of 400 or above, or a connection failure, counts as an error.
+    Latencies are in seconds.
+    """
+    mix = mix or DEFAULT_MIX
+    kinds = [kind for kind in mix if mix[kind] > 0]
+    weights = [mix[kind] for kind in kinds]
+    task_ids = list(task_ids or [])
+    samples = []
+    errors = []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(concurrency + 1)
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        client = Client(base_url, task_ids, rng)
+        local_samples = []
+        local_errors = 0
+        start_barrier.wait()
+        deadline = time.perf_counter() + duration
+        try:
+            while time.perf_counter() < deadline:
+                kind = rng.choices(kinds, weights)[0]
+                started = time.perf_counter()
+                try:
+                    status, _ = getattr(client, kind)()
+                except (OSError, http.client.HTTPException):
+                    client.close()
+                    status = None
+                elapsed = time.perf_counter() - started
+                if status is None or status >= 400:
+                    local_errors += 1
+                else:
+                    local_samples.append((kind, elapsed))
+        finally:
+            client.close()
+            with lock:
+                samples.extend(local_samples)
+                errors.append(local_errors)
+
+    threads = [threading.Thread(target=worker, args=(index,), daemon=True) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    by_kind = {}
+    for kind in kinds:
+        latencies = sorted(latency for sample_kind, latency in samples if sample_kind == kind)
+        by_kind[kind] = (len(latencies), percentile(latencies, 0.5), percentile(latencies, 0.95),
+                         percentile(latencies, 0.99))
+    latencies = sorted(latency for _, latency in samples)
+    return LoadResult(
+        requests=len(latencies),
+        errors=sum(errors),
+        duration=elapsed,
+        throughput=len(latencies) / elapsed if elapsed else 0.0,
+        p50=percentile(latencies, 0.5),
+        p95=percentile(latencies, 0.95),
+        p99=percentile(latencies, 0.99),
+        by_kind=by_kind,
+    )
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class GunicornServer:
+    """Run gunicorn with ``gunicorn.conf.py`` for one worker configuration.
+
+    Uses a fresh SQLite file unless ``database_url`` is given. Use it as a
+    context manager; ``url`` is set once /health answers.
+    """
+
+    def __init__(self, config, database_url=None, port=None, env=None):
+        self.config = config
+        self.database_url = database_url
+        self.port = port or _free_port()
+        self.env = env or {}
+        self.url = f'http://127.0.0.1:{self.port}'
+        self.process = None
+        self._log = None
+        self._tmpdir = None
+
+    def __enter__(self):
+        worker_class, app_path = WORKER_CLASSES[self.config.worker_class]
+        self._tmpdir = tempfile.TemporaryDirectory(prefix='loadtest-')
+        database_url = self.database_url
+        if database_url is None:
+            database_url = 'sqlite:///' + os.path.join(self._tmpdir.name, 'loadtest.db')
+        env = dict(os.environ, **self.env)
+        env.update({
+            'PORT': str(self.port),
+            'DATABASE_URL': database_url,
+            # Keep the metric files apart from any other gunicorn on the host
+            'PROMETHEUS_MULTIPROC_DIR': os.path.join(self._tmpdir.name, 'metrics'),
+            'TASK_EVENTS_SOCKET_DIR': os.path.join(self._tmpdir.name, 'events'),
+            'GUNICORN_WORKER_CLASS': worker_class,
+            'GUNICORN_WORKERS': str(self.config.workers),
+            'GUNICORN_THREADS': str(self.config.threads),
+        })
+        # A file rather than a pipe, which would block gunicorn once full
+        self._log = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+             '--bind', f'127.0.0.1:{self.port}', '--access-logfile', os.devnull, app_path],
+            cwd=PROJECT_DIR, env=env, stdout=self._log, stderr=subprocess.STDOUT
+        )
+        self._wait_until_ready()
+        return self
+
+    def _wait_until_ready(self):
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                self._log.seek(0)
+                log = self._log.read().decode(errors='replace')
+                self.__exit__(None, None, None)
+                raise RuntimeError("gunicorn exited during startup:\n" + log)
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=1)
+                connection.request('GET', '/health')
+                if connection.getresponse().status == 200:
+                    connection.close()
+                    return
+                connection.close()
+            except OSError:
+                pass
+            time.sleep(0.1)
+        self.__exit__(None, None, None)
+        raise RuntimeError(f"gunicorn did not become healthy within {STARTUP_TIMEOUT}s")
+
+    def __exit__(self, exc_type, exc, traceback):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        if self._tmpdir is not None:
+            self._tmpdir.cleanup()
+            self._tmpdir = None
+
+
+def compare_configs(configs, seed_tasks_count=DEFAULT_SEED_TASKS, database_url=None, **load_options):
+    """Start gunicorn for each config in turn, load it, and return (config, LoadResult) pairs."""
+    results = []
+    for config in configs:
+        with GunicornServer(config, database_url=database_url) as server:
+            task_ids = seed_tasks(server.url, seed_tasks_count) if seed_tasks_count else []
+            results.append((config, run_load(server.url, task_ids=task_ids, **load_options)))
+    return results
+
+
+def format_report(rows):
+    """Render (label, LoadResult) pairs as a text table, latencies in milliseconds."""
+    lines = [f"{'server':<18} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50':>8} {'p95':>8} {'p99':>8}"]
+    for label, result in rows:
+        lines.append(
+            f"{label:<18} {result.requests:>9} {result.errors:>7} {result.throughput:>9.1f} "
+            f"{result.p50 * 1000:>8.1f} {result.p95 * 1000:>8.1f} {result.p99 * 1000:>8.1f}"
+        )
+        for kind, (count, p50, p95, p99) in sorted(result.by_kind.items()):
+            lines.append(
+                f"{'  ' + kind:<18} {count:>9} {'':>7} {count / result.duration:>9.1f} "
+                f"{p50 * 1000:>8.1f} {p95 * 1000:>8.1f} {p99 * 1000:>8.1f}"
+            )
+    return '\n'.join(lines)
+
+
+def config_label(config):
+    threads = f'x{config.threads}' if config.threads > 1 else ''
+    return f'{config.worker_class}:{config.workers}{threads}'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', help='Load an already running server instead of starting gunicorn')
+    parser.add_argument('--configs', default='sync:2',
+                        help='Worker configurations to compare, e.g. sync:2,gthread:2x4,uvicorn:2')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds of load per configuration')
+    parser.add_argument('--mix', default='read=70,write=20,htmx=10', type=parse_mix,
+                        help='Request kind weights')
+    parser.add_argument('--seed-tasks', type=int, default=DEFAULT_SEED_TASKS,
+                        help='Tasks to create before measuring')
+    parser.add_argument('--database-url', help='Database for started servers (default: a fresh SQLite file)')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args(argv)
+
+    load_options = {'concurrency': args.concurrency, 'duration': args.duration, 'mix': args.mix}
+    if args.url:
+        task_ids = seed_tasks(args.url, args.seed_tasks) if args.seed_tasks else []
+        rows = [(args.url, run_load(args.url, task_ids=task_ids, **load_options))]
+    else:
+        rows = [(config_label(config), result) for config, result in compare_configs(
+            parse_configs(args.configs), seed_tasks_count=args.seed_tasks,
+            database_url=args.database_url, **load_options
+        )]
+
+    if args.json:
+        print(json.dumps([dict(result._asdict(), server=label) for label, result in rows], indent=2))
+    else:
+        print(format_report(rows))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,21 @@
 import os
-import sys
 import logging
 from flask import Flask, request, jsonify
-from prometheus_flask_exporter import PrometheusMetrics
 from prometheus_client import CollectorRegistry, Counter
 from app.config import Config
 from app.database import db
-from sqlalchemy import text
+from app.engine import CONFIGURED_OPTIONS_KEY, PoolMetrics, engine_options, init_engine
+from app.cache import create_task_cache
+from app.compression import init_compression
+from app.events import create_event_hub
+from app.exposition import create_metrics_exposition
+from app.fragments import init_templates
+from app.instrumentation import init_request_timing
+from app.multiprocess import MultiProcessPrometheusMetrics
+from app.query_detector import init_query_detector
+from app.serialization import create_json_provider
+from app.migrate import check_schema, db_cli, upgrade
+from app.replica import init_replica
 
 def init_metrics(app, registry=None):
     """Initialize Prometheus metrics."""
@@ -14,8 +23,9 @@ def init_metrics(app, registry=None):
     if registry is None:
         registry = CollectorRegistry()
     
-    # Initialize metrics exporter
-    metrics = PrometheusMetrics(app, registry=registry)
+    # Initialize metrics exporter; under gunicorn /metrics merges the samples
+    # of every worker (see app/multiprocess.py)
+    metrics = MultiProcessPrometheusMetrics(app, path=None, registry=registry)
     metrics.info('app_info', 'Application info', version='1.0.0')
     
     # Create task operations counter directly
@@ -28,9 +38,61 @@ def init_metrics(app, registry=None):
     
     # Attach the counter to the app
     app.task_counter = task_counter
+
+    # Hit/miss/eviction counts for the task response cache
+    app.cache_counter = Counter(
+        'task_cache_events_total',
+        'Task response cache events',
+        ['event'],
+        registry=registry
+    )
+
+    # Per-endpoint DB, SQL count, serialization and template histograms
+    init_request_timing(app, registry)
+
+    # Connection pool checkout time, usage and timeouts
+    app.pool_metrics = PoolMetrics(registry)
+
+    # Slow queries and N+1 patterns found by the query detector
+    app.query_issue_counter = Counter(
+        'task_query_issues_total',
+        'Slow or repeated SQL statements detected per endpoint',
+        ['kind', 'endpoint'],
+        registry=registry
+    )
+    init_query_detector(app, app.query_issue_counter)
     
     return metrics, task_counter
 
+def init_metrics_endpoint(app, metrics):
+    """Serve /metrics, cached for METRICS_CACHE_SECONDS and gzipped."""
+    app.metrics_exposition = create_metrics_exposition(app.config, metrics.generate_metrics)
+
+    @app.route('/metrics')
+    @metrics.do_not_track()
+    def metrics_endpoint():
+        if 'name[]' in request.args:
+            # Filtered scrapes are rare; render them directly
+            text, content_type = metrics.generate_metrics(
+                request.headers.get('Accept'), request.args.getlist('name[]'))
+            return text, 200, {'Content-Type': content_type}
+        body, headers = app.metrics_exposition.response(
+            request.headers.get('Accept'), request.headers.get('Accept-Encoding'))
+        return body, 200, headers
+
+def apply_engine_profile(app):
+    """Replace SQLALCHEMY_ENGINE_OPTIONS with the profile for the database URL."""
+    if not app.config.get('SQLALCHEMY_DATABASE_URI'):
+        return
+    app.config.setdefault(CONFIGURED_OPTIONS_KEY, app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'], app.config)
+
+def init_engines(app):
+    """Attach the profile's connection hooks and the pool metrics to every engine."""
+    with app.app_context():
+        for engine in db.engines.values():
+            init_engine(engine, app.config, app.pool_metrics)
+
 def create_app(config_class=Config, registry=None):
     app = Flask(__name__)
     
@@ -40,6 +102,16 @@ def create_app(config_class=Config, registry=None):
     else:
         app.config.from_object(config_class)
 
+    # JSON encoding: orjson when available, otherwise the standard library
+    app.json = create_json_provider(app)
+
+    # Response compression. Registered first so it runs after every other
+    # after_request hook, on the final body
+    init_compression(app)
+
+    # Template bytecode cache and cached task fragments
+    init_templates(app)
+
     # Configure logging
     logger = logging.getLogger('app')
     logger.setLevel(logging.INFO)
@@ -52,52 +124,42 @@ def create_app(config_class=Config, registry=None):
         console_handler.setFormatter(formatter)
         logger.addHandler(console_handler)
 
-    # Initialize extensions
+    # Initialize extensions, with the engine profile for the database backend
+    apply_engine_profile(app)
+    # Optional read replica for GET views marked with read_replica
+    init_replica(app)
     db.init_app(app)
     
     # Initialize metrics
     metrics, task_counter = init_metrics(app, registry)
+    init_engines(app)
+
+    # Initialize the task response cache
+    app.task_cache = create_task_cache(app.config, app.cache_counter)
+
+    # Initialize the live task event hub
+    app.task_events = create_event_hub(app.config)
 
     # Register blueprints
     from app.routes import bp as routes_bp
     app.register_blueprint(routes_bp)
 
-    # Create all database tables
-    with app.app_context():
-        try:
-            db.create_all()
-            logger.info("Database tables created successfully")
-            
-            # Check and update database schema if needed
+    # Check the schema version (one query) unless booting fast. In fast-boot
+    # mode the schema is managed out of band with `flask db upgrade`.
+    if not app.config.get('FAST_BOOT', False):
+        with app.app_context():
             try:
-                # Check if the task table has timestamp columns
-                result = db.session.execute(text("SELECT column_name FROM information_schema.columns WHERE table_name = 'task' AND column_name = 'created_at'"))
-                has_created_at = result.scalar() is not None
-                
-                result = db.session.execute(text("SELECT column_name FROM information_schema.columns WHERE table_name = 'task' AND column_name = 'updated_at'"))
-                has_updated_at = result.scalar() is not None
-                
-                # Add missing columns if needed
-                if not has_created_at:
-                    logger.info("Adding created_at column to task table")
-                    db.session.execute(text("ALTER TABLE task ADD COLUMN created_at TIMESTAMP"))
-                    
-                if not has_updated_at:
-                    logger.info("Adding updated_at column to task table")
-                    db.session.execute(text("ALTER TABLE task ADD COLUMN updated_at TIMESTAMP"))
-                    
-                if not has_created_at or not has_updated_at:
-                    db.session.commit()
-                    logger.info("Database schema updated successfully")
-            
+                check_schema(app)
             except Exception as e:
-                db.session.rollback()
-                logger.warning(f"Could not update database schema: {str(e)}")
-                # Continue execution even if we can't add the columns
-        
-        except Exception as e:
-            logger.error(f"Error creating database tables: {str(e)}")
-            raise
+                logger.error(f"Error checking database schema: {str(e)}")
+                raise
+
+    app.cli.add_command(db_cli)
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Apply pending schema migrations (alias for `flask db upgrade`)."""
+        upgrade(db.engine)
 
     # Error handlers
     @app.errorhandler(404)
@@ -129,15 +191,19 @@ def create_app(config_class=Config, registry=None):
     )
 
     # Add metrics endpoint
-    @app.route('/metrics')
-    def metrics_endpoint():
-        return metrics.generate_latest(), 200, {'Content-Type': 'text/plain'}
+    init_metrics_endpoint(app, metrics)
 
     return app, metrics, request_count, request_latency, task_counter
 
-# Only create the global app instance if not being imported for testing
-if not any(arg in sys.argv[0].lower() for arg in ['pytest', 'test']):
-    app, metrics, request_count, request_latency, task_counter = create_app()
+_GLOBALS = ('app', 'metrics', 'request_count', 'request_latency', 'task_counter')
+
+def __getattr__(name):
+    """Create the global app instance on first access, so importing is side-effect free."""
+    if name not in _GLOBALS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals().update(zip(_GLOBALS, create_app()))
+    return globals()[name]
 
 if __name__ == '__main__':
+    app = create_app()[0]
     app.run(host=app.config.get('HOST', '0.0.0.0'), port=app.config.get('PORT', 5000))
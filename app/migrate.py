@@ -0,0 +1,193 @@
+"""Versioned schema migrations.
+
+Migration scripts live in ``migrations/versions`` and are named
+``NNNN_description.py``. Each one defines ``upgrade(connection)`` and may set
+``transactional = False`` to run outside a transaction, which online-safe steps
+such as ``CREATE INDEX CONCURRENTLY`` and batched backfills need. The highest
+applied version is recorded in the ``schema_version`` table, so checking the
+schema at startup is a single query.
+
+Usage::
+
+    flask db upgrade          # apply pending migrations
+    flask db current          # print the applied and latest versions
+"""
+import importlib.util
+import logging
+import os
+import re
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from app.database import db
+
+logger = logging.getLogger('app')
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations', 'versions')
+
+# Rows updated per statement by backfill_in_batches
+BACKFILL_BATCH_SIZE = int(os.getenv('MIGRATION_BATCH_SIZE', '1000'))
+
+# Key for the Postgres advisory lock serialising concurrent migration runs
+ADVISORY_LOCK_ID = 7243871
+
+_FILENAME = re.compile(r'^(\d{4})_(\w+)\.py$')
+
+Migration = namedtuple('Migration', ['version', 'name', 'path'])
+
+schema_version = db.Table(
+    'schema_version',
+    db.Column('version', db.Integer, primary_key=True),
+    db.Column('name', db.String(200), nullable=False),
+    db.Column('applied_at', db.DateTime, nullable=False),
+)
+
+
+def discover_migrations(directory=MIGRATIONS_DIR):
+    """Return the migration scripts in ``directory`` ordered by version."""
+    migrations = []
+    for filename in os.listdir(directory):
+        match = _FILENAME.match(filename)
+        if match:
+            migrations.append(Migration(int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    migrations.sort(key=lambda migration: migration.version)
+    versions = [migration.version for migration in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError("Duplicate migration versions in " + directory)
+    return migrations
+
+
+def load_migration(migration):
+    """Import a migration script as a module."""
+    spec = importlib.util.spec_from_file_location(f'migrations_{migration.version:04d}', migration.path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def current_version(engine):
+    """Return the highest applied migration version, or 0 for an unversioned database."""
+    with engine.connect() as connection:
+        try:
+            return connection.execute(select(func.max(schema_version.c.version))).scalar() or 0
+        except (OperationalError, ProgrammingError):
+            # schema_version does not exist yet
+            return 0
+
+
+@contextmanager
+def _migration_lock(engine):
+    """Serialise migration runs from several processes or hosts on Postgres."""
+    if engine.dialect.name != 'postgresql':
+        yield
+        return
+    with engine.connect() as connection:
+        connection.execute(text('SELECT pg_advisory_lock(:key)'), {'key': ADVISORY_LOCK_ID})
+        connection.commit()
+        try:
+            yield
+        finally:
+            connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': ADVISORY_LOCK_ID})
+            connection.commit()
+
+
+def upgrade(engine, target=None, directory=MIGRATIONS_DIR):
+    """Apply every migration newer than the current version, up to ``target``."""
+    migrations = discover_migrations(directory)
+    with _migration_lock(engine):
+        schema_version.create(engine, checkfirst=True)
+        applied = current_version(engine)
+        pending = [migration for migration in migrations
+                   if migration.version > applied and (target is None or migration.version <= target)]
+        for migration in pending:
+            _apply(engine, migration)
+        return pending
+
+
+def _apply(engine, migration):
+    module = load_migration(migration)
+    logger.info(f"Applying migration {migration.version:04d}_{migration.name}")
+    record = insert(schema_version).values(
+        version=migration.version, name=migration.name, applied_at=datetime.utcnow()
+    )
+    if getattr(module, 'transactional', True):
+        with engine.begin() as connection:
+            module.upgrade(connection)
+            connection.execute(record)
+    else:
+        with engine.connect() as connection:
+            module.upgrade(connection.execution_options(isolation_level='AUTOCOMMIT'))
+        with engine.begin() as connection:
+            connection.execute(record)
+
+
+def check_schema(app):
+    """Compare the database version with the migration scripts at startup.
+
+    Pending migrations are applied when AUTO_MIGRATE is set, otherwise only
+    reported. Must run inside an app context.
+    """
+    latest = max((migration.version for migration in discover_migrations()), default=0)
+    applied = current_version(db.engine)
+    if applied == latest:
+        return
+    if applied > latest:
+        logger.warning(f"Database schema version {applied} is newer than this code ({latest})")
+    elif app.config.get('AUTO_MIGRATE', True):
+        upgrade(db.engine)
+        logger.info(f"Database schema upgraded from version {applied} to {latest}")
+    else:
+        logger.warning(f"Database schema version {applied} is behind {latest}; run `flask db upgrade`")
+
+
+def create_index_concurrently(connection, name, table, columns):
+    """Create an index without blocking writes where the backend allows it.
+
+    On Postgres this must run in a non-transactional migration.
+    """
+    column_list = ', '.join(columns)
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({column_list})'))
+    else:
+        connection.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({column_list})'))
+
+
+def backfill_in_batches(connection, table, assignments, condition, params=None, batch_size=None):
+    """Run ``UPDATE table SET assignments WHERE condition`` a batch of rows at a time.
+
+    Each batch is its own statement, so in a non-transactional migration
+    locks are held only briefly and progress survives interruption.
+    """
+    batch_size = batch_size or BACKFILL_BATCH_SIZE
+    statement = text(
+        f'UPDATE {table} SET {assignments} WHERE id IN '
+        f'(SELECT id FROM {table} WHERE {condition} LIMIT :batch_size)'
+    )
+    total = 0
+    while True:
+        updated = connection.execute(statement, dict(params or {}, batch_size=batch_size)).rowcount
+        total += updated
+        if updated < batch_size:
+            return total
+
+
+db_cli = AppGroup('db', help='Manage the database schema.')
+
+
+@db_cli.command('upgrade')
+@click.option('--target', type=int, default=None, help='Stop after this version.')
+def upgrade_command(target):
+    """Apply pending migrations."""
+    applied = upgrade(db.engine, target=target)
+    click.echo(f"Applied {len(applied)} migration(s); schema is at version {current_version(db.engine)}")
+
+
+@db_cli.command('current')
+def current_command():
+    """Show the applied and latest schema versions."""
+    latest = max((migration.version for migration in discover_migrations()), default=0)
+    click.echo(f"Applied version: {current_version(db.engine)}, latest: {latest}")
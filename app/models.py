@@ -7,6 +7,14 @@ from sqlalchemy.orm import validates
 class Task(db.Model):
     """Task model for storing task items."""
     __tablename__ = 'task'  # Explicitly set table name
+    __table_args__ = (
+        # Filter by done, then order/keyset-page by creation time
+        db.Index('ix_task_done_created_at_id', 'done', 'created_at', 'id'),
+        # Sort and keyset-page all tasks by creation time
+        db.Index('ix_task_created_at_id', 'created_at', 'id'),
+        # updated_since filters and sort=updated_at
+        db.Index('ix_task_updated_at_id', 'updated_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
@@ -31,6 +39,11 @@ class Task(db.Model):
 
     @validates('title')
     def validate_title(self, key, title):
+        return self.clean_title(title)
+
+    @staticmethod
+    def clean_title(title):
+        """Validate a title and return it stripped, without needing an instance."""
         if not title or not isinstance(title, str):
             raise ValueError("Title must be a string")
         if not title.strip():
@@ -53,3 +66,18 @@ class Task(db.Model):
         if self.updated_at:
             result['updated_at'] = self.updated_at.isoformat()
         return result
+
+
+class TaskChange(db.Model):
+    """Append-only log of task writes, read by the incremental sync endpoint."""
+    __tablename__ = 'task_change'
+
+    # Monotonic change sequence; sync tokens point into it
+    seq = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.Integer, nullable=False, index=True)
+    # 'upsert' for creates and updates, 'delete' for tombstones
+    op = db.Column(db.String(10), nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<TaskChange {self.seq} {self.op} {self.task_id}>'
@@ -0,0 +1,131 @@
+"""Prometheus metrics shared by gunicorn workers.
+
+With PROMETHEUS_MULTIPROC_DIR set (gunicorn.conf.py points it at /dev/shm),
+every worker writes its samples to mmap files named after its pid and
+/metrics merges the files of all workers. Left alone the directory grows by
+a set of files per worker that ever ran, and ``max_requests`` recycles
+workers all the time, so each scrape gets slower.
+
+When a worker exits the master folds its files into one ``*_archive.db``
+file per metric type (``compact_dead_worker``), which keeps the totals while
+bounding the directory to the live workers plus the archives. Compaction
+holds an exclusive lock on the directory and collection a shared one, so a
+scrape never sees a dead worker's samples both in its own files and in the
+archive, or in neither.
+"""
+import fcntl
+import glob
+import os
+from contextlib import contextmanager
+from prometheus_client import CollectorRegistry
+from prometheus_client.exposition import choose_encoder
+from prometheus_client.mmap_dict import MmapedDict, mmap_key
+from prometheus_client.multiprocess import MultiProcessCollector, mark_process_dead
+from prometheus_flask_exporter import PrometheusMetrics
+
+LOCK_FILE = '.lock'
+ARCHIVE_PID = 'archive'
+
+# Gauge modes whose value survives the process that set it and can be folded
+# into an archive. Live gauges are removed by mark_process_dead; 'all' and
+# 'mostrecent' values belong to the dead process and are dropped.
+ARCHIVED_GAUGE_MODES = ('sum', 'max', 'min')
+
+
+def multiproc_dir():
+    """Return PROMETHEUS_MULTIPROC_DIR, or None when not running multiprocess."""
+    return os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+
+@contextmanager
+def _locked(path, operation):
+    with open(os.path.join(path, LOCK_FILE), 'a') as lock:
+        fcntl.flock(lock, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class LockedMultiProcessCollector(MultiProcessCollector):
+    """MultiProcessCollector that reads under the directory's shared lock."""
+
+    def collect(self):
+        with _locked(self._path, fcntl.LOCK_SH):
+            return list(super().collect())
+
+
+class MultiProcessPrometheusMetrics(PrometheusMetrics):
+    """PrometheusMetrics whose /metrics merges worker files with the locked collector."""
+
+    def generate_metrics(self, accept_header=None, names=None):
+        path = multiproc_dir()
+        if not path:
+            return super().generate_metrics(accept_header, names)
+        return generate_multiprocess_metrics(path, accept_header, names)
+
+
+def generate_multiprocess_metrics(path, accept_header=None, names=None):
+    """Render the merged metrics of every process writing to ``path``.
+
+    Returns the text and its content type, like ``PrometheusMetrics.generate_metrics``.
+    """
+    registry = CollectorRegistry()
+    LockedMultiProcessCollector(registry, path)
+    if names:
+        registry = registry.restricted_registry(names)
+    generate_latest, content_type = choose_encoder(accept_header)
+    return generate_latest(registry).decode('utf-8'), content_type
+
+
+def _write_archive(filename, metrics):
+    tmp = filename + '.tmp'
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    archive = MmapedDict(tmp)
+    try:
+        for metric in metrics:
+            for sample in metric.samples:
+                labels = {name: value for name, value in sample.labels.items() if name != 'pid'}
+                key = mmap_key(metric.name, sample.name, list(labels), list(labels.values()), metric.documentation)
+                archive.write_value(key, sample.value, 0.0)
+    finally:
+        archive.close()
+    # MultiProcessCollector only reads *.db files, so the temporary file is
+    # invisible until it replaces the archive
+    os.replace(tmp, filename)
+
+
+def compact_dead_worker(pid, path=None):
+    """Fold the metric files of the exited process ``pid`` into the archives.
+
+    Returns the number of files removed.
+    """
+    path = path or multiproc_dir()
+    if not path:
+        return 0
+    removed = 0
+    with _locked(path, fcntl.LOCK_EX):
+        mark_process_dead(pid, path)
+        prefixes = ['counter', 'histogram', 'summary'] + [f'gauge_{mode}' for mode in ARCHIVED_GAUGE_MODES]
+        for prefix in prefixes:
+            dead = os.path.join(path, f'{prefix}_{pid}.db')
+            if not os.path.exists(dead):
+                continue
+            archive = os.path.join(path, f'{prefix}_{ARCHIVE_PID}.db')
+            sources = [dead] + ([archive] if os.path.exists(archive) else [])
+            _write_archive(archive, MultiProcessCollector.merge(sources, accumulate=False))
+            os.remove(dead)
+            removed += 1
+        for mode in ('all', 'mostrecent'):
+            for dead in glob.glob(os.path.join(path, f'gauge_{mode}_{pid}.db')):
+                os.remove(dead)
+                removed += 1
+    return removed
+
+
+def prepare_multiproc_dir(path):
+    """Create ``path`` and remove metric files left by a previous run."""
+    os.makedirs(path, exist_ok=True)
+    for filename in glob.glob(os.path.join(path, '*.db')) + glob.glob(os.path.join(path, '*.db.tmp')):
+        os.remove(filename)
@@ -0,0 +1,43 @@
+import base64
+import json
+
+# Page size used when a client asks for a page without giving a limit
+DEFAULT_PAGE_SIZE = 50
+
+# Hard upper bound on a single page, regardless of what the client asks for
+MAX_PAGE_SIZE = 500
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def encode_cursor(payload):
+    """Encode a cursor payload as an opaque URL-safe token."""
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a token produced by encode_cursor back into its payload."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError):
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(payload, dict):
+        raise InvalidCursor("Invalid cursor")
+    return payload
+
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Parse the ``limit`` query parameter and clamp it to the maximum page size."""
+    if value is None or value == '':
+        return min(default, maximum)
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("Limit must be an integer")
+    if limit < 1:
+        raise ValueError("Limit must be a positive integer")
+    return min(limit, maximum)
@@ -0,0 +1,197 @@
+from collections import namedtuple
+from datetime import datetime, timezone
+from sqlalchemy import and_, or_, select
+from app.models import Task
+from app.pagination import InvalidCursor, decode_cursor, encode_cursor
+
+# Columns a client may request with ?fields=, in response order
+FIELDS = ('id', 'title', 'description', 'done', 'created_at', 'updated_at')
+
+# Columns a client may sort by with ?sort=; prefix with '-' for descending
+SORTABLE = ('id', 'title', 'created_at', 'updated_at')
+
+DATETIME_FIELDS = ('created_at', 'updated_at')
+
+# Query parameters that switch GET /api/tasks onto the query path
+QUERY_PARAMS = ('done', 'created_after', 'updated_since', 'sort', 'fields', 'limit', 'cursor')
+
+TaskQuery = namedtuple('TaskQuery', ['done', 'created_after', 'updated_since', 'sort', 'descending', 'fields'])
+
+
+def _parse_bool(name, value):
+    lowered = value.lower()
+    if lowered in ('1', 'true', 'yes'):
+        return True
+    if lowered in ('0', 'false', 'no'):
+        return False
+    raise ValueError(f"{name} must be true or false")
+
+
+def _parse_datetime(name, value):
+    # fromisoformat only accepts a 'Z' designator from Python 3.11
+    if value[-1:] in ('Z', 'z'):
+        value = value[:-1] + '+00:00'
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO 8601 datetime")
+    # Timestamps are stored as naive UTC
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+class TaskRecord:
+    """Read-only task row for rendering lists.
+
+    Templates use it like a Task, but it is built from a Core result row, so
+    it skips the identity map and attribute instrumentation and keeps about
+    a quarter of the memory of an ORM instance per row.
+    """
+    __slots__ = FIELDS
+
+    def __init__(self, id, title, description, done, created_at, updated_at):
+        self.id = id
+        self.title = title
+        self.description = description
+        self.done = done
+        self.created_at = created_at
+        self.updated_at = updated_at
+
+    def __repr__(self):
+        return f'<TaskRecord {self.title}>'
+
+    def to_dict(self):
+        return row_to_dict(self, FIELDS)
+
+
+def select_all_tasks():
+    """Core SELECT of every task column, in id order."""
+    return select(*[getattr(Task, field) for field in FIELDS]).order_by(Task.id)
+
+
+def fetch_task_records(session):
+    """Load every task as a TaskRecord."""
+    return [TaskRecord(*row) for row in session.execute(select_all_tasks()).tuples()]
+
+
+def parse_task_query(args):
+    """Parse filter, sort and projection parameters from a request's query string."""
+    done = args.get('done')
+    created_after = args.get('created_after')
+    updated_since = args.get('updated_since')
+
+    sort = args.get('sort') or 'id'
+    descending = sort.startswith('-')
+    sort = sort.lstrip('-')
+    if sort not in SORTABLE:
+        raise ValueError(f"sort must be one of: {', '.join(SORTABLE)}")
+
+    fields = FIELDS
+    if args.get('fields'):
+        fields = tuple(field.strip() for field in args['fields'].split(',') if field.strip())
+        unknown = [field for field in fields if field not in FIELDS]
+        if unknown or not fields:
+            raise ValueError(f"fields must be a comma separated list of: {', '.join(FIELDS)}")
+
+    return TaskQuery(
+        done=_parse_bool('done', done) if done else None,
+        created_after=_parse_datetime('created_after', created_after) if created_after else None,
+        updated_since=_parse_datetime('updated_since', updated_since) if updated_since else None,
+        sort=sort,
+        descending=descending,
+        fields=fields,
+    )
+
+
+def _sort_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def encode_keyset(query, row):
+    """Build the cursor pointing just after ``row`` in ``query``'s ordering."""
+    payload = {'id': row.id}
+    if query.sort != 'id':
+        payload['s'] = query.sort
+        payload['v'] = _sort_value(getattr(row, query.sort))
+    return encode_cursor(payload)
+
+
+def decode_keyset(query, token):
+    """Return (last id, last sort value) from a cursor made for the same sort."""
+    payload = decode_cursor(token)
+    after_id = payload.get('id')
+    if not isinstance(after_id, int) or isinstance(after_id, bool):
+        raise InvalidCursor("Invalid cursor")
+    if payload.get('s', 'id') != query.sort:
+        raise InvalidCursor("Cursor does not match sort order")
+    value = payload.get('v')
+    if query.sort in DATETIME_FIELDS and value is not None:
+        try:
+            value = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise InvalidCursor("Invalid cursor")
+    return after_id, value
+
+
+def _after(query, dialect_name, after_id, after_value):
+    """Keyset predicate selecting rows that sort after (after_value, after_id)."""
+    column = getattr(Task, query.sort)
+    if query.descending:
+        past = (lambda left, right: left < right)
+    else:
+        past = (lambda left, right: left > right)
+
+    if query.sort == 'id':
+        return past(Task.id, after_id)
+
+    # SQLite sorts NULL lowest and Postgres sorts it highest, so whether the
+    # NULL group comes first depends on both the backend and the direction
+    nulls_lowest = dialect_name in ('sqlite', 'mysql')
+    nulls_first = nulls_lowest != query.descending
+    if after_value is None:
+        predicate = and_(column.is_(None), past(Task.id, after_id))
+        return or_(predicate, column.isnot(None)) if nulls_first else predicate
+    predicate = or_(past(column, after_value), and_(column == after_value, past(Task.id, after_id)))
+    return predicate if nulls_first else or_(predicate, column.is_(None))
+
+
+def build_select(query, dialect_name, after=None, limit=None):
+    """Build a Core SELECT for ``query``, optionally continuing after a keyset cursor."""
+    names = list(query.fields)
+    # The cursor needs the id and sort column even if they are not returned
+    for required in ('id', query.sort):
+        if required not in names:
+            names.append(required)
+    statement = select(*[getattr(Task, name) for name in names])
+
+    if query.done is not None:
+        statement = statement.where(Task.done == query.done)
+    if query.created_after is not None:
+        statement = statement.where(Task.created_at > query.created_after)
+    if query.updated_since is not None:
+        statement = statement.where(Task.updated_at >= query.updated_since)
+    if after is not None:
+        statement = statement.where(_after(query, dialect_name, *after))
+
+    order = [Task.id] if query.sort == 'id' else [getattr(Task, query.sort), Task.id]
+    statement = statement.order_by(*[column.desc() if query.descending else column for column in order])
+    if limit is not None:
+        statement = statement.limit(limit)
+    return statement
+
+
+def row_to_dict(row, fields):
+    """Serialize a result row the same way Task.to_dict does, for ``fields`` only."""
+    result = {}
+    for field in fields:
+        value = getattr(row, field)
+        if field == 'description':
+            value = value or ''
+        elif field in DATETIME_FIELDS:
+            # Only add timestamp fields if they exist
+            if not value:
+                continue
+            value = value.isoformat()
+        result[field] = value
+    return result
@@ -0,0 +1,118 @@
+"""Slow query and N+1 detection.
+
+Every SQL statement run while handling a request is checked, using the time
+measured by the hooks in app/instrumentation.py. Statements slower than
+SLOW_QUERY_THRESHOLD_MS, and statements executed N_PLUS_ONE_THRESHOLD or more
+times with the same SQL in one request (the usual sign of a query per row),
+are logged as JSON lines with the endpoint that issued them and counted
+in ``task_query_issues_total``.
+
+QUERY_DETECTOR_MODE selects what happens: ``warn`` (the default) only logs
+and counts, ``raise`` also fails the request with QueryDetectorError once it
+completes, which the test suite uses, and ``off`` disables detection.
+"""
+import json
+import logging
+import os
+from flask import g, has_app_context, has_request_context, request
+from app.instrumentation import observe_statements
+
+logger = logging.getLogger('app')
+
+MODES = ('off', 'warn', 'raise')
+
+SLOW_QUERY_THRESHOLD_MS = 100
+N_PLUS_ONE_THRESHOLD = 5
+
+# Longest rendering of statement parameters included in a log line
+MAX_PARAMETERS_LENGTH = 500
+
+
+class QueryDetectorError(AssertionError):
+    """Raised in ``raise`` mode when a request ran a slow or repeated query."""
+
+
+class QueryLog:
+    """Statements executed during one request."""
+    __slots__ = ('slow_ms', 'counts', 'issues', 'last_context')
+
+    def __init__(self, slow_ms):
+        self.slow_ms = slow_ms
+        self.counts = {}
+        self.issues = []
+        self.last_context = None
+
+
+def _endpoint():
+    return (request.endpoint or 'unmatched') if has_request_context() else None
+
+
+def _parameters(parameters):
+    text = repr(parameters)
+    if len(text) > MAX_PARAMETERS_LENGTH:
+        text = text[:MAX_PARAMETERS_LENGTH] + '...'
+    return text
+
+
+@observe_statements
+def _observe_statement(statement, parameters, context, elapsed):
+    query_log = g.get('query_log') if has_app_context() else None
+    if query_log is None:
+        return
+    elapsed_ms = elapsed * 1000
+    # A bulk insert may be sent as several batches of one execution; count
+    # it once
+    if context is None or context is not query_log.last_context:
+        query_log.counts[statement] = query_log.counts.get(statement, 0) + 1
+        query_log.last_context = context
+
+    threshold = query_log.slow_ms
+    if elapsed_ms >= threshold:
+        query_log.issues.append({
+            'event': 'slow_query',
+            'endpoint': _endpoint(),
+            'duration_ms': round(elapsed_ms, 2),
+            'threshold_ms': threshold,
+            'statement': statement,
+            'parameters': _parameters(parameters),
+        })
+
+
+def init_query_detector(app, counter):
+    """Watch the statements of every request on ``app``, counting issues in ``counter``."""
+    mode = app.config.get('QUERY_DETECTOR_MODE') or os.getenv('QUERY_DETECTOR_MODE', 'warn')
+    if mode not in MODES:
+        raise ValueError(f"QUERY_DETECTOR_MODE must be one of: {', '.join(MODES)}")
+    if mode == 'off':
+        return
+    slow_ms = app.config.get('SLOW_QUERY_THRESHOLD_MS', SLOW_QUERY_THRESHOLD_MS)
+    repeat_threshold = app.config.get('N_PLUS_ONE_THRESHOLD', N_PLUS_ONE_THRESHOLD)
+
+    @app.before_request
+    def start_query_log():
+        g.query_log = QueryLog(slow_ms)
+
+    @app.after_request
+    def check_query_log(response):
+        query_log = g.pop('query_log', None)
+        if query_log is None:
+            return response
+        issues = query_log.issues
+        for statement, count in query_log.counts.items():
+            if count >= repeat_threshold:
+                issues.append({
+                    'event': 'n_plus_one',
+                    'endpoint': _endpoint(),
+                    'count': count,
+                    'threshold': repeat_threshold,
+                    'statement': statement,
+                })
+        for issue in issues:
+            counter.labels(kind=issue['event'], endpoint=issue['endpoint']).inc()
+            logger.warning(json.dumps(issue, default=str))
+        if issues and mode == 'raise':
+            raise QueryDetectorError(
+                f"{len(issues)} query issue(s) in {request.method} {request.path}: "
+                + '; '.join(f"{issue['event']}: {issue['statement']}" for issue in issues)
+            )
+        return response
@@ -0,0 +1,82 @@
+"""Read replica routing.
+
+With SQLALCHEMY_REPLICA_URI set the app gets a second bind, ``replica``.
+Views decorated with ``read_replica`` run their queries against it; writes
+and every other view use the primary.
+
+A replica lags the primary, so a client that just wrote would not see its
+own change on the next read. Every successful write therefore sets a cookie
+that keeps that client's reads on the primary for REPLICA_STICKY_SECONDS.
+The task cache is keyed on the version the read saw, so such a client never
+gets a cached response built from an older replica. Other clients may see
+the old data until the replica catches up.
+"""
+import functools
+import time
+from flask import current_app, g, request
+from app.database import REPLICA_BIND
+from app.engine import engine_options
+
+REPLICA_STICKY_SECONDS = 5
+REPLICA_STICKY_COOKIE = 'db_primary_until'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def replica_enabled(app):
+    return bool(app.config.get('SQLALCHEMY_REPLICA_URI'))
+
+
+def reads_from_primary():
+    """True while a replica is configured and the client is inside its read-your-writes window."""
+    if not replica_enabled(current_app):
+        return False
+    cookie_name = current_app.config.get('REPLICA_STICKY_COOKIE', REPLICA_STICKY_COOKIE)
+    try:
+        return float(request.cookies.get(cookie_name, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def read_replica(view):
+    """Run ``view`` against the read replica unless the client wrote recently.
+
+    A streamed body is generated after the view returns and reads from the
+    primary.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if reads_from_primary() or not replica_enabled(current_app):
+            return view(*args, **kwargs)
+        g.use_replica = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            g.pop('use_replica', None)
+    return wrapper
+
+
+def init_replica(app):
+    """Add the replica bind and the read-your-writes cookie when a replica is configured.
+
+    Call before ``db.init_app`` so the bind's engine is created with the others.
+    """
+    replica_uri = app.config.get('SQLALCHEMY_REPLICA_URI')
+    if not replica_uri:
+        return
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    binds[REPLICA_BIND] = {'url': replica_uri, **engine_options(replica_uri, app.config)}
+    app.config['SQLALCHEMY_BINDS'] = binds
+
+    sticky_seconds = app.config.get('REPLICA_STICKY_SECONDS', REPLICA_STICKY_SECONDS)
+    cookie_name = app.config.get('REPLICA_STICKY_COOKIE', REPLICA_STICKY_COOKIE)
+
+    @app.after_request
+    def stick_to_primary(response):
+        if request.method not in SAFE_METHODS and response.status_code < 400 and sticky_seconds > 0:
+            response.set_cookie(
+                cookie_name, f'{time.time() + sticky_seconds:.3f}', max_age=sticky_seconds,
+                httponly=True, samesite='Lax',
+                secure=app.config.get('SESSION_COOKIE_SECURE', False)
+            )
+        return response
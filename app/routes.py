@@ -1,17 +1,94 @@
-from flask import jsonify, request, render_template, current_app, Blueprint
-from sqlalchemy import text
+from datetime import datetime
+from flask import (
+    jsonify, request, render_template, current_app, Blueprint, Response, make_response,
+    stream_with_context, url_for
+)
+from sqlalchemy import select, text
 from app.models import Task
 from app.database import db
+from app.conditional import (
+    collection_validators, is_not_modified, not_modified_response, task_validators
+)
+from app.changes import decode_since, encode_since, read_changes
+from app.events import task_event
+from app.fragments import task_event_html, task_fragment
+from app.batch import MAX_BATCH_OPERATIONS, BatchValidationError, apply_batch, validate_batch
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, parse_limit
+from app.replica import read_replica
+from app.queries import (
+    FIELDS, QUERY_PARAMS, build_select, decode_keyset, encode_keyset, fetch_task_records,
+    parse_task_query, select_all_tasks
+)
 import logging
 
 # Set up logging
 logger = logging.getLogger('app')
 logger.setLevel(logging.INFO)
 
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Seconds between keep-alive comments on an idle event stream
+EVENTS_HEARTBEAT = 15
+
+# Number of rows fetched per round trip when streaming the task export
+STREAM_BATCH_SIZE = 500
+
+# Tasks on the first screen of the index page, newest first; scrolling to
+# the end loads the next page
+INDEX_PAGE_SIZE = 50
+INDEX_SORT = '-id'
+
 # Create blueprint
 bp = Blueprint('main', __name__)
 
+def response_variant():
+    """Name the representation a GET will produce, for use in cache keys."""
+    return 'html' if request.headers.get('HX-Request') else 'json'
+
+def read_through(build, validators):
+    """Serve a GET from the task cache, building and storing the response on a miss.
+
+    ``validators`` returns the (etag, last_modified) pair for the resource, or
+    None if it does not exist. A matching conditional request is answered with
+    304 before anything is serialized; otherwise the ETag is the cache key.
+    """
+    try:
+        etag, last_modified = validators() or (None, None)
+    except Exception as e:
+        # Let build() report the failure through its own error handling
+        logger.warning(f"Could not compute validators: {str(e)}")
+        etag = last_modified = None
+    if etag and is_not_modified(etag, last_modified):
+        current_app.task_counter.labels(operation='read').inc()
+        return not_modified_response(etag, last_modified)
+
+    cache = current_app.task_cache if etag else None
+    if cache is not None:
+        key = cache.response_key(etag)
+        cached = cache.get(key)
+        if cached is not None:
+            current_app.task_counter.labels(operation='read').inc()
+            return Response(cached['body'], headers=cached['headers'])
+
+    response = make_response(build())
+    if etag and response.status_code == 200:
+        response.set_etag(etag)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        response.vary.add('HX-Request')
+    if cache is not None and response.status_code == 200 and not response.is_streamed:
+        headers = [(name, value) for name, value in response.headers
+                   if name.lower() != 'content-length']
+        cache.set(key, {'body': response.get_data(), 'headers': headers})
+    return response
+
+def publish_events(*events):
+    """Push task events to live subscribers once a write has committed."""
+    if current_app.task_events is not None:
+        current_app.task_events.publish(list(events))
+
 @bp.route('/health', methods=['GET'])
+@read_replica
 def health_check():
     """Health check endpoint for monitoring."""
     try:
@@ -29,25 +106,140 @@ def health_check():
         }), 500
 
 @bp.route('/')
+@read_replica
 def index():
     """Render the index page."""
+    return read_through(
+        render_index,
+        lambda: collection_validators('index', '')
+    )
+
+def render_index():
     try:
-        tasks = Task.query.all()
+        page_size = current_app.config.get('TASKS_INDEX_PAGE_SIZE', INDEX_PAGE_SIZE)
+        tasks, next_cursor = fetch_task_page(parse_task_query({'sort': INDEX_SORT}), page_size)
         current_app.task_counter.labels(operation='read').inc()
-        return render_template('index.html', tasks=tasks)
+        return render_template(
+            'index.html', tasks=tasks,
+            first_page_url=url_for('main.get_tasks', sort=INDEX_SORT, limit=page_size),
+            live_events=current_app.task_events is not None,
+            next_url=next_page_url(next_cursor, sort=INDEX_SORT, limit=page_size)
+        )
     except Exception as e:
         logger.error(f"Error retrieving tasks: {str(e)}")
         return render_template('index.html', error=str(e)), 500
 
 @bp.route('/api/tasks', methods=['GET'])
+@read_replica
 def get_tasks():
-    """Get all tasks."""
+    """Get all tasks, or a single keyset page when ``limit``/``cursor`` is given."""
+    if wants_stream():
+        return stream_tasks()
+    return read_through(
+        build_tasks_response,
+        lambda: collection_validators(response_variant(), request.query_string.decode())
+    )
+
+def build_tasks_response():
+    if any(param in request.args for param in QUERY_PARAMS):
+        return query_tasks()
     try:
-        tasks = Task.query.all()
-        current_app.task_counter.labels(operation='read').inc()
         if request.headers.get('HX-Request'):
+            tasks = fetch_task_records(db.session)
+            current_app.task_counter.labels(operation='read').inc()
             return render_template('task_list.html', tasks=tasks)
-        return jsonify([task.to_dict() for task in tasks])
+        rows = db.session.execute(select_all_tasks()).all()
+        current_app.task_counter.labels(operation='read').inc()
+        return Response(current_app.json.rows_to_json(rows, FIELDS) + b'\n', mimetype='application/json')
+    except Exception as e:
+        logger.error(f"Error retrieving tasks: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+def wants_stream():
+    """Check whether the client asked for the streaming NDJSON export."""
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+
+def stream_tasks():
+    """Stream every task as newline-delimited JSON, reading rows in batches."""
+    batch_size = current_app.config.get('TASKS_STREAM_BATCH_SIZE', STREAM_BATCH_SIZE)
+
+    def generate():
+        try:
+            # yield_per keeps only one batch of rows alive at a time and uses a
+            # server-side cursor on backends that support it
+            result = db.session.execute(
+                select(*[getattr(Task, field) for field in FIELDS])
+                .order_by(Task.id)
+                .execution_options(yield_per=batch_size)
+            )
+            encode = current_app.json.row_encoder(tuple(result.keys()), FIELDS)
+            for row in result:
+                yield encode(row) + b'\n'
+        except Exception as e:
+            # Headers are already sent, so the best we can do is log and stop
+            logger.error(f"Error streaming tasks: {str(e)}")
+
+    current_app.task_counter.labels(operation='read').inc()
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+
+def fetch_task_page(query, limit=None, after=None):
+    """Run ``query`` and return its rows with the cursor of the next page, if any."""
+    # Fetch one extra row to learn whether another page exists
+    statement = build_select(
+        query, db.engine.dialect.name, after=after,
+        limit=limit + 1 if limit else None
+    )
+    rows = db.session.execute(statement).all()
+    next_cursor = None
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_keyset(query, rows[-1])
+    return rows, next_cursor
+
+def next_page_url(cursor, **args):
+    """URL of the task list fragment continuing after ``cursor``, or None on the last page."""
+    return url_for('main.get_tasks', **args, cursor=cursor) if cursor else None
+
+def query_tasks():
+    """Return tasks filtered, sorted and projected in SQL, paged when ``limit``/``cursor`` is given."""
+    paged = 'limit' in request.args or 'cursor' in request.args
+    try:
+        query = parse_task_query(request.args)
+        if request.headers.get('HX-Request'):
+            # Templates need every column
+            query = query._replace(fields=FIELDS)
+        limit = after = None
+        if paged:
+            limit = parse_limit(
+                request.args.get('limit'),
+                default=current_app.config.get('TASKS_PAGE_SIZE', DEFAULT_PAGE_SIZE),
+                maximum=current_app.config.get('TASKS_MAX_PAGE_SIZE', MAX_PAGE_SIZE),
+            )
+            cursor = request.args.get('cursor')
+            after = decode_keyset(query, cursor) if cursor else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        rows, next_cursor = fetch_task_page(query, limit, after)
+
+        current_app.task_counter.labels(operation='read').inc()
+        if request.headers.get('HX-Request'):
+            headers = {'X-Next-Cursor': next_cursor} if next_cursor else {}
+            args = {name: value for name, value in request.args.items() if name != 'cursor'}
+            return render_template(
+                'task_list.html', tasks=rows, next_url=next_page_url(next_cursor, **args)
+            ), 200, headers
+        # Rows go straight to JSON; this is the hot path for large lists
+        tasks = current_app.json.rows_to_json(rows, query.fields)
+        if paged:
+            tasks = (b'{"next_cursor":' + current_app.json.dumps(next_cursor).encode('utf-8')
+                     + b',"tasks":' + tasks + b'}')
+        return Response(tasks + b'\n', mimetype='application/json')
     except Exception as e:
         logger.error(f"Error retrieving tasks: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -67,11 +259,12 @@ def create_task():
         db.session.add(task)
         db.session.commit()
         
+        publish_events(task_event('create', task.id, task.to_dict()))
         current_app.task_counter.labels(operation='create').inc()
         logger.info(f"Created new task: {task.title}")
         
         if request.headers.get('HX-Request'):
-            return render_template('task.html', task=task), 201
+            return task_fragment(task), 201
         return jsonify(task.to_dict()), 201
     
     except Exception as e:
@@ -79,9 +272,123 @@ def create_task():
         logger.error(f"Error creating task: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@bp.route('/api/tasks/batch', methods=['POST'])
+def batch_tasks():
+    """Apply a list of create/update/delete operations in one transaction."""
+    data = request.get_json(silent=True)
+    items = data.get('operations') if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return jsonify({"error": "Request body must be a list of operations"}), 400
+
+    max_operations = current_app.config.get('TASKS_BATCH_MAX_OPERATIONS', MAX_BATCH_OPERATIONS)
+    if len(items) > max_operations:
+        return jsonify({"error": f"Batch cannot contain more than {max_operations} operations"}), 413
+
+    try:
+        operations = validate_batch(items)
+        results = apply_batch(operations)
+    except BatchValidationError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e), "results": e.errors}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error applying task batch: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+    publish_events(*[task_event(result['op'], result['id']) for result in results])
+    for operation in ('create', 'update', 'delete'):
+        count = sum(1 for result in results if result['op'] == operation)
+        if count:
+            current_app.task_counter.labels(operation=operation).inc(count)
+    logger.info(f"Applied batch of {len(results)} task operations")
+
+    return jsonify({"results": results})
+
+@bp.route('/api/tasks/changes', methods=['GET'])
+def get_task_changes():
+    """Return tasks created, updated or deleted since a sync token."""
+    try:
+        since = decode_since(request.args.get('since'))
+        limit = parse_limit(
+            request.args.get('limit'),
+            default=current_app.config.get('TASKS_PAGE_SIZE', DEFAULT_PAGE_SIZE),
+            maximum=current_app.config.get('TASKS_MAX_PAGE_SIZE', MAX_PAGE_SIZE),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        changes, last_seq, has_more = read_changes(since, limit)
+        current_app.task_counter.labels(operation='read').inc()
+        return jsonify({
+            'changes': changes,
+            'next_since': encode_since(last_seq),
+            'has_more': has_more
+        })
+    except Exception as e:
+        logger.error(f"Error retrieving task changes: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@bp.route('/api/tasks/events', methods=['GET'])
+def task_events():
+    """Stream task create/update/delete events as Server-Sent Events.
+
+    Every event is sent as ``event: task`` with a JSON body. After a
+    ``resync`` event, or on reconnect, clients should catch up through
+    /api/tasks/changes or by reloading the list. ``?format=html`` sends the
+    index page's HTML events instead (see ``task_event_html``).
+    """
+    hub = current_app.task_events
+    if hub is None:
+        return jsonify({"error": "Live task events are disabled"}), 404
+
+    subscription = hub.subscribe()
+    heartbeat = current_app.config.get('TASK_EVENTS_HEARTBEAT', EVENTS_HEARTBEAT)
+    if request.args.get('format') == 'html':
+        fragment_cache = current_app.fragment_cache
+
+        def format_event(event):
+            return task_event_html(event, fragment_cache)
+    else:
+        dumps = current_app.json.dumps
+
+        def format_event(event):
+            return f'event: task\ndata: {dumps(event)}\n\n'
+
+    def generate():
+        try:
+            yield f'retry: {heartbeat * 1000}\n\n'
+            while True:
+                event = subscription.get(timeout=heartbeat)
+                if event is None:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield format_event(event)
+                if subscription.overflowed and event['op'] == 'resync':
+                    return
+        finally:
+            subscription.close()
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @bp.route('/api/tasks/<int:task_id>', methods=['GET'])
+@read_replica
 def get_task(task_id):
     """Get a specific task."""
+    return read_through(
+        lambda: build_task_response(task_id),
+        lambda: detail_validators(task_id)
+    )
+
+def detail_validators(task_id):
+    task = db.session.get(Task, task_id)
+    return task_validators(task, response_variant()) if task else None
+
+def build_task_response(task_id):
     try:
         task = db.session.get(Task, task_id)
         if not task:
@@ -89,7 +396,7 @@ def get_task(task_id):
         
         current_app.task_counter.labels(operation='read').inc()
         if request.headers.get('HX-Request'):
-            return render_template('task.html', task=task)
+            return task_fragment(task)
         return jsonify(task.to_dict())
     
     except Exception as e:
@@ -105,13 +412,15 @@ def update_task(task_id):
             return jsonify({"error": "Task not found"}), 404
         
         task.done = not task.done
+        task.updated_at = datetime.utcnow()
         db.session.commit()
         
+        publish_events(task_event('update', task_id, task.to_dict()))
         current_app.task_counter.labels(operation='update').inc()
         logger.info(f"Updated task {task_id} completion status to {task.done}")
         
         if request.headers.get('HX-Request'):
-            return render_template('task.html', task=task)
+            return task_fragment(task)
         return jsonify(task.to_dict())
     
     except Exception as e:
@@ -130,6 +439,7 @@ def delete_task(task_id):
         db.session.delete(task)
         db.session.commit()
         
+        publish_events(task_event('delete', task_id))
         current_app.task_counter.labels(operation='delete').inc()
         logger.info(f"Deleted task {task_id}")
         
@@ -0,0 +1,159 @@
+"""JSON encoding for API responses.
+
+FastJSONProvider replaces Flask's JSON provider. It encodes with orjson when
+that is installed and falls back to the standard library otherwise. Its
+``rows_to_json``/``row_encoder`` methods serialize Core result rows for the
+task list endpoints directly, without loading ORM objects or calling
+``Task.to_dict()``.
+"""
+import time
+from json.encoder import encode_basestring_ascii
+from flask.json.provider import DefaultJSONProvider
+from app.instrumentation import record_serialization
+from app.queries import DATETIME_FIELDS
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised when orjson is missing
+    orjson = None
+
+# Row encoders kept per provider, one per (columns, fields) shape
+ROW_ENCODER_CACHE_SIZE = 64
+
+# dumps() keyword arguments the orjson path understands
+_ORJSON_KWARGS = {'default', 'ensure_ascii', 'sort_keys', 'indent', 'separators'}
+
+
+def _encode_datetime(value):
+    return '"' + value.isoformat() + '"'
+
+
+# Per-column encoders for the standard library row path. Their output matches
+# what jsonify produces for row_to_dict()
+_COLUMN_ENCODERS = {
+    'id': str,
+    'title': encode_basestring_ascii,
+    'description': lambda value: encode_basestring_ascii(value or ''),
+    'done': lambda value: 'null' if value is None else ('true' if value else 'false'),
+    'created_at': _encode_datetime,
+    'updated_at': _encode_datetime,
+}
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that uses orjson when ``use_orjson`` is set.
+
+    Output is always compact unless ``indent`` is given. Values orjson cannot
+    encode itself, including dates, go through the same ``default`` hook as
+    the standard provider. Calls with options orjson lacks, such as
+    ``indent=4``, use the standard library.
+    """
+
+    def __init__(self, app, use_orjson=None):
+        super().__init__(app)
+        self.use_orjson = orjson is not None if use_orjson is None else use_orjson
+        if self.use_orjson and orjson is None:
+            raise RuntimeError("JSON_BACKEND=orjson needs the orjson package")
+        self._row_encoders = {}
+
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._dumps(obj, **kwargs)
+        finally:
+            record_serialization(time.perf_counter() - started)
+
+    def _dumps(self, obj, **kwargs):
+        if not self.use_orjson or not set(kwargs) <= _ORJSON_KWARGS or kwargs.get('indent') not in (None, 2):
+            kwargs.setdefault('separators', (',', ':') if kwargs.get('indent') is None else None)
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent') == 2:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=kwargs.get('default', self.default), option=option).decode('utf-8')
+        except TypeError:
+            # e.g. integers wider than 64 bits
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if self.use_orjson and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def row_encoder(self, columns, fields):
+        """Return a function encoding one row with ``columns`` as a JSON object of ``fields``.
+
+        The object has the same keys and values as ``row_to_dict``: a missing
+        description becomes '' and missing timestamps are left out. Encoders
+        are built once per shape and kept on the provider.
+        """
+        key = (columns, fields)
+        encode = self._row_encoders.get(key)
+        if encode is None:
+            if len(self._row_encoders) >= ROW_ENCODER_CACHE_SIZE:
+                # ?fields= makes the set of shapes open-ended; start over
+                self._row_encoders.clear()
+            encode = self._row_encoders[key] = self._build_row_encoder(columns, fields)
+        return encode
+
+    def _build_row_encoder(self, columns, fields):
+        names = sorted(fields)
+        positions = [(name, columns.index(name)) for name in names]
+        optional = [name for name in names if name in DATETIME_FIELDS]
+
+        if self.use_orjson:
+            def to_object(row):
+                obj = {name: row[index] for name, index in positions}
+                if 'description' in obj and obj['description'] is None:
+                    obj['description'] = ''
+                for name in optional:
+                    if not obj[name]:
+                        del obj[name]
+                return obj
+
+            def encode(row):
+                return orjson.dumps(to_object(row))
+            encode.to_object = to_object
+            return encode
+
+        plan = [('"' + name + '":', index, _COLUMN_ENCODERS[name], name in optional)
+                for name, index in positions]
+
+        def encode(row):
+            parts = []
+            for key, index, encode_value, skip_empty in plan:
+                value = row[index]
+                if skip_empty and not value:
+                    continue
+                parts.append(key + encode_value(value))
+            return ('{' + ','.join(parts) + '}').encode('ascii')
+        return encode
+
+    def rows_to_json(self, rows, fields):
+        """Encode result rows as a JSON array of objects restricted to ``fields``."""
+        started = time.perf_counter()
+        try:
+            return self._rows_to_json(rows, fields)
+        finally:
+            record_serialization(time.perf_counter() - started)
+
+    def _rows_to_json(self, rows, fields):
+        if not rows:
+            return b'[]'
+        encode = self.row_encoder(tuple(rows[0]._fields), tuple(fields))
+        if self.use_orjson:
+            return orjson.dumps([encode.to_object(row) for row in rows])
+        return b'[' + b','.join(encode(row) for row in rows) + b']'
+
+
+def create_json_provider(app):
+    """Build the JSON provider selected by JSON_BACKEND: 'auto', 'orjson' or 'stdlib'."""
+    backend_name = app.config.get('JSON_BACKEND', 'auto')
+    if backend_name == 'auto':
+        return FastJSONProvider(app)
+    if backend_name in ('orjson', 'stdlib'):
+        return FastJSONProvider(app, use_orjson=backend_name == 'orjson')
+    raise ValueError(f"Unknown JSON_BACKEND: {backend_name}")
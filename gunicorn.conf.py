@@ -6,12 +6,27 @@ bind = "0.0.0.0:" + str(os.getenv("PORT", "5000"))
 backlog = 2048
 
 # Worker processes
-workers = 2  # Reduced from CPU count * 2 + 1 to prevent memory issues
-worker_class = "sync"
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))  # Reduced from CPU count * 2 + 1 to prevent memory issues
+# Threaded workers by default: every open live event stream holds a thread.
+# Use "uvicorn.workers.UvicornWorker" together with app.asgi:app for async serving
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+# Threads per worker; more than 1 switches the sync worker to gthread. Set in
+# the environment so the app sizes its connection pool to match.
+os.environ.setdefault("GUNICORN_THREADS", "8")
+threads = int(os.environ["GUNICORN_THREADS"])
 worker_connections = 1000
 timeout = 120  # Increased timeout
 keepalive = 2
 
+# Live task events. A single-threaded sync worker would be tied up by one open
+# stream, so they are off there; with several workers, events published in one
+# are forwarded to the others over unix sockets. The app reads the setting
+# when it is loaded, after this file.
+if worker_class == "sync" and threads == 1:
+    os.environ.setdefault("TASK_EVENTS_BACKEND", "none")
+elif workers > 1:
+    os.environ.setdefault("TASK_EVENTS_BACKEND", "socket")
+
 # Logging
 accesslog = "-"
 errorlog = "-"
@@ -32,11 +47,27 @@ user = None
 group = None
 tmp_upload_dir = None
 
+# Load the app once in the master and fork workers from it, so schema setup and
+# imports are not repeated per worker or when max_requests recycles one
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() in ("1", "true", "yes")
+
 # Memory settings
 max_requests = 1000
 max_requests_jitter = 50
 worker_tmp_dir = "/dev/shm"  # Use RAM for temporary files
 
+# Prometheus multiprocess mode: workers write metric samples to mmap files in
+# RAM and /metrics merges them. prometheus_client picks its storage when it is
+# first imported, so this has to happen before the app is loaded. Set
+# PROMETHEUS_MULTIPROC_DIR to an empty string to keep per-worker metrics.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/dev/shm/task-manager-metrics")
+if os.environ["PROMETHEUS_MULTIPROC_DIR"]:
+    from app.multiprocess import prepare_multiproc_dir
+
+    prepare_multiproc_dir(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+else:
+    del os.environ["PROMETHEUS_MULTIPROC_DIR"]
+
 # Server hooks
 def on_starting(server):
     pass
@@ -44,5 +75,70 @@ def on_starting(server):
 def on_reload(server):
     pass
 
+def when_ready(server):
+    """Serve /metrics from the master on METRICS_PORT, away from the workers."""
+    port = os.getenv("METRICS_PORT")
+    if not port:
+        return
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not path:
+        server.log.warning("METRICS_PORT needs PROMETHEUS_MULTIPROC_DIR; not starting the metrics server")
+        return
+    from app.exposition import MetricsExposition, METRICS_CACHE_SECONDS, start_metrics_server
+    from app.multiprocess import generate_multiprocess_metrics
+
+    exposition = MetricsExposition(
+        lambda accept_header: generate_multiprocess_metrics(path, accept_header),
+        int(os.getenv("METRICS_CACHE_SECONDS", str(METRICS_CACHE_SECONDS))),
+    )
+    start_metrics_server(exposition, int(port), os.getenv("METRICS_HOST", "0.0.0.0"))
+
 def on_exit(server):
-    pass 
\ No newline at end of file
+    """Remove the metric files of this run."""
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        from app.multiprocess import prepare_multiproc_dir
+
+        prepare_multiproc_dir(path)
+
+def pre_fork(server, worker):
+    """Leave the preloaded master's connection pools out of task_db_pool_capacity."""
+    if not server.cfg.preload_app:
+        return
+    wsgi_app = server.app.wsgi()
+    flask_app = getattr(wsgi_app, "flask_app", wsgi_app)
+    pool_metrics = getattr(flask_app, "pool_metrics", None)
+    if pool_metrics is not None:
+        pool_metrics.clear_capacity()
+
+def post_fork(server, worker):
+    """Drop database connections inherited from the preloaded master."""
+    if not server.cfg.preload_app:
+        return
+    from app.database import db
+
+    wsgi_app = server.app.wsgi()
+    flask_app = getattr(wsgi_app, "flask_app", wsgi_app)
+    with flask_app.app_context():
+        for engine in db.engines.values():
+            # close=False leaves the parent's sockets alone; the child just
+            # starts with an empty pool
+            engine.dispose(close=False)
+
+    async_engine = getattr(wsgi_app, "engine", None)
+    if async_engine is not None:
+        async_engine.sync_engine.dispose(close=False)
+
+def worker_exit(server, worker):
+    """Remove the worker's live task event socket."""
+    wsgi_app = server.app.wsgi()
+    flask_app = getattr(wsgi_app, "flask_app", wsgi_app)
+    hub = getattr(flask_app, "task_events", None)
+    if hub is not None and hub.fanout is not None:
+        hub.fanout.close()
+
+def child_exit(server, worker):
+    """Fold the exited worker's metric files into the archive files."""
+    from app.multiprocess import compact_dead_worker
+
+    compact_dead_worker(worker.pid)
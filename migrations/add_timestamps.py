@@ -1,6 +1,7 @@
 from app import create_app
+from app.config import Config
 from app.database import db
-from sqlalchemy import text
+from app.migrate import current_version, upgrade
 import logging
 
 logger = logging.getLogger('migrations')
@@ -9,41 +10,32 @@ handler = logging.StreamHandler()
 handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
 logger.addHandler(handler)
 
+
+class MigrationConfig(Config):
+    # Let this script apply the migrations instead of app startup
+    FAST_BOOT = True
+
+
 def run_migration():
-    """Add timestamp columns to task table if they don't exist."""
-    logger.info("Starting migration: Adding timestamp columns to task table")
-    
+    """Apply pending schema migrations.
+
+    Deprecated: kept for existing deploy scripts, use `flask db upgrade`.
+    """
+    logger.info("Starting migration")
+
     # Get the Flask app
-    app_instance, _, _, _, _ = create_app()
-    
+    app_instance, _, _, _, _ = create_app(MigrationConfig)
+
     with app_instance.app_context():
         try:
-            # Check if columns exist
-            result = db.session.execute(text("SELECT column_name FROM information_schema.columns WHERE table_name = 'task' AND column_name = 'created_at'"))
-            has_created_at = result.scalar() is not None
-            
-            result = db.session.execute(text("SELECT column_name FROM information_schema.columns WHERE table_name = 'task' AND column_name = 'updated_at'"))
-            has_updated_at = result.scalar() is not None
-            
-            # Add columns if they don't exist
-            if not has_created_at:
-                logger.info("Adding created_at column to task table")
-                db.session.execute(text("ALTER TABLE task ADD COLUMN created_at TIMESTAMP"))
-                
-            if not has_updated_at:
-                logger.info("Adding updated_at column to task table")
-                db.session.execute(text("ALTER TABLE task ADD COLUMN updated_at TIMESTAMP"))
-                
-            if not has_created_at or not has_updated_at:
-                db.session.commit()
-                logger.info("Migration completed successfully")
+            applied = upgrade(db.engine)
+            if applied:
+                logger.info(f"Migration completed successfully, schema is at version {current_version(db.engine)}")
             else:
-                logger.info("No migration needed, columns already exist")
-                
+                logger.info("No migration needed, schema is up to date")
         except Exception as e:
-            db.session.rollback()
             logger.error(f"Migration failed: {str(e)}")
             raise
 
 if __name__ == "__main__":
-    run_migration() 
\ No newline at end of file
+    run_migration()
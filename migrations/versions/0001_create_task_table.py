@@ -0,0 +1,14 @@
+"""Create the task table as it was first released."""
+import sqlalchemy as sa
+
+
+def upgrade(connection):
+    metadata = sa.MetaData()
+    task = sa.Table(
+        'task', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('title', sa.String(100), nullable=False),
+        sa.Column('description', sa.String(500)),
+        sa.Column('done', sa.Boolean, default=False),
+    )
+    task.create(connection, checkfirst=True)
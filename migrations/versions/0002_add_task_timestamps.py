@@ -0,0 +1,10 @@
+"""Add created_at and updated_at columns to the task table."""
+import sqlalchemy as sa
+
+
+def upgrade(connection):
+    columns = {column['name'] for column in sa.inspect(connection).get_columns('task')}
+    if 'created_at' not in columns:
+        connection.execute(sa.text('ALTER TABLE task ADD COLUMN created_at TIMESTAMP'))
+    if 'updated_at' not in columns:
+        connection.execute(sa.text('ALTER TABLE task ADD COLUMN updated_at TIMESTAMP'))
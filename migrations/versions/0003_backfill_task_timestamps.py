@@ -0,0 +1,16 @@
+"""Fill NULL created_at/updated_at values on tasks created before the columns existed."""
+from datetime import datetime
+from app.migrate import backfill_in_batches
+
+# Commit after every batch so the backfill never holds long row locks
+transactional = False
+
+
+def upgrade(connection):
+    backfill_in_batches(
+        connection,
+        'task',
+        'created_at = COALESCE(created_at, :now), updated_at = COALESCE(updated_at, created_at, :now)',
+        'created_at IS NULL OR updated_at IS NULL',
+        params={'now': datetime.utcnow()},
+    )
@@ -0,0 +1,11 @@
+"""Add indexes for filtering by done and sorting/paging by timestamps."""
+from app.migrate import create_index_concurrently
+
+# CREATE INDEX CONCURRENTLY cannot run inside a transaction
+transactional = False
+
+
+def upgrade(connection):
+    create_index_concurrently(connection, 'ix_task_done_created_at_id', 'task', ['done', 'created_at', 'id'])
+    create_index_concurrently(connection, 'ix_task_created_at_id', 'task', ['created_at', 'id'])
+    create_index_concurrently(connection, 'ix_task_updated_at_id', 'task', ['updated_at', 'id'])
@@ -0,0 +1,20 @@
+"""Create the task change log and seed it with one upsert per existing task."""
+import sqlalchemy as sa
+
+
+def upgrade(connection):
+    metadata = sa.MetaData()
+    task_change = sa.Table(
+        'task_change', metadata,
+        sa.Column('seq', sa.Integer, primary_key=True),
+        sa.Column('task_id', sa.Integer, nullable=False, index=True),
+        sa.Column('op', sa.String(10), nullable=False),
+        sa.Column('changed_at', sa.DateTime, nullable=False),
+    )
+    task_change.create(connection, checkfirst=True)
+
+    # Existing tasks are delivered to a client syncing from scratch
+    connection.execute(sa.text(
+        "INSERT INTO task_change (task_id, op, changed_at) "
+        "SELECT id, 'upsert', COALESCE(updated_at, created_at, CURRENT_TIMESTAMP) FROM task ORDER BY id"
+    ))
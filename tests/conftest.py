@@ -1,6 +1,10 @@
 import os
 import pytest
 
+# Fail any request that runs a slow or N+1 query; individual tests and the
+# benchmarks override this through their app config
+os.environ.setdefault('QUERY_DETECTOR_MODE', 'raise')
+
 @pytest.fixture(autouse=True)
 def setup_test_env():
     """Setup test environment variables before each test."""
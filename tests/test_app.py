@@ -3,8 +3,10 @@ from app import create_app
 from app.database import db
 from app.models import Task
 from sqlalchemy import inspect
+import json
 import logging
 import os
+import time
 from prometheus_client import REGISTRY, CollectorRegistry
 from sqlalchemy.sql import text
 
@@ -337,7 +339,7 @@ def test_index_page_error_handling(app, client, monkeypatch):
         raise Exception("Database error")
     
     with monkeypatch.context() as m:
-        m.setattr("sqlalchemy.orm.query.Query.all", mock_all)
+        m.setattr(db.session, "execute", mock_all)
         response = client.get('/')
         assert response.status_code == 500
         assert b'Task List' in response.data
@@ -348,7 +350,7 @@ def test_get_tasks_error_handling(app, client, monkeypatch):
         raise Exception("Database error")
     
     with monkeypatch.context() as m:
-        m.setattr("sqlalchemy.orm.query.Query.all", mock_all)
+        m.setattr(db.session, "execute", mock_all)
         response = client.get('/api/tasks')
         assert response.status_code == 500
         assert 'error' in response.json
@@ -434,10 +436,10 @@ def test_config_database_url_parsing():
 
 def test_app_initialization_error(monkeypatch):
     """Test application initialization error handling."""
-    def mock_create_all():
+    def mock_current_version(engine):
         raise Exception("Database initialization error")
     
-    monkeypatch.setattr(db, "create_all", mock_create_all)
+    monkeypatch.setattr("app.migrate.current_version", mock_current_version)
     
     with pytest.raises(Exception) as exc_info:
         create_app()
@@ -484,6 +486,61 @@ def test_metrics_labels(app, client):
     metrics_response = client.get('/metrics')
     assert b'task_operations_total' in metrics_response.data
 
+def test_metrics_exposition_cache(app, client):
+    """Test that /metrics reuses the rendered payload within METRICS_CACHE_SECONDS."""
+    exposition = app.metrics_exposition
+    first = client.get('/metrics')
+    client.post('/api/tasks', json={'title': 'Not yet scraped'})
+    assert client.get('/metrics').data == first.data
+    assert exposition.renders == 1
+
+    # Filtered scrapes bypass the cache
+    filtered = client.get('/metrics?name[]=task_operations_total')
+    assert b'task_operations_total{operation="create"} 1.0' in filtered.data
+    assert b'app_info' not in filtered.data
+
+    # Once the window has passed the next scrape renders again
+    exposition.clock = lambda: time.monotonic() + exposition.ttl
+    assert b'task_operations_total{operation="create"} 1.0' in client.get('/metrics').data
+    assert exposition.renders == 2
+
+def test_metrics_exposition_without_cache():
+    """Test that METRICS_CACHE_SECONDS=0 renders every scrape."""
+    from app.exposition import create_metrics_exposition
+    calls = []
+    exposition = create_metrics_exposition({'METRICS_CACHE_SECONDS': 0}, lambda accept: (
+        calls.append(accept) or 'up 1.0\n', 'text/plain; version=0.0.4; charset=utf-8'))
+    assert exposition.response()[0] == b'up 1.0\n'
+    exposition.response()
+    assert len(calls) == 2
+    with pytest.raises(ValueError):
+        create_metrics_exposition({'METRICS_CACHE_SECONDS': -1}, None)
+
+def test_metrics_exposition_gzip(app, client):
+    """Test that /metrics is gzipped for clients that accept it."""
+    import gzip
+    plain = client.get('/metrics')
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.headers['Vary'] == 'Accept-Encoding'
+
+    response = client.get('/metrics', headers={'Accept-Encoding': 'gzip, deflate'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data) == plain.data
+    assert 'Content-Encoding' not in client.get('/metrics', headers={'Accept-Encoding': 'gzip;q=0'}).headers
+
+def test_metrics_server(app):
+    """Test serving the exposition from a separate port."""
+    import urllib.request
+    from app.exposition import start_metrics_server
+    server = start_metrics_server(app.metrics_exposition, 0, '127.0.0.1')
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{server.server_port}/metrics') as response:
+            assert response.status == 200
+            assert b'task_operations_total' in response.read()
+    finally:
+        server.shutdown()
+        server.server_close()
+
 def test_logging_configuration(app, caplog):
     """Test logging configuration."""
     import logging
@@ -512,4 +569,801 @@ def test_application_startup(app):
     assert app.config['TESTING'] is True
     assert app.config['SQLALCHEMY_DATABASE_URI'] == 'sqlite:///:memory:'
     assert app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] is False
-    assert app.config['WTF_CSRF_ENABLED'] is False
\ No newline at end of file
+    assert app.config['WTF_CSRF_ENABLED'] is False
+def test_get_tasks_keyset_pagination(client):
+    """Test paging through tasks with limit and next_cursor."""
+    for i in range(5):
+        client.post('/api/tasks', json={'title': f'Paged Task {i}'})
+
+    response = client.get('/api/tasks?limit=2')
+    assert response.status_code == 200
+    assert [task['title'] for task in response.json['tasks']] == ['Paged Task 0', 'Paged Task 1']
+    cursor = response.json['next_cursor']
+    assert cursor
+
+    seen = [task['id'] for task in response.json['tasks']]
+    while cursor:
+        response = client.get(f'/api/tasks?limit=2&cursor={cursor}')
+        assert response.status_code == 200
+        seen.extend(task['id'] for task in response.json['tasks'])
+        cursor = response.json['next_cursor']
+
+    assert len(seen) == 5
+    assert seen == sorted(seen)
+
+def test_get_tasks_pagination_limits(app, client):
+    """Test that page size is clamped and bad parameters are rejected."""
+    app.config['TASKS_MAX_PAGE_SIZE'] = 3
+    for i in range(5):
+        client.post('/api/tasks', json={'title': f'Task {i}'})
+
+    response = client.get('/api/tasks?limit=1000')
+    assert response.status_code == 200
+    assert len(response.json['tasks']) == 3
+
+    response = client.get('/api/tasks?limit=0')
+    assert response.status_code == 400
+
+    response = client.get('/api/tasks?limit=abc')
+    assert response.status_code == 400
+
+    response = client.get('/api/tasks?cursor=not-a-cursor')
+    assert response.status_code == 400
+    assert response.json['error'] == 'Invalid cursor'
+
+def test_get_tasks_ndjson_stream(app, client):
+    """Test the streaming NDJSON export of all tasks."""
+    app.config['TASKS_STREAM_BATCH_SIZE'] = 2
+    for i in range(5):
+        client.post('/api/tasks', json={'title': f'Streamed Task {i}'})
+
+    response = client.get('/api/tasks?stream=1')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.get_data(as_text=True).splitlines()
+    assert len(lines) == 5
+    assert [json.loads(line)['title'] for line in lines] == [f'Streamed Task {i}' for i in range(5)]
+
+    response = client.get('/api/tasks', headers={'Accept': 'application/x-ndjson'})
+    assert response.mimetype == 'application/x-ndjson'
+    assert len(response.get_data(as_text=True).splitlines()) == 5
+
+def test_batch_task_operations(client):
+    """Test applying creates, updates and deletes in one batch."""
+    keep = client.post('/api/tasks', json={'title': 'Keep Me'}).json['id']
+    remove = client.post('/api/tasks', json={'title': 'Remove Me'}).json['id']
+
+    response = client.post('/api/tasks/batch', json={'operations': [
+        {'op': 'create', 'title': '  Batch Task A  ', 'description': 'A'},
+        {'op': 'update', 'id': keep, 'done': True, 'title': 'Kept'},
+        {'op': 'create', 'title': 'Batch Task B'},
+        {'op': 'delete', 'id': remove},
+    ]})
+    assert response.status_code == 200
+    results = response.json['results']
+    assert [result['status'] for result in results] == [201, 200, 201, 204]
+    assert results[0]['id'] < results[2]['id']
+
+    created = client.get(f"/api/tasks/{results[0]['id']}")
+    assert created.json['title'] == 'Batch Task A'
+    assert created.json['description'] == 'A'
+    kept = client.get(f'/api/tasks/{keep}')
+    assert kept.json['done'] is True
+    assert kept.json['title'] == 'Kept'
+    assert client.get(f'/api/tasks/{remove}').status_code == 404
+
+def test_batch_task_validation_is_all_or_nothing(client):
+    """Test that one invalid operation rejects the whole batch."""
+    response = client.post('/api/tasks/batch', json=[
+        {'op': 'create', 'title': 'Valid Task'},
+        {'op': 'create', 'title': 'x' * 101},
+        {'op': 'update', 'id': 999, 'done': True},
+        {'op': 'explode'},
+    ])
+    assert response.status_code == 400
+    errors = response.json['results']
+    assert [(error['index'], error['status']) for error in errors] == [(1, 400), (2, 404), (3, 400)]
+    assert errors[0]['error'] == 'Title cannot be longer than 100 characters'
+    assert client.get('/api/tasks').json == []
+
+    response = client.post('/api/tasks/batch', json={'operations': 'nope'})
+    assert response.status_code == 400
+
+def test_task_cache_read_through_and_invalidation(app, client, monkeypatch):
+    """Test that GETs are served from cache until a write changes their version."""
+    from app import routes
+    task_id = client.post('/api/tasks', json={'title': 'Cached Task'}).json['id']
+    assert client.get('/api/tasks').status_code == 200
+    assert client.get(f'/api/tasks/{task_id}').status_code == 200
+
+    # Cached responses only look up the version, without building the body
+    def mock_build(*args, **kwargs):
+        raise Exception("Response was built")
+
+    with monkeypatch.context() as m:
+        m.setattr(routes, 'build_tasks_response', mock_build)
+        m.setattr(routes, 'build_task_response', mock_build)
+        assert client.get('/api/tasks').json[0]['title'] == 'Cached Task'
+        assert client.get(f'/api/tasks/{task_id}').json['done'] is False
+
+    client.put(f'/api/tasks/{task_id}')
+    assert client.get('/api/tasks').json[0]['done'] is True
+    assert client.get(f'/api/tasks/{task_id}').json['done'] is True
+
+    client.delete(f'/api/tasks/{task_id}')
+    assert client.get('/api/tasks').json == []
+    assert client.get(f'/api/tasks/{task_id}').status_code == 404
+
+    metrics_response = client.get('/metrics')
+    assert b'task_cache_events_total{event="hit"}' in metrics_response.data
+    assert b'task_cache_events_total{event="miss"}' in metrics_response.data
+
+def test_task_cache_across_workers(tmp_path):
+    """Test that a write through one worker is seen by another worker's cache at once."""
+    config = {
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'tasks.db'}",
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    }
+    worker_a = create_app(config, registry=CollectorRegistry())[0].test_client()
+    worker_b = create_app(config, registry=CollectorRegistry())[0].test_client()
+
+    task_id = worker_a.post('/api/tasks', json={'title': 'Shared Task'}).json['id']
+    assert [task['title'] for task in worker_b.get('/api/tasks').json] == ['Shared Task']
+    assert worker_b.get(f'/api/tasks/{task_id}').json['done'] is False
+
+    worker_a.put(f'/api/tasks/{task_id}')
+    assert worker_b.get('/api/tasks').json[0]['done'] is True
+    assert worker_b.get(f'/api/tasks/{task_id}').json['done'] is True
+
+    worker_a.delete(f'/api/tasks/{task_id}')
+    assert worker_b.get('/api/tasks').json == []
+    assert worker_b.get(f'/api/tasks/{task_id}').status_code == 404
+
+def test_lru_cache_eviction_and_ttl(monkeypatch):
+    """Test LRU eviction order and entry expiry."""
+    from app.cache import LRUCache
+
+    evictions = []
+    cache = LRUCache(max_entries=2, ttl=10, on_evict=evictions.append)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert evictions == [1]
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 11)
+    assert cache.get('a') is None
+
+def test_task_cache_shared_backend(client):
+    """Test the shared cache backend against an in-memory stand-in client."""
+    from app.cache import create_task_cache
+
+    class FakeSharedStore:
+        def __init__(self):
+            self.data = {}
+
+        def get(self, key):
+            return self.data.get(key)
+
+        def set(self, key, value, ex=None):
+            self.data[key] = value
+
+        def delete(self, *keys):
+            for key in keys:
+                self.data.pop(key, None)
+
+    store = FakeSharedStore()
+    cache = create_task_cache({'TASK_CACHE_BACKEND': 'shared', 'TASK_CACHE_CLIENT': store})
+    key = cache.response_key('etag-1')
+    cache.set(key, {'body': b'{}'})
+    assert cache.get(key) == {'body': b'{}'}
+    assert cache.get(cache.response_key('etag-2')) is None
+
+@pytest.mark.parametrize('use_cache', [True, False])
+def test_conditional_get_task(app, client, use_cache):
+    """Test ETag and Last-Modified handling on a single task."""
+    if not use_cache:
+        app.task_cache = None
+    task_id = client.post('/api/tasks', json={'title': 'Conditional Task'}).json['id']
+
+    response = client.get(f'/api/tasks/{task_id}')
+    etag = response.headers['ETag']
+    last_modified = response.headers['Last-Modified']
+    assert etag
+    assert 'HX-Request' in response.headers['Vary']
+
+    response = client.get(f'/api/tasks/{task_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+
+    response = client.get(f'/api/tasks/{task_id}', headers={'If-Modified-Since': last_modified})
+    assert response.status_code == 304
+
+    # The HTMX representation has its own validator
+    response = client.get(f'/api/tasks/{task_id}', headers={'If-None-Match': etag, 'HX-Request': 'true'})
+    assert response.status_code == 200
+
+    client.put(f'/api/tasks/{task_id}')
+    response = client.get(f'/api/tasks/{task_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+@pytest.mark.parametrize('use_cache', [True, False])
+def test_conditional_get_task_list(app, client, use_cache):
+    """Test ETag handling on the task list."""
+    if not use_cache:
+        app.task_cache = None
+    first = client.post('/api/tasks', json={'title': 'First'}).json['id']
+    client.post('/api/tasks', json={'title': 'Second'})
+
+    etag = client.get('/api/tasks').headers['ETag']
+    response = client.get('/api/tasks', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+    # Paged requests are different representations
+    response = client.get('/api/tasks?limit=1', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+
+    client.delete(f'/api/tasks/{first}')
+    response = client.get('/api/tasks', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert len(response.json) == 1
+
+def test_import_is_side_effect_free():
+    """Test that importing app.main does not build the global app."""
+    import subprocess
+    import sys
+    script = "import app.main as m; assert 'app' not in vars(m); assert callable(m.create_app)"
+    result = subprocess.run([sys.executable, '-c', script], cwd=os.path.dirname(os.path.dirname(__file__)))
+    assert result.returncode == 0
+
+def test_fast_boot_skips_schema(monkeypatch):
+    """Test that FAST_BOOT starts without creating or inspecting tables."""
+    def mock_create_all():
+        raise Exception("Database initialization error")
+
+    monkeypatch.setattr(db, "create_all", mock_create_all)
+    fast_app = create_app({
+        'TESTING': True,
+        'FAST_BOOT': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+    }, registry=CollectorRegistry())[0]
+
+    with fast_app.app_context():
+        assert not inspect(db.engine).has_table('task')
+
+def test_init_db_command(runner):
+    """Test the init-db CLI command."""
+    result = runner.invoke(args=['init-db'])
+    assert result.exit_code == 0
+    assert inspect(db.engine).has_table('task')
+
+def test_get_tasks_filter_sort_and_fields(client):
+    """Test server-side filtering, sorting and field projection."""
+    ids = [client.post('/api/tasks', json={'title': title}).json['id'] for title in ('b', 'c', 'a')]
+    client.put(f'/api/tasks/{ids[1]}')
+
+    response = client.get('/api/tasks?done=false&sort=title')
+    assert [task['title'] for task in response.json] == ['a', 'b']
+
+    response = client.get('/api/tasks?sort=-id&fields=id,done')
+    assert response.json == [
+        {'id': ids[2], 'done': False},
+        {'id': ids[1], 'done': True},
+        {'id': ids[0], 'done': False},
+    ]
+
+    updated_at = client.get(f'/api/tasks/{ids[1]}').json['updated_at']
+    response = client.get(f'/api/tasks?updated_since={updated_at}&fields=title')
+    assert response.json == [{'title': 'c'}]
+
+    response = client.get('/api/tasks?created_after=2999-01-01T00:00:00')
+    assert response.json == []
+
+def test_get_tasks_utc_designator(client, sample_task):
+    """Test that datetimes with a trailing Z are read as UTC."""
+    from datetime import datetime
+    from app.queries import _parse_datetime
+    assert _parse_datetime('created_after', '2024-01-01T12:00:00Z') == datetime(2024, 1, 1, 12)
+    assert _parse_datetime('created_after', '2024-01-01T12:00:00z') == datetime(2024, 1, 1, 12)
+
+    response = client.get('/api/tasks?created_after=2000-01-01T00:00:00Z')
+    assert response.status_code == 200
+    assert [task['title'] for task in response.json] == ['Sample Task']
+    response = client.get('/api/tasks?updated_since=2999-01-01T00:00:00Z')
+    assert response.json == []
+
+def test_get_tasks_sorted_keyset_pages(client):
+    """Test keyset paging over a non-id sort in both directions, including NULL sort values."""
+    for title in ('d', 'b', 'e', 'a', 'c'):
+        client.post('/api/tasks', json={'title': title})
+    db.session.execute(text("INSERT INTO task (title, done) VALUES ('legacy', 0)"))
+    db.session.commit()
+
+    for sort in ('created_at', '-created_at', 'title', '-title'):
+        expected = [task['id'] for task in client.get(f'/api/tasks?sort={sort}&fields=id').json]
+        seen = []
+        response = client.get(f'/api/tasks?sort={sort}&limit=2&fields=id')
+        while True:
+            seen.extend(task['id'] for task in response.json['tasks'])
+            cursor = response.json['next_cursor']
+            if not cursor:
+                break
+            response = client.get(f'/api/tasks?sort={sort}&limit=2&fields=id&cursor={cursor}')
+        assert seen == expected
+        assert len(seen) == 6
+
+    cursor = client.get('/api/tasks?sort=title&limit=2').json['next_cursor']
+    response = client.get(f'/api/tasks?sort=created_at&limit=2&cursor={cursor}')
+    assert response.status_code == 400
+
+def test_get_tasks_invalid_query_parameters(client):
+    """Test that bad filter, sort and field parameters are rejected."""
+    for query in ('done=maybe', 'sort=description', 'fields=id,secret', 'created_after=yesterday'):
+        response = client.get(f'/api/tasks?{query}')
+        assert response.status_code == 400
+        assert 'error' in response.json
+
+def test_get_tasks_query_htmx(client, sample_task):
+    """Test the HTMX list honours filters."""
+    response = client.get('/api/tasks?done=false&fields=id', headers={'HX-Request': 'true'})
+    assert response.status_code == 200
+    assert b'Sample Task' in response.data
+
+def test_task_changes_since_token(client):
+    """Test incremental sync returns upserts and tombstones after a token."""
+    first = client.post('/api/tasks', json={'title': 'First'}).json['id']
+    second = client.post('/api/tasks', json={'title': 'Second'}).json['id']
+
+    response = client.get('/api/tasks/changes')
+    assert response.status_code == 200
+    assert [change['task']['id'] for change in response.json['changes']] == [first, second]
+    assert response.json['has_more'] is False
+    since = response.json['next_since']
+
+    client.put(f'/api/tasks/{first}', json={'done': True})
+    client.delete(f'/api/tasks/{second}')
+
+    response = client.get(f'/api/tasks/changes?since={since}')
+    assert response.json['changes'] == [
+        {'op': 'upsert', 'task': client.get(f'/api/tasks/{first}').json},
+        {'op': 'delete', 'id': second},
+    ]
+
+    since = response.json['next_since']
+    response = client.get(f'/api/tasks/changes?since={since}')
+    assert response.json['changes'] == []
+    assert response.json['next_since'] == since
+
+def test_task_changes_paging_and_batch(client):
+    """Test batch writes are logged and the change feed pages with has_more."""
+    client.post('/api/tasks/batch', json=[{'op': 'create', 'title': f'Task {i}'} for i in range(5)])
+
+    seen = []
+    response = client.get('/api/tasks/changes?limit=2')
+    while True:
+        assert response.status_code == 200
+        seen.extend(change['task']['title'] for change in response.json['changes'])
+        if not response.json['has_more']:
+            break
+        response = client.get(f"/api/tasks/changes?limit=2&since={response.json['next_since']}")
+    assert seen == [f'Task {i}' for i in range(5)]
+
+def test_task_changes_invalid_token(client):
+    """Test a malformed sync token is rejected."""
+    response = client.get('/api/tasks/changes?since=not-a-token')
+    assert response.status_code == 400
+    assert 'error' in response.json
+
+def test_compact_changes_command(app, client, runner):
+    """Test compaction keeps only the latest entry per task."""
+    from app.models import TaskChange
+    task_id = client.post('/api/tasks', json={'title': 'Churn'}).json['id']
+    for done in (True, False, True):
+        client.put(f'/api/tasks/{task_id}', json={'done': done})
+
+    result = runner.invoke(args=['db', 'compact-changes'])
+    assert 'Removed 3' in result.output
+    assert db.session.query(TaskChange).count() == 1
+    assert client.get('/api/tasks/changes').json['changes'][0]['task']['done'] is True
+
+def test_writes_publish_task_events(app, client, sample_task):
+    """Test create, update, delete and batch writes reach event subscribers."""
+    subscription = app.task_events.subscribe()
+    created = client.post('/api/tasks', json={'title': 'Live'}).json
+    client.put(f'/api/tasks/{sample_task.id}')
+    client.delete(f'/api/tasks/{sample_task.id}')
+    client.post('/api/tasks/batch', json=[{'op': 'update', 'id': created['id'], 'done': True}])
+
+    events = [subscription.get(timeout=1) for _ in range(4)]
+    assert events[0] == {'op': 'create', 'id': created['id'], 'task': created}
+    assert events[1]['op'] == 'update' and events[1]['task']['done'] is True
+    assert events[2] == {'op': 'delete', 'id': sample_task.id}
+    assert events[3] == {'op': 'update', 'id': created['id']}
+    assert subscription.get(timeout=0.01) is None
+    subscription.close()
+    assert len(app.task_events) == 0
+
+def test_task_event_stream(app, client):
+    """Test the SSE endpoint streams published events."""
+    response = client.get('/api/tasks/events')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+
+    stream = iter(response.response)
+    assert next(stream).startswith(b'retry:')
+    app.task_events.publish([{'op': 'delete', 'id': 7}])
+    assert next(stream) == b'event: task\ndata: {"id":7,"op":"delete"}\n\n'
+    response.close()
+    assert len(app.task_events) == 0
+
+def test_task_event_stream_html(app, client, sample_task):
+    """Test the index page's event stream swaps in just the task each event names."""
+    response = client.get('/api/tasks/events?format=html')
+    stream = iter(response.response)
+    next(stream)
+
+    created = client.post('/api/tasks', json={'title': 'Live HTML'}).json
+    message = next(stream).decode()
+    assert message.startswith('event: task\ndata: <div hx-swap-oob="afterbegin:#task-list">')
+    assert f'id="task-{created["id"]}"' in message and 'Live HTML' in message
+    assert all(line.startswith(('event:', 'data:')) for line in message.strip().splitlines())
+
+    client.put(f'/api/tasks/{sample_task.id}')
+    message = next(stream).decode()
+    assert message.startswith(f'event: task\ndata: <div hx-swap-oob="true"\ndata:   id="task-{sample_task.id}"')
+    assert 'Undo' in message
+
+    client.delete(f'/api/tasks/{sample_task.id}')
+    assert next(stream) == f'event: task\ndata: <div id="task-{sample_task.id}" hx-swap-oob="delete"></div>\n\n'.encode()
+
+    # Batch events carry no task, so the page reloads its first page
+    client.post('/api/tasks/batch', json=[{'op': 'update', 'id': created['id'], 'done': True}])
+    assert next(stream) == b'event: resync\ndata: \n\n'
+    response.close()
+
+def test_task_event_slow_subscriber_resyncs():
+    """Test a subscriber that falls behind gets a resync instead of unbounded events."""
+    from app.events import RESYNC, EventHub
+    hub = EventHub(max_queue=2)
+    subscription = hub.subscribe()
+    hub.publish([{'op': 'delete', 'id': i} for i in range(5)])
+    assert [subscription.get(timeout=0) for _ in range(3)] == [
+        {'op': 'delete', 'id': 0}, {'op': 'delete', 'id': 1}, RESYNC
+    ]
+
+def test_task_events_fan_out_between_workers(tmp_path):
+    """Test the unix socket backend delivers events to other hubs."""
+    from app.events import EventHub, UnixSocketFanout
+    first = EventHub(UnixSocketFanout(str(tmp_path)))
+    second = EventHub(UnixSocketFanout(str(tmp_path)))
+    subscription = second.subscribe()
+    try:
+        first.publish([{'op': 'create', 'id': 1}])
+        assert subscription.get(timeout=2) == {'op': 'create', 'id': 1}
+    finally:
+        first.fanout.close()
+        second.fanout.close()
+
+def test_task_events_disabled():
+    """Test the event stream is unavailable when the backend is 'none'."""
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+        'FAST_BOOT': True,
+        'TASK_EVENTS_BACKEND': 'none'
+    }, registry=CollectorRegistry())[0]
+    assert app.task_events is None
+    client = app.test_client()
+    assert client.get('/api/tasks/events').status_code == 404
+    with app.app_context():
+        db.create_all()
+        assert b'sse-connect' not in client.get('/').data
+
+@pytest.mark.parametrize('backend', ['orjson', 'stdlib'])
+def test_row_json_matches_to_dict(app, backend):
+    """Test the row-to-JSON path produces the same objects as to_dict."""
+    from sqlalchemy import select
+    from app.queries import FIELDS
+    from app.serialization import FastJSONProvider
+    provider = FastJSONProvider(app, use_orjson=backend == 'orjson')
+    db.session.add_all([
+        Task(title='Café "quoted"', description=None),
+        Task(title='Second', description='Line\nbreak'),
+    ])
+    db.session.commit()
+    db.session.execute(text('UPDATE task SET done = 1 WHERE id = 2'))
+    db.session.execute(text('UPDATE task SET updated_at = NULL WHERE id = 1'))
+
+    rows = db.session.execute(select(*[getattr(Task, field) for field in FIELDS]).order_by(Task.id)).all()
+    expected = [task.to_dict() for task in Task.query.order_by(Task.id)]
+    assert json.loads(provider.rows_to_json(rows, FIELDS)) == expected
+    assert json.loads(provider.rows_to_json(rows, ('title', 'id'))) == [
+        {'id': task['id'], 'title': task['title']} for task in expected
+    ]
+    assert provider.rows_to_json([], FIELDS) == b'[]'
+
+@pytest.mark.parametrize('backend', ['orjson', 'stdlib'])
+def test_json_provider_backends(backend):
+    """Test both JSON backends serve the API with compatible output."""
+    from datetime import datetime
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+        'JSON_BACKEND': backend
+    }, registry=CollectorRegistry())[0]
+    with app.app_context():
+        db.create_all()
+        assert app.json.use_orjson == (backend == 'orjson')
+        assert app.json.loads(app.json.dumps({'b': 1, 'a': datetime(2024, 1, 2)})) == {
+            'a': 'Tue, 02 Jan 2024 00:00:00 GMT', 'b': 1
+        }
+        assert app.json.dumps({'b': 1, 'a': [2]}) == '{"a":[2],"b":1}'
+        client = app.test_client()
+        created = client.post('/api/tasks', json={'title': 'Encoded'}).json
+        assert client.get('/api/tasks?limit=5').json == {'tasks': [created], 'next_cursor': None}
+        assert client.get('/api/tasks?fields=id,done').json == [{'id': created['id'], 'done': False}]
+        lines = client.get('/api/tasks?stream=1').data.splitlines()
+        assert [json.loads(line) for line in lines] == [created]
+        db.session.remove()
+
+def test_row_encoders_cached_per_provider():
+    """Test row encoders are reused per provider without keeping the provider alive."""
+    import gc
+    import weakref
+    from flask import Flask
+    from app.queries import FIELDS
+    from app.serialization import FastJSONProvider
+
+    provider = FastJSONProvider(Flask(__name__))
+    encode = provider.row_encoder(FIELDS, ('id', 'title'))
+    assert provider.row_encoder(FIELDS, ('id', 'title')) is encode
+    assert provider.row_encoder(FIELDS, ('id',)) is not encode
+
+    ref = weakref.ref(provider)
+    del provider, encode
+    gc.collect()
+    assert ref() is None
+
+def test_list_endpoints_skip_orm_instances(app, client, sample_task):
+    """Test the list endpoints read Core rows instead of loading Task instances."""
+    from app.queries import TaskRecord, fetch_task_records
+    db.session.expunge_all()
+
+    assert client.get('/api/tasks').json == [sample_task.to_dict()]
+    assert b'Sample Task' in client.get('/api/tasks', headers={'HX-Request': 'true'}).data
+    assert b'Sample Task' in client.get('/').data
+    assert len(db.session.identity_map) == 0
+
+    record, = fetch_task_records(db.session)
+    assert isinstance(record, TaskRecord)
+    assert not hasattr(record, '__dict__')
+    assert record.to_dict() == sample_task.to_dict()
+
+def test_request_timing_metrics(app, client, sample_task):
+    """Test per-endpoint DB, SQL count, serialization and template histograms."""
+    client.get('/api/tasks')
+    client.get('/')
+    data = client.get('/metrics').data.decode()
+
+    def sample(name, endpoint):
+        prefix = f'{name}{{endpoint="{endpoint}"}} '
+        return float(next(line for line in data.splitlines() if line.startswith(prefix))[len(prefix):])
+
+    assert sample('task_request_sql_statements_count', 'main.get_tasks') == 1
+    assert sample('task_request_sql_statements_sum', 'main.get_tasks') >= 2
+    assert sample('task_request_db_seconds_sum', 'main.get_tasks') > 0
+    assert sample('task_request_serialization_seconds_sum', 'main.get_tasks') > 0
+    assert sample('task_request_template_seconds_sum', 'main.get_tasks') == 0
+    assert sample('task_request_template_seconds_sum', 'main.index') > 0
+    assert 'Server-Timing' not in client.get('/health').headers
+
+def test_server_timing_header(app, client, sample_task):
+    """Test the optional Server-Timing header."""
+    app.config['SERVER_TIMING'] = True
+    header = client.get(f'/api/tasks/{sample_task.id}').headers['Server-Timing']
+    names = [metric.split(';')[0] for metric in header.split(', ')]
+    assert names == ['db', 'serialize', 'template', 'total']
+    assert 'statements"' in header
+
+def _detector_app(**config):
+    app = create_app(dict({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+    }, **config), registry=CollectorRegistry())[0]
+
+    @app.route('/repeat/<int:times>')
+    def repeat(times):
+        for i in range(times):
+            db.session.execute(text('SELECT :i'), {'i': i})
+        return 'ok'
+    return app
+
+def test_query_detector_flags_n_plus_one(caplog):
+    """Test repeated identical statements in one request are logged and counted."""
+    app = _detector_app(QUERY_DETECTOR_MODE='warn', N_PLUS_ONE_THRESHOLD=3)
+    client = app.test_client()
+    with caplog.at_level(logging.WARNING, logger='app'):
+        assert client.get('/repeat/2').status_code == 200
+        assert 'n_plus_one' not in caplog.text
+        assert client.get('/repeat/3').status_code == 200
+    issue = json.loads(next(record.message for record in caplog.records if 'n_plus_one' in record.message))
+    assert issue == {'event': 'n_plus_one', 'endpoint': 'repeat', 'count': 3, 'threshold': 3,
+                     'statement': 'SELECT ?'}
+    assert b'task_query_issues_total{endpoint="repeat",kind="n_plus_one"} 1.0' in client.get('/metrics').data
+
+def test_query_detector_flags_slow_queries(caplog):
+    """Test statements over the threshold are logged with their parameters."""
+    app = _detector_app(QUERY_DETECTOR_MODE='warn', SLOW_QUERY_THRESHOLD_MS=0)
+    with caplog.at_level(logging.WARNING, logger='app'):
+        app.test_client().get('/repeat/1')
+    issue = json.loads(next(record.message for record in caplog.records if 'slow_query' in record.message))
+    assert issue['endpoint'] == 'repeat'
+    assert issue['statement'] == 'SELECT ?'
+    assert issue['parameters'] == '(0,)'
+
+def test_query_detector_raise_mode():
+    """Test raise mode fails the request and off mode ignores it."""
+    from app.query_detector import QueryDetectorError
+    client = _detector_app(QUERY_DETECTOR_MODE='raise').test_client()
+    assert client.get('/repeat/4').status_code == 200
+    with pytest.raises(QueryDetectorError):
+        client.get('/repeat/5')
+    assert _detector_app(QUERY_DETECTOR_MODE='off').test_client().get('/repeat/50').status_code == 200
+
+def test_task_fragment_cache(app, client, sample_task):
+    """Test that task fragments are rendered once per (id, updated_at, done)."""
+    from flask import render_template
+    fragments = app.fragment_cache
+    hx = {'HX-Request': 'true'}
+    assert b'Sample Task' in client.get('/api/tasks', headers=hx).data
+    assert (fragments.hits, fragments.misses) == (0, 1)
+    # The index page reuses the fragment rendered for the list
+    assert b'Sample Task' in client.get('/').data
+    assert (fragments.hits, fragments.misses) == (1, 1)
+
+    # The cached fragment is what including task.html used to produce
+    with app.test_request_context():
+        task = db.session.get(Task, sample_task.id)
+        assert str(fragments.render(task)) == render_template('task.html', task=task)
+
+    # Completing the task changes its key, so the list shows the new state
+    assert b'Undo' in client.put(f'/api/tasks/{sample_task.id}', headers=hx).data
+    assert b'Undo' in client.get('/api/tasks?limit=10', headers=hx).data
+
+def test_task_fragment_cache_disabled():
+    """Test that TEMPLATE_FRAGMENT_CACHE_SIZE=0 renders every fragment."""
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+        'TEMPLATE_FRAGMENT_CACHE_SIZE': 0,
+    }, registry=CollectorRegistry())[0]
+    client = app.test_client()
+    client.post('/api/tasks', json={'title': 'Uncached'})
+    assert b'Uncached' in client.get('/api/tasks', headers={'HX-Request': 'true'}).data
+    assert (app.fragment_cache.hits, app.fragment_cache.misses) == (0, 0)
+
+def test_compile_templates_command(tmp_path):
+    """Test that `flask templates compile` fills the bytecode cache."""
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+        'TEMPLATE_BYTECODE_CACHE_DIR': str(tmp_path),
+    }, registry=CollectorRegistry())[0]
+    result = app.test_cli_runner().invoke(args=['templates', 'compile'])
+    assert result.exit_code == 0, result.output
+    assert 'Compiled' in result.output
+    assert len(list(tmp_path.glob('__jinja2_*.cache'))) == len(app.jinja_env.list_templates(extensions=['html']))
+
+def test_index_infinite_scroll(app, client):
+    """Test that the index renders one page and chains the rest through revealed sentinels."""
+    import re
+    from html import unescape
+    app.config['TASKS_INDEX_PAGE_SIZE'] = 2
+    for i in range(1, 6):
+        client.post('/api/tasks', json={'title': f'Scroll task {i}'})
+
+    def page(html):
+        titles = re.findall(r'Scroll task (\d)', html)
+        sentinel = re.search(r'hx-get="([^"]+)"\s+hx-trigger="revealed"', html)
+        return titles, unescape(sentinel.group(1)) if sentinel else None
+
+    html = client.get('/').data.decode()
+    assert 'hx-get="/api/tasks?sort=-id&amp;limit=2"' in html
+    titles, next_url = page(html)
+    assert titles == ['5', '4']
+
+    seen = titles
+    while next_url:
+        titles, next_url = page(client.get(next_url, headers={'HX-Request': 'true'}).data.decode())
+        seen += titles
+    assert seen == ['5', '4', '3', '2', '1']
+
+def test_gzip_compression(app, client):
+    """Test that large JSON bodies are gzipped and small ones are left alone."""
+    import gzip
+    client.post('/api/tasks', json={'title': 'Small'})
+    response = client.get('/api/tasks', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+    for i in range(20):
+        client.post('/api/tasks', json={'title': f'Compressed task {i}', 'description': 'x' * 20})
+    plain = client.get('/api/tasks')
+    assert 'Content-Encoding' not in plain.headers
+
+    response = client.get('/api/tasks', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert int(response.headers['Content-Length']) < len(plain.data)
+    assert gzip.decompress(response.data) == plain.data
+
+    # The compressed representation has a weak validator that still revalidates
+    assert response.headers['ETag'].startswith('W/')
+    response = client.get('/api/tasks', headers={
+        'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+
+def test_compression_negotiation(app, client):
+    """Test that the client's preferred encoding is used, and brotli wins ties."""
+    brotli = pytest.importorskip('brotli')
+    zstandard = pytest.importorskip('zstandard')
+    for i in range(20):
+        client.post('/api/tasks', json={'title': f'Negotiated task {i}'})
+    plain = client.get('/api/tasks').data
+
+    response = client.get('/api/tasks', headers={'Accept-Encoding': 'gzip, deflate, br, zstd'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(response.data) == plain
+
+    response = client.get('/api/tasks', headers={'Accept-Encoding': 'br;q=0.5, zstd'})
+    assert response.headers['Content-Encoding'] == 'zstd'
+    assert zstandard.ZstdDecompressor().decompressobj().decompress(response.data) == plain
+
+    response = client.get('/api/tasks', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in response.headers
+
+def test_streamed_compression(app, client):
+    """Test that the NDJSON export is compressed and flushed chunk by chunk."""
+    import zlib
+    app.config['TASKS_STREAM_BATCH_SIZE'] = 2
+    for i in range(5):
+        client.post('/api/tasks', json={'title': f'Streamed Task {i}'})
+
+    response = client.get('/api/tasks?stream=1', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+
+    # Every chunk decompresses on arrival, without waiting for the end
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    chunks = [decompressor.decompress(chunk) for chunk in response.response]
+    assert chunks[0].startswith(b'{')
+    lines = b''.join(chunks).decode().splitlines()
+    assert [json.loads(line)['title'] for line in lines] == [f'Streamed Task {i}' for i in range(5)]
+
+def test_compression_skips(app, client):
+    """Test that event streams, pre-encoded metrics and disabled compression are left alone."""
+    import gzip
+    response = client.get('/metrics', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert b'app_info' in gzip.decompress(response.data)
+
+    response = client.get('/api/tasks/events', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    response.close()
+
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+        'COMPRESSION_ENABLED': False,
+    }, registry=CollectorRegistry())[0]
+    response = app.test_client().get('/', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+
+    with pytest.raises(ValueError):
+        create_app({'TESTING': True, 'COMPRESSION_ALGORITHMS': 'gzip,lz4'}, registry=CollectorRegistry())
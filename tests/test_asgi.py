@@ -0,0 +1,224 @@
+import asyncio
+import gzip
+import json
+import pytest
+from prometheus_client import CollectorRegistry
+from app import create_app
+from app.database import db
+
+pytest.importorskip('aiosqlite')
+pytest.importorskip('asgiref')
+
+from app.asgi import AsyncTaskAPI, async_database_url  # noqa: E402
+
+
+@pytest.fixture
+def asgi_app(tmp_path):
+    """Create the async API over a file-backed SQLite database."""
+    database_url = f"sqlite:///{tmp_path / 'asgi.db'}"
+    flask_app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    }, registry=CollectorRegistry())[0]
+
+    with flask_app.app_context():
+        db.create_all()
+
+    api = AsyncTaskAPI(flask_app)
+    yield api
+    asyncio.run(api.engine.dispose())
+    with flask_app.app_context():
+        db.drop_all()
+
+
+def call(app, method, path, body=None, headers=None, query_string=b''):
+    """Send one HTTP request through an ASGI app and collect the response."""
+    content = json.dumps(body).encode('utf-8') if body is not None else b''
+    raw_headers = [(b'content-type', b'application/json')] if body is not None else []
+    raw_headers += [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'root_path': '',
+        'query_string': query_string,
+        'headers': raw_headers,
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 12345),
+    }
+    messages = [{'type': 'http.request', 'body': content, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start = next(message for message in sent if message['type'] == 'http.response.start')
+    data = b''.join(message.get('body', b'') for message in sent if message['type'] == 'http.response.body')
+    return start['status'], dict(start['headers']), data
+
+
+def test_async_database_url():
+    """Test mapping sync database URLs to asyncio drivers."""
+    assert async_database_url('sqlite:///app.db') == 'sqlite+aiosqlite:///app.db'
+    assert async_database_url('postgresql://u:p@db/tasks') == 'postgresql+asyncpg://u:p@db/tasks'
+
+
+def test_async_engine_profile(tmp_path):
+    """Test that the async engine gets the Flask engine's profile, pragmas and configured options."""
+    from sqlalchemy import text
+    from app.engine import InstrumentedAsyncQueuePool
+
+    registry = CollectorRegistry()
+    flask_app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'profile.db'}",
+        'SQLALCHEMY_ENGINE_OPTIONS': {'pool_timeout': 3},
+    }, registry=registry)[0]
+    api = AsyncTaskAPI(flask_app)
+    checkouts = registry.get_sample_value('task_db_pool_checkout_seconds_count')
+    assert isinstance(api.engine.pool, InstrumentedAsyncQueuePool)
+    assert api.engine.pool.timeout() == 3
+
+    async def pragmas():
+        async with api.engine.connect() as connection:
+            return [(await connection.execute(text(f'PRAGMA {name}'))).scalar()
+                    for name in ('journal_mode', 'synchronous', 'busy_timeout')]
+
+    try:
+        assert asyncio.run(pragmas()) == ['wal', 1, 5000]
+    finally:
+        asyncio.run(api.engine.dispose())
+    # Its checkouts are part of the pool metrics
+    assert registry.get_sample_value('task_db_pool_checkout_seconds_count') == checkouts + 1
+
+
+def test_async_task_workflow(asgi_app):
+    """Test create, read, update and delete through the async handlers."""
+    status, _, data = call(asgi_app, 'POST', '/api/tasks', {'title': 'Async Task'})
+    assert status == 201
+    task_id = json.loads(data)['id']
+
+    status, _, data = call(asgi_app, 'GET', f'/api/tasks/{task_id}')
+    assert status == 200
+    assert json.loads(data)['title'] == 'Async Task'
+
+    status, _, data = call(asgi_app, 'PUT', f'/api/tasks/{task_id}')
+    assert status == 200
+    assert json.loads(data)['done'] is True
+
+    status, _, data = call(asgi_app, 'GET', '/api/tasks', query_string=b'limit=10')
+    assert status == 200
+    assert [task['id'] for task in json.loads(data)['tasks']] == [task_id]
+
+    status, _, _ = call(asgi_app, 'DELETE', f'/api/tasks/{task_id}')
+    assert status == 204
+    status, _, data = call(asgi_app, 'GET', f'/api/tasks/{task_id}')
+    assert status == 404
+    assert json.loads(data) == {"error": "Task not found"}
+
+
+def test_async_task_queries_match_flask(asgi_app):
+    """Test that filters, sorting, projection and cursors behave as in the Flask app."""
+    for i in range(5):
+        call(asgi_app, 'POST', '/api/tasks', {'title': f'Query Task {i}'})
+    call(asgi_app, 'PUT', '/api/tasks/2')
+    flask_client = asgi_app.flask_app.test_client()
+
+    for query_string in (b'done=true', b'fields=id,title', b'sort=-id', b'sort=-id&limit=2',
+                         b'sort=title&fields=id&limit=3', b'updated_since=2000-01-01T00:00:00'):
+        status, _, data = call(asgi_app, 'GET', '/api/tasks', query_string=query_string)
+        assert status == 200
+        assert json.loads(data) == flask_client.get(f'/api/tasks?{query_string.decode()}').json
+
+    # A descending cursor continues downwards
+    status, _, data = call(asgi_app, 'GET', '/api/tasks', query_string=b'sort=-id&limit=2')
+    cursor = json.loads(data)['next_cursor']
+    status, _, data = call(asgi_app, 'GET', '/api/tasks', query_string=f'sort=-id&limit=2&cursor={cursor}'.encode())
+    assert [task['id'] for task in json.loads(data)['tasks']] == [3, 2]
+
+    status, _, data = call(asgi_app, 'GET', '/api/tasks', query_string=b'sort=bogus')
+    assert status == 400
+
+
+def test_async_compression(asgi_app):
+    """Test that JSON from the async handlers is compressed like the Flask responses."""
+    for i in range(20):
+        call(asgi_app, 'POST', '/api/tasks', {'title': f'Compressed Task {i}', 'description': 'x' * 50})
+    flask_client = asgi_app.flask_app.test_client()
+
+    status, headers, data = call(asgi_app, 'GET', '/api/tasks', headers={'Accept-Encoding': 'gzip'})
+    assert status == 200
+    assert headers[b'content-encoding'] == b'gzip'
+    assert b'Accept-Encoding' in headers[b'vary']
+    assert int(headers[b'content-length']) == len(data)
+    assert json.loads(gzip.decompress(data)) == flask_client.get('/api/tasks').json
+
+    status, headers, data = call(asgi_app, 'GET', '/api/tasks')
+    assert b'content-encoding' not in headers
+    assert b'Accept-Encoding' in headers[b'vary']
+    assert len(json.loads(data)) == 20
+
+
+def test_async_conditional_requests(asgi_app):
+    """Test that the async handlers send validators and answer revalidation with 304."""
+    call(asgi_app, 'POST', '/api/tasks', {'title': 'Cached Task'})
+    flask_client = asgi_app.flask_app.test_client()
+
+    status, headers, _ = call(asgi_app, 'GET', '/api/tasks', query_string=b'sort=-id')
+    assert status == 200
+    etag = headers[b'etag'].decode()
+    # Both servers describe the same representation with the same validator
+    assert flask_client.get('/api/tasks?sort=-id').headers['ETag'] == etag
+    assert b'HX-Request' in headers[b'vary']
+
+    status, headers, data = call(asgi_app, 'GET', '/api/tasks', query_string=b'sort=-id',
+                                 headers={'If-None-Match': etag})
+    assert status == 304
+    assert data == b''
+    assert headers[b'etag'].decode() == etag
+
+    status, headers, _ = call(asgi_app, 'GET', '/api/tasks/1')
+    assert status == 200
+    task_etag = headers[b'etag'].decode()
+    status, _, data = call(asgi_app, 'GET', '/api/tasks/1', headers={'If-None-Match': task_etag})
+    assert status == 304
+    assert data == b''
+
+    # A change moves both validators on
+    call(asgi_app, 'PUT', '/api/tasks/1')
+    status, _, _ = call(asgi_app, 'GET', '/api/tasks', query_string=b'sort=-id', headers={'If-None-Match': etag})
+    assert status == 200
+    status, _, _ = call(asgi_app, 'GET', '/api/tasks/1', headers={'If-None-Match': task_etag})
+    assert status == 200
+
+
+def test_async_validation_errors(asgi_app):
+    """Test that invalid requests are rejected by the async handlers."""
+    status, _, data = call(asgi_app, 'POST', '/api/tasks', {'description': 'No title'})
+    assert status == 400
+    assert json.loads(data)['error'] == 'Title is required'
+
+    status, _, _ = call(asgi_app, 'GET', '/api/tasks', query_string=b'cursor=bogus')
+    assert status == 400
+
+
+def test_async_falls_back_to_flask(asgi_app):
+    """Test that non-API and HTMX requests are served by the Flask app."""
+    status, _, data = call(asgi_app, 'GET', '/health')
+    assert status == 200
+    assert json.loads(data)['status'] == 'healthy'
+
+    status, headers, _ = call(asgi_app, 'GET', '/api/tasks', headers={'HX-Request': 'true'})
+    assert status == 200
+    assert headers[b'content-type'].startswith(b'text/html')
@@ -0,0 +1,252 @@
+"""Endpoint benchmarks with a regression gate.
+
+Skipped unless BENCH_SIZES is set. Every route, plus /metrics, is measured
+with pytest-benchmark against a file-backed SQLite database seeded with each
+table size, and against Postgres too when BENCH_POSTGRES_URL is set::
+
+    # Record a baseline (medians only compare on the machine that made them;
+    # CI records one from the base commit in the same job)
+    BENCH_SIZES=1000,100000 BENCH_SAVE_BASELINE=1 pytest tests/test_benchmarks.py
+
+    # Fail any benchmark whose median is more than 15% slower than the baseline
+    BENCH_SIZES=1000,100000 BENCH_MAX_REGRESSION=15 pytest tests/test_benchmarks.py
+
+Settings (environment variables):
+
+- BENCH_SIZES: comma separated row counts, e.g. ``1000,100000,1000000``
+- BENCH_POSTGRES_URL: also run against this (scratch!) Postgres database
+- BENCH_ROUNDS: measured rounds per benchmark (default 5)
+- BENCH_BASELINE: baseline file (default ``.benchmarks/baseline.json``)
+- BENCH_SAVE_BASELINE: write this run's medians to the baseline file
+- BENCH_MAX_REGRESSION: allowed slowdown in percent (default 10)
+
+The response cache is disabled so each round reaches the database. Write
+benchmarks add or change a handful of rows, which is negligible next to
+the seeded table.
+"""
+import json
+import os
+from datetime import datetime, timedelta
+import pytest
+from prometheus_client import CollectorRegistry
+from sqlalchemy import insert, literal, select
+from app import create_app
+from app.database import db
+from app.models import Task, TaskChange
+from app.pagination import encode_cursor
+
+if not os.getenv('BENCH_SIZES'):
+    pytest.skip("set BENCH_SIZES to run the benchmark suite", allow_module_level=True)
+pytest.importorskip('pytest_benchmark')
+
+SIZES = [int(size) for size in os.environ['BENCH_SIZES'].split(',') if size.strip()]
+DATABASES = {'sqlite': None}
+if os.getenv('BENCH_POSTGRES_URL'):
+    DATABASES['postgresql'] = os.environ['BENCH_POSTGRES_URL']
+
+ROUNDS = int(os.getenv('BENCH_ROUNDS', '5'))
+BASELINE_PATH = os.getenv('BENCH_BASELINE', os.path.join('.benchmarks', 'baseline.json'))
+SAVE_BASELINE = os.getenv('BENCH_SAVE_BASELINE', '').lower() in ('1', 'true', 'yes')
+MAX_REGRESSION = float(os.getenv('BENCH_MAX_REGRESSION', '10'))
+
+# Rows inserted per statement while seeding
+SEED_CHUNK_SIZE = 10000
+
+
+def _label(size):
+    return f'{size // 1000000}m' if size >= 1000000 and size % 1000000 == 0 else (
+        f'{size // 1000}k' if size >= 1000 and size % 1000 == 0 else str(size))
+
+
+def seed_tasks(size):
+    """Insert ``size`` tasks with a spread of done flags and timestamps, and their change log.
+
+    Bulk inserts skip the ORM flush hook that writes the change log, so the
+    log is filled from the seeded rows afterwards.
+    """
+    start = datetime(2024, 1, 1)
+    for offset in range(0, size, SEED_CHUNK_SIZE):
+        rows = []
+        for i in range(offset, min(offset + SEED_CHUNK_SIZE, size)):
+            created_at = start + timedelta(seconds=i)
+            rows.append({
+                'title': f'Benchmark task {i}',
+                'description': f'Seeded row {i} for the benchmark suite',
+                'done': i % 3 == 0,
+                'created_at': created_at,
+                'updated_at': created_at + timedelta(seconds=i % 600),
+            })
+        db.session.execute(insert(Task), rows)
+        db.session.commit()
+    db.session.execute(insert(TaskChange).from_select(
+        ['task_id', 'op', 'changed_at'],
+        select(Task.id, literal('upsert'), Task.updated_at).order_by(Task.id)
+    ))
+    db.session.commit()
+
+
+@pytest.fixture(scope='module', params=[
+    (database, size) for database in DATABASES for size in SIZES
+], ids=lambda param: f'{param[0]}-{_label(param[1])}')
+def bench_app(request, tmp_path_factory):
+    """An app on a freshly seeded database, shared by every benchmark for one size."""
+    database, size = request.param
+    url = DATABASES[database]
+    if url is None:
+        url = 'sqlite:///' + str(tmp_path_factory.mktemp('bench') / 'bench.db')
+
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': url,
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'FAST_BOOT': True,
+        'TASK_CACHE_BACKEND': 'none',
+        # Production mode; large lists are expected to be slow here
+        'QUERY_DETECTOR_MODE': 'warn',
+    }, registry=CollectorRegistry())[0]
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed_tasks(size)
+        db.session.remove()
+    app.bench_size = size
+    yield app
+    with app.app_context():
+        db.drop_all()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(bench_app):
+    return bench_app.test_client()
+
+
+@pytest.fixture(scope='session')
+def baseline():
+    """Medians from the saved baseline, written back at the end when saving."""
+    medians = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            medians = json.load(f)
+    yield medians
+    if SAVE_BASELINE:
+        os.makedirs(os.path.dirname(BASELINE_PATH) or '.', exist_ok=True)
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(medians, f, indent=2, sort_keys=True)
+
+
+@pytest.fixture
+def bench(benchmark, baseline, request):
+    """Benchmark a request and compare its median with the baseline."""
+    def run(make_request, setup=None, expected_status=200, consume=True):
+        def measured(*args):
+            response = make_request(*args)
+            assert response.status_code == expected_status
+            if consume:
+                # Read streamed bodies so they are part of the measurement
+                response.get_data()
+            response.close()
+
+        benchmark.pedantic(measured, setup=setup, rounds=ROUNDS, warmup_rounds=1, iterations=1)
+        median = benchmark.stats.stats.median
+        name = request.node.name
+        if SAVE_BASELINE:
+            baseline[name] = median
+        elif name in baseline:
+            limit = baseline[name] * (1 + MAX_REGRESSION / 100)
+            if median > limit:
+                pytest.fail(
+                    f"{name} regressed: median {median * 1000:.2f}ms vs baseline "
+                    f"{baseline[name] * 1000:.2f}ms (limit +{MAX_REGRESSION:g}%)"
+                )
+    return run
+
+
+def _middle_id(bench_app):
+    return bench_app.bench_size // 2 or 1
+
+
+def _new_task(client):
+    return (client.post('/api/tasks', json={'title': 'Benchmark scratch task'}).json['id'],), {}
+
+
+def test_health(bench, client):
+    bench(lambda: client.get('/health'))
+
+
+def test_index(bench, client):
+    bench(lambda: client.get('/'))
+
+
+def test_list_tasks(bench, client):
+    bench(lambda: client.get('/api/tasks'))
+
+
+def test_list_tasks_htmx(bench, client):
+    bench(lambda: client.get('/api/tasks', headers={'HX-Request': 'true'}))
+
+
+def test_list_tasks_first_page(bench, client):
+    bench(lambda: client.get('/api/tasks?limit=50'))
+
+
+def test_list_tasks_deep_page(bench, client, bench_app):
+    cursor = encode_cursor({'id': _middle_id(bench_app)})
+    bench(lambda: client.get(f'/api/tasks?limit=50&cursor={cursor}'))
+
+
+def test_list_tasks_filtered(bench, client):
+    bench(lambda: client.get('/api/tasks?done=true&sort=-created_at&limit=50&fields=id,title'))
+
+
+def test_list_tasks_stream(bench, client):
+    bench(lambda: client.get('/api/tasks?stream=1'))
+
+
+def test_list_tasks_conditional(bench, client):
+    etag = client.get('/api/tasks?limit=50').headers['ETag']
+    bench(lambda: client.get('/api/tasks?limit=50', headers={'If-None-Match': etag}), expected_status=304)
+
+
+def test_task_changes(bench, client, bench_app):
+    # The seeded change log is what this endpoint reads
+    assert len(client.get('/api/tasks/changes?limit=100').json['changes']) == min(100, bench_app.bench_size)
+    bench(lambda: client.get('/api/tasks/changes?limit=100'))
+
+
+def test_get_task(bench, client, bench_app):
+    task_id = _middle_id(bench_app)
+    bench(lambda: client.get(f'/api/tasks/{task_id}'))
+
+
+def test_create_task(bench, client):
+    bench(lambda: client.post('/api/tasks', json={'title': 'Benchmark task'}), expected_status=201)
+
+
+def test_update_task(bench, client, bench_app):
+    task_id = _middle_id(bench_app)
+    bench(lambda: client.put(f'/api/tasks/{task_id}'))
+
+
+def test_delete_task(bench, client):
+    bench(lambda task_id: client.delete(f'/api/tasks/{task_id}'),
+          setup=lambda: _new_task(client), expected_status=204)
+
+
+def test_batch_tasks(bench, client):
+    operations = [{'op': 'create', 'title': f'Batch benchmark {i}'} for i in range(100)]
+    bench(lambda: client.post('/api/tasks/batch', json=operations))
+
+
+def test_task_events_connect(bench, client):
+    def connect():
+        response = client.get('/api/tasks/events')
+        # The stream never ends; read the opening frame only
+        next(iter(response.response))
+        return response
+
+    bench(connect, consume=False)
+
+
+def test_metrics(bench, client):
+    bench(lambda: client.get('/metrics'))
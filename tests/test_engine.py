@@ -0,0 +1,157 @@
+import pytest
+from prometheus_client import CollectorRegistry
+from sqlalchemy import create_engine, exc, text
+from app import create_app
+from app.database import db
+from app.engine import InstrumentedAsyncQueuePool, InstrumentedQueuePool, PoolMetrics, engine_options, init_engine
+
+
+@pytest.fixture
+def file_app(tmp_path):
+    """An app over a file-backed SQLite database."""
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}",
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    }, registry=CollectorRegistry())[0]
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_postgres_profile():
+    """Test the Postgres pool sizing, LIFO pooling and keepalives."""
+    options = engine_options('postgresql://user:pass@db/tasks', {'DB_POOL_SIZE': 4, 'DB_MAX_OVERFLOW': 1})
+    assert options['poolclass'] is InstrumentedQueuePool
+    assert options['pool_size'] == 4
+    assert options['max_overflow'] == 1
+    assert options['pool_use_lifo'] is True
+    assert options['pool_pre_ping'] is False
+    assert options['connect_args']['keepalives'] == 1
+
+    # keepalives are libpq options that asyncpg does not take
+    options = engine_options('postgresql+asyncpg://user:pass@db/tasks', {'DB_POOL_SIZE': 4})
+    assert 'connect_args' not in options
+    assert options['poolclass'] is InstrumentedAsyncQueuePool
+    assert options['pool_size'] == 4
+
+
+def test_other_profiles():
+    """Test the SQLite, fallback and overridden engine options."""
+    assert engine_options('sqlite:///tasks.db', {}) == {'poolclass': InstrumentedQueuePool}
+    assert engine_options('sqlite+aiosqlite:///tasks.db', {}) == {'poolclass': InstrumentedAsyncQueuePool}
+    assert engine_options('sqlite:///:memory:', {}) == {}
+    assert engine_options('mysql://user:pass@db/tasks', {}) == {'pool_pre_ping': True, 'pool_recycle': 300}
+
+    options = engine_options('postgresql://user:pass@db/tasks', {
+        'SQLALCHEMY_ENGINE_OPTIONS': {'pool_pre_ping': True, 'pool_size': 20},
+    })
+    assert options['pool_pre_ping'] is True
+    assert options['pool_size'] == 20
+
+
+def test_sqlite_pragmas(file_app):
+    """Test that new SQLite connections use WAL, NORMAL sync, mmap and a busy timeout."""
+    with db.engine.connect() as connection:
+        assert connection.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+        assert connection.execute(text('PRAGMA synchronous')).scalar() == 1
+        assert connection.execute(text('PRAGMA busy_timeout')).scalar() == 5000
+        assert connection.execute(text('PRAGMA mmap_size')).scalar() == 256 * 1024 * 1024
+
+
+def test_pool_metrics(file_app):
+    """Test that checkouts are timed and checked out connections counted."""
+    registry = CollectorRegistry()
+    metrics = PoolMetrics(registry)
+    engine = create_engine(db.engine.url, poolclass=InstrumentedQueuePool)
+    init_engine(engine, file_app.config, metrics)
+    # Capacity is reported by the process that connects
+    assert registry.get_sample_value('task_db_pool_capacity') == 0
+
+    with engine.connect():
+        assert registry.get_sample_value('task_db_pool_checked_out') == 1
+        assert registry.get_sample_value('task_db_pool_capacity') == 15
+    assert registry.get_sample_value('task_db_pool_checked_out') == 0
+    assert registry.get_sample_value('task_db_pool_checkout_seconds_count') == 1
+
+    # A disposed engine keeps reporting through its new pool
+    engine.dispose()
+    with engine.connect():
+        pass
+    assert registry.get_sample_value('task_db_pool_checkout_seconds_count') == 2
+    engine.dispose()
+    assert registry.get_sample_value('task_db_pool_capacity') == 15
+
+    metrics.clear_capacity()
+    assert registry.get_sample_value('task_db_pool_capacity') == 0
+
+
+def test_pool_timeout_metric(tmp_path):
+    """Test that a checkout giving up on a full pool is counted."""
+    registry = CollectorRegistry()
+    metrics = PoolMetrics(registry)
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=InstrumentedQueuePool,
+                           pool_size=1, max_overflow=0, pool_timeout=0.01)
+    init_engine(engine, {}, metrics)
+    with engine.connect():
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+    assert registry.get_sample_value('task_db_pool_timeouts_total') == 1
+    engine.dispose()
+
+
+def test_app_pool_metrics(file_app):
+    """Test that the app's engine reports into the /metrics pool series."""
+    client = file_app.test_client()
+    assert client.post('/api/tasks', json={'title': 'Pooled'}).status_code == 201
+    # The fixture's app context outlives the request; end its session as
+    # request teardown would
+    db.session.remove()
+    data = client.get('/metrics').data
+    assert b'task_db_pool_checkout_seconds_count' in data
+    assert b'task_db_pool_checked_out 0.0' in data
+
+
+FORKED_WORKERS = """
+import os, runpy, sys
+from types import SimpleNamespace
+from prometheus_client import CollectorRegistry
+from prometheus_client.multiprocess import MultiProcessCollector
+from app import create_app
+
+hooks = runpy.run_path('gunicorn.conf.py')
+app = create_app({'SQLALCHEMY_DATABASE_URI': sys.argv[1]})[0]
+server = SimpleNamespace(cfg=SimpleNamespace(preload_app=True), app=SimpleNamespace(wsgi=lambda: app))
+
+pids = []
+for worker in range(2):
+    hooks['pre_fork'](server, worker)
+    pid = os.fork()
+    if pid == 0:
+        hooks['post_fork'](server, worker)
+        app.test_client().get('/api/tasks')
+        os._exit(0)
+    os.waitpid(pid, 0)
+
+registry = CollectorRegistry()
+MultiProcessCollector(registry, os.environ['PROMETHEUS_MULTIPROC_DIR'])
+print(registry.get_sample_value('task_db_pool_capacity'))
+"""
+
+
+def test_pool_capacity_per_worker(tmp_path):
+    """Test that two workers forked from a preloaded master each report their own pool capacity."""
+    import os
+    import subprocess
+    import sys
+    metrics_dir = tmp_path / 'metrics'
+    metrics_dir.mkdir()
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(metrics_dir), TASK_EVENTS_BACKEND='none')
+    result = subprocess.run(
+        [sys.executable, '-c', FORKED_WORKERS, f"sqlite:///{tmp_path / 'app.db'}"],
+        cwd=os.path.dirname(os.path.dirname(__file__)), env=env, capture_output=True, text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    # Two pools of 15 (pool_size 5 + max_overflow 10); nothing from the master
+    assert float(result.stdout.split()[-1]) == 30
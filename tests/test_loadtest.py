@@ -0,0 +1,72 @@
+import threading
+import pytest
+from prometheus_client import CollectorRegistry
+from werkzeug.serving import make_server
+from app import create_app
+from app.loadtest import (
+    GunicornServer, ServerConfig, format_report, parse_configs, parse_mix, percentile, run_load, seed_tasks
+)
+
+
+@pytest.fixture
+def server_url(tmp_path):
+    """Serve the app from a threaded werkzeug server on a free port."""
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'load.db'),
+        # Concurrent SQLite writers can wait past the slow query threshold
+        'QUERY_DETECTOR_MODE': 'warn',
+    }, registry=CollectorRegistry())[0]
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+
+
+def test_percentile():
+    """Test nearest-rank percentiles."""
+    values = list(range(1, 101))
+    assert percentile(values, 0.5) == 50
+    assert percentile(values, 0.95) == 95
+    assert percentile(values, 0.99) == 99
+    assert percentile([7], 0.99) == 7
+    assert percentile([], 0.5) == 0.0
+
+
+def test_parse_mix_and_configs():
+    """Test parsing of the request mix and worker configurations."""
+    assert parse_mix('read=80,htmx=20') == {'read': 80.0, 'htmx': 20.0}
+    with pytest.raises(ValueError):
+        parse_mix('delete=10')
+    with pytest.raises(ValueError):
+        parse_mix('read=0')
+    assert parse_configs('sync:2,gthread:2x4,uvicorn') == [
+        ServerConfig('sync', 2, 1), ServerConfig('gthread', 2, 4), ServerConfig('uvicorn', 1, 1)
+    ]
+    with pytest.raises(ValueError):
+        parse_configs('eventlet:2')
+
+
+def test_run_load_reports_latency(server_url):
+    """Test concurrent clients drive every request kind and report percentiles."""
+    task_ids = seed_tasks(server_url, 20)
+    assert len(task_ids) == 20
+
+    result = run_load(server_url, concurrency=4, duration=0.5, task_ids=task_ids)
+    assert result.requests > 0
+    assert result.errors == 0
+    assert set(result.by_kind) == {'read', 'write', 'htmx'}
+    assert result.p50 <= result.p95 <= result.p99
+    assert result.throughput == pytest.approx(result.requests / result.duration)
+    assert 'req/s' in format_report([('local', result)])
+
+
+def test_gunicorn_server():
+    """Test a real gunicorn from gunicorn.conf.py can be started and loaded."""
+    pytest.importorskip('gunicorn')
+    with GunicornServer(ServerConfig('gthread', 1, 2)) as server:
+        result = run_load(server.url, concurrency=2, duration=0.3, mix={'read': 1})
+    assert result.requests > 0
+    assert result.errors == 0
+    assert server.process.poll() is not None
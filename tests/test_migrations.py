@@ -0,0 +1,106 @@
+import pytest
+from prometheus_client import CollectorRegistry
+from sqlalchemy import create_engine, inspect, text
+from app import create_app, migrate
+from app.database import db
+from app.migrate import check_schema, current_version, discover_migrations, upgrade
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """A file-backed SQLite engine for running migrations against."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrate.db'}")
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def app(tmp_path):
+    """An app over an unmigrated file-backed database."""
+    app = create_app({
+        'TESTING': True,
+        'FAST_BOOT': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}",
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    }, registry=CollectorRegistry())[0]
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def runner(app):
+    return app.test_cli_runner()
+
+
+def test_discover_migrations_in_order():
+    """Test that migration scripts are found and ordered by version."""
+    versions = [migration.version for migration in discover_migrations()]
+    assert versions == sorted(versions)
+    assert versions[:3] == [1, 2, 3]
+
+
+def test_upgrade_fresh_database(engine):
+    """Test upgrading an empty database to the latest version."""
+    applied = upgrade(engine)
+    latest = discover_migrations()[-1].version
+
+    assert [migration.version for migration in applied][-1] == latest
+    assert current_version(engine) == latest
+    columns = {column['name'] for column in inspect(engine).get_columns('task')}
+    assert {'id', 'title', 'description', 'done', 'created_at', 'updated_at'} <= columns
+
+    # Running again is a no-op
+    assert upgrade(engine) == []
+
+
+def test_upgrade_legacy_database_backfills_in_batches(engine, monkeypatch):
+    """Test upgrading an unversioned database with rows missing timestamps."""
+    with engine.begin() as connection:
+        connection.execute(text(
+            'CREATE TABLE task (id INTEGER PRIMARY KEY, title VARCHAR(100) NOT NULL, '
+            'description VARCHAR(500), done BOOLEAN)'
+        ))
+        for i in range(7):
+            connection.execute(text('INSERT INTO task (title) VALUES (:title)'), {'title': f'Legacy {i}'})
+
+    monkeypatch.setattr(migrate, 'BACKFILL_BATCH_SIZE', 3)
+    upgrade(engine)
+
+    with engine.connect() as connection:
+        missing = connection.execute(text(
+            'SELECT count(*) FROM task WHERE created_at IS NULL OR updated_at IS NULL'
+        )).scalar()
+    assert missing == 0
+
+
+def test_upgrade_to_target(engine):
+    """Test stopping at a target version."""
+    upgrade(engine, target=1)
+    assert current_version(engine) == 1
+    columns = {column['name'] for column in inspect(engine).get_columns('task')}
+    assert 'created_at' not in columns
+
+
+def test_check_schema_at_startup(app, caplog):
+    """Test that startup only warns about pending migrations unless AUTO_MIGRATE is set."""
+    app.config['AUTO_MIGRATE'] = False
+    check_schema(app)
+    assert current_version(db.engine) == 0
+    assert 'flask db upgrade' in caplog.text
+
+    app.config['AUTO_MIGRATE'] = True
+    check_schema(app)
+    assert current_version(db.engine) == discover_migrations()[-1].version
+
+
+def test_db_cli_commands(runner):
+    """Test the flask db CLI group."""
+    result = runner.invoke(args=['db', 'upgrade'])
+    assert result.exit_code == 0
+    assert 'schema is at version' in result.output
+
+    result = runner.invoke(args=['db', 'current'])
+    assert result.exit_code == 0
+    assert 'Applied version' in result.output
@@ -0,0 +1,101 @@
+import os
+from prometheus_client import CollectorRegistry, generate_latest
+from prometheus_client.mmap_dict import MmapedDict, mmap_key
+from app import create_app
+from app.multiprocess import LockedMultiProcessCollector, compact_dead_worker, prepare_multiproc_dir
+
+
+def write_samples(path, filename, samples):
+    """Write ``(metric, sample, labels, value)`` tuples to a worker's mmap file."""
+    values = MmapedDict(os.path.join(path, filename))
+    for metric_name, name, labels, value in samples:
+        key = mmap_key(metric_name, name, list(labels), list(labels.values()), f'{metric_name} help')
+        values.write_value(key, value, 0.0)
+    values.close()
+
+
+def write_worker(path, pid, operations, latency):
+    write_samples(path, f'counter_{pid}.db', [
+        ('task_operations', 'task_operations_total', {'operation': 'create'}, operations),
+    ])
+    write_samples(path, f'histogram_{pid}.db', [
+        ('latency', 'latency_bucket', {'le': '0.1'}, latency[0]),
+        ('latency', 'latency_bucket', {'le': '+Inf'}, latency[1]),
+        ('latency', 'latency_sum', {}, latency[2]),
+    ])
+
+
+def scrape(path):
+    registry = CollectorRegistry()
+    LockedMultiProcessCollector(registry, str(path))
+    return registry
+
+
+def test_compaction_keeps_totals(tmp_path):
+    """Test that folding dead workers into the archives keeps every total."""
+    write_worker(tmp_path, 100, 3, (2, 1, 0.5))
+    write_worker(tmp_path, 101, 4, (1, 0, 0.05))
+    write_worker(tmp_path, 102, 5, (0, 2, 1.0))
+    before = generate_latest(scrape(tmp_path))
+
+    assert compact_dead_worker(100, str(tmp_path)) == 2
+    assert compact_dead_worker(101, str(tmp_path)) == 2
+    assert generate_latest(scrape(tmp_path)) == before
+    assert sorted(name for name in os.listdir(tmp_path) if name.endswith('.db')) == [
+        'counter_102.db', 'counter_archive.db', 'histogram_102.db', 'histogram_archive.db',
+    ]
+
+    registry = scrape(tmp_path)
+    assert registry.get_sample_value('task_operations_total', {'operation': 'create'}) == 12
+    assert registry.get_sample_value('latency_bucket', {'le': '0.1'}) == 3
+    assert registry.get_sample_value('latency_bucket', {'le': '+Inf'}) == 6
+    assert registry.get_sample_value('latency_count') == 6
+    assert registry.get_sample_value('latency_sum') == 1.55
+
+
+def test_compaction_of_gauges(tmp_path):
+    """Test that live and per-process gauges are dropped and max gauges archived."""
+    write_samples(tmp_path, 'gauge_livesum_100.db', [('in_progress', 'in_progress', {}, 2)])
+    write_samples(tmp_path, 'gauge_all_100.db', [('memory', 'memory', {}, 64)])
+    write_samples(tmp_path, 'gauge_max_100.db', [('app_info', 'app_info', {'version': '1.0.0'}, 1)])
+    write_samples(tmp_path, 'gauge_max_101.db', [('app_info', 'app_info', {'version': '1.0.0'}, 1)])
+
+    compact_dead_worker(100, str(tmp_path))
+    assert sorted(name for name in os.listdir(tmp_path) if name.endswith('.db')) == [
+        'gauge_max_101.db', 'gauge_max_archive.db',
+    ]
+    registry = scrape(tmp_path)
+    assert registry.get_sample_value('in_progress') is None
+    assert registry.get_sample_value('memory', {'pid': '100'}) is None
+    assert registry.get_sample_value('app_info', {'version': '1.0.0'}) == 1
+
+
+def test_compaction_without_files(tmp_path):
+    """Test compacting a worker that never wrote a metric."""
+    assert compact_dead_worker(100, str(tmp_path)) == 0
+
+
+def test_prepare_multiproc_dir(tmp_path):
+    """Test that files of a previous run are removed."""
+    path = tmp_path / 'metrics'
+    prepare_multiproc_dir(str(path))
+    write_worker(path, 100, 1, (1, 0, 0.1))
+    (path / 'counter_archive.db.tmp').write_bytes(b'')
+    prepare_multiproc_dir(str(path))
+    assert [name for name in os.listdir(path) if name.endswith(('.db', '.tmp'))] == []
+
+
+def test_metrics_endpoint_merges_workers(tmp_path, monkeypatch):
+    """Test that /metrics reports the samples of every worker in multiprocess mode."""
+    write_worker(tmp_path, 100, 3, (1, 0, 0.1))
+    write_worker(tmp_path, 101, 4, (1, 0, 0.1))
+    compact_dead_worker(100, str(tmp_path))
+    monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(tmp_path))
+
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+    }, registry=CollectorRegistry())[0]
+    response = app.test_client().get('/metrics')
+    assert response.status_code == 200
+    assert b'task_operations_total{operation="create"} 7.0' in response.data
@@ -93,4 +93,21 @@ def test_concurrent_requests_performance(client):
     
     # Should handle 50 concurrent requests in under 2 seconds
     assert total_time < 2.0
-    assert total_time / 50 < 0.04  # Average time per request should be under 40ms 
\ No newline at end of file
+    assert total_time / 50 < 0.04  # Average time per request should be under 40ms
+
+
+def test_batch_create_performance(client):
+    """Test performance of creating tasks through the batch endpoint."""
+    operations = [{
+        'op': 'create',
+        'title': f'Batch Performance Task {i}',
+        'description': f'Testing batch creation performance {i}'
+    } for i in range(1000)]
+
+    start_time = time.time()
+    response = client.post('/api/tasks/batch', json={'operations': operations})
+    end_time = time.time()
+
+    assert response.status_code == 200
+    assert len(response.json['results']) == 1000
+    assert end_time - start_time < 2.0  # 1000 tasks in one transaction should take under 2 seconds
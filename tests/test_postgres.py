@@ -0,0 +1,107 @@
+"""Tests that need a real Postgres server.
+
+Skipped unless TEST_POSTGRES_URL points at a scratch database; CI uses its
+postgres service. The tables are dropped afterwards.
+"""
+import os
+import threading
+import pytest
+from prometheus_client import CollectorRegistry
+from sqlalchemy import update
+from app import create_app
+from app.changes import record_changes
+from app.database import db
+from app.models import Task
+
+POSTGRES_URL = os.getenv('TEST_POSTGRES_URL')
+if not POSTGRES_URL:
+    pytest.skip("set TEST_POSTGRES_URL to run the Postgres tests", allow_module_level=True)
+pytest.importorskip('psycopg2')
+
+
+@pytest.fixture
+def app():
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': POSTGRES_URL,
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    }, registry=CollectorRegistry())[0]
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def rename(connection, task_id, title):
+    """Update a task and log it the way the batch endpoint does."""
+    connection.execute(update(Task).where(Task.id == task_id).values(title=title))
+    record_changes(connection, [(task_id, 'upsert')])
+
+
+class InterleavedWrites:
+    """Two writes where the first to log its change is the last to commit.
+
+    ``slow`` logs a change and stays open; ``fast`` then writes in a thread
+    and commits as soon as it can.
+    """
+
+    def __init__(self, slow_id, fast_id):
+        self.engine = db.engine
+        self.slow = self.engine.connect()
+        self.slow_transaction = self.slow.begin()
+        rename(self.slow, slow_id, 'slow')
+        self.fast_committed = threading.Event()
+        self.thread = threading.Thread(target=self._fast, args=(fast_id,))
+        self.thread.start()
+
+    def _fast(self, task_id):
+        with self.engine.begin() as connection:
+            rename(connection, task_id, 'fast')
+        self.fast_committed.set()
+
+    def finish(self):
+        self.slow_transaction.commit()
+        self.slow.close()
+        self.thread.join(timeout=10)
+        assert self.fast_committed.is_set()
+
+
+def test_sync_token_does_not_skip_late_commits(client):
+    """Test that a change committing after a higher-numbered one is still synced."""
+    first = client.post('/api/tasks', json={'title': 'First'}).json['id']
+    second = client.post('/api/tasks', json={'title': 'Second'}).json['id']
+    since = client.get('/api/tasks/changes').json['next_since']
+
+    writes = InterleavedWrites(first, second)
+    # Give the later write the chance to commit first
+    writes.fast_committed.wait(0.5)
+    response = client.get(f'/api/tasks/changes?since={since}')
+    synced = {change['task']['id'] for change in response.json['changes']}
+    since = response.json['next_since']
+
+    writes.finish()
+    response = client.get(f'/api/tasks/changes?since={since}')
+    synced |= {change['task']['id'] for change in response.json['changes']}
+    assert synced == {first, second}
+
+
+def test_list_version_moves_with_late_commits(client):
+    """Test that the list ETag and cached list change when a lower-numbered write commits last."""
+    first = client.post('/api/tasks', json={'title': 'First'}).json['id']
+    second = client.post('/api/tasks', json={'title': 'Second'}).json['id']
+
+    writes = InterleavedWrites(first, second)
+    writes.fast_committed.wait(0.5)
+    etag = client.get('/api/tasks').headers['ETag']
+
+    writes.finish()
+    response = client.get('/api/tasks', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert [task['title'] for task in response.json] == ['slow', 'fast']
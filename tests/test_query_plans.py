@@ -0,0 +1,94 @@
+from datetime import datetime
+import pytest
+from prometheus_client import CollectorRegistry
+from sqlalchemy import event, text
+from app import create_app
+from app.conditional import collection_version
+from app.database import db
+from app.models import Task
+from app.queries import build_select, parse_task_query
+
+
+@pytest.fixture
+def app():
+    """An app whose schema was built by the migrations, as in production."""
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    }, registry=CollectorRegistry())[0]
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+def executed_plan(run):
+    """Call ``run`` and return SQLite's EXPLAIN QUERY PLAN, as one string, for the one statement it executes."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        run()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+    (statement, parameters), = statements
+    rows = db.session.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).all()
+    return '\n'.join(row[-1] for row in rows)
+
+
+def task_query_plan(args, after=None, limit=50):
+    """Plan of the SELECT that GET /api/tasks builds for the query parameters ``args``."""
+    statement = build_select(parse_task_query(args), db.engine.dialect.name, after=after, limit=limit)
+    return executed_plan(lambda: db.session.execute(statement).all())
+
+
+def test_model_and_migration_indexes_match(app):
+    """Test that the migrations create every index the model declares."""
+    declared = {index.name for index in Task.__table__.indexes}
+    created = {row[1] for row in db.session.execute(text("PRAGMA index_list('task')"))}
+    assert declared <= created
+
+
+def test_filter_by_done_sorted_by_created_at_uses_index(app):
+    """Test the done filter + created_at sort is an index range scan without a sort step."""
+    for after in (None, (10, datetime(2024, 1, 1))):
+        plan = task_query_plan({'done': 'false', 'sort': 'created_at'}, after=after)
+        assert 'ix_task_done_created_at_id' in plan
+        assert 'TEMP B-TREE' not in plan
+
+
+def test_sort_by_created_at_uses_index(app):
+    """Test created_at filters and keyset pages in either direction read the (created_at, id) index."""
+    plan = task_query_plan({'created_after': '2024-01-01T00:00:00', 'sort': 'created_at'})
+    assert 'ix_task_created_at_id' in plan
+    assert 'TEMP B-TREE' not in plan
+
+    for sort in ('created_at', '-created_at'):
+        plan = task_query_plan({'sort': sort}, after=(10, datetime(2024, 1, 1)))
+        assert 'ix_task_created_at_id' in plan
+        assert 'TEMP B-TREE' not in plan
+
+
+def test_updated_since_uses_index(app):
+    """Test "changed since" lookups search the updated_at index."""
+    plan = task_query_plan({'updated_since': '2024-01-01T00:00:00', 'sort': 'updated_at'}, limit=None)
+    assert 'ix_task_updated_at_id' in plan
+    assert 'TEMP B-TREE' not in plan
+
+
+def test_collection_version_reads_one_change_log_row(app):
+    """Test the list version is read from the end of the change log's primary key, without a sort."""
+    plan = executed_plan(collection_version)
+    assert 'task_change' in plan
+    assert 'TEMP B-TREE' not in plan
+
+
+def test_keyset_page_by_id_uses_primary_key(app):
+    """Test the default keyset page is a primary key range scan in either direction."""
+    for sort in ('id', '-id'):
+        plan = task_query_plan({'sort': sort, 'fields': 'id,title'}, after=(10, None))
+        assert 'PRIMARY KEY' in plan
+        assert 'TEMP B-TREE' not in plan
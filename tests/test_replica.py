@@ -0,0 +1,104 @@
+import time
+import pytest
+from prometheus_client import CollectorRegistry
+from sqlalchemy import text
+from app import create_app
+from app.database import REPLICA_BIND, db
+from app.migrate import upgrade
+from app.replica import REPLICA_STICKY_COOKIE
+
+
+@pytest.fixture
+def app(tmp_path):
+    """An app whose primary and replica are two separate SQLite files.
+
+    Nothing copies writes across, so a row only on the replica shows which
+    database a read went to.
+    """
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'primary.db'}",
+        'SQLALCHEMY_REPLICA_URI': f"sqlite:///{tmp_path / 'replica.db'}",
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'TASK_CACHE_BACKEND': 'none',
+    }, registry=CollectorRegistry())[0]
+    with app.app_context():
+        upgrade(db.engines[REPLICA_BIND])
+        with db.engines[REPLICA_BIND].begin() as connection:
+            connection.execute(text(
+                "INSERT INTO task (title, description, done, created_at, updated_at) "
+                "VALUES ('On the replica', '', 0, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+            ))
+        yield app
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def titles(response):
+    return [task['title'] for task in response.json]
+
+
+def test_reads_go_to_replica(client):
+    """Test that the GET views read from the replica."""
+    assert titles(client.get('/api/tasks')) == ['On the replica']
+    assert client.get('/api/tasks/1').json['title'] == 'On the replica'
+    assert b'On the replica' in client.get('/').data
+    assert client.get('/health').status_code == 200
+
+
+def test_writes_go_to_primary(app, client):
+    """Test that writes land on the primary and not on the replica."""
+    response = client.post('/api/tasks', json={'title': 'On the primary'})
+    assert response.status_code == 201
+    with db.engines[None].connect() as connection:
+        assert connection.execute(text('SELECT title FROM task')).scalars().all() == ['On the primary']
+    with db.engines[REPLICA_BIND].connect() as connection:
+        assert connection.execute(text('SELECT title FROM task')).scalars().all() == ['On the replica']
+
+
+def test_read_your_writes(app, client):
+    """Test that a client reads from the primary for a while after it writes."""
+    response = client.post('/api/tasks', json={'title': 'On the primary'})
+    assert REPLICA_STICKY_COOKIE in response.headers['Set-Cookie']
+    assert titles(client.get('/api/tasks')) == ['On the primary']
+
+    # Another client still reads the replica
+    assert titles(app.test_client().get('/api/tasks')) == ['On the replica']
+
+    # Once the window has passed the client is back on the replica
+    client.set_cookie(REPLICA_STICKY_COOKIE, f'{time.time() - 1:.3f}')
+    assert titles(client.get('/api/tasks')) == ['On the replica']
+
+
+def test_failed_write_is_not_sticky(client):
+    """Test that a rejected write does not move the client to the primary."""
+    response = client.post('/api/tasks', json={})
+    assert response.status_code == 400
+    assert 'Set-Cookie' not in response.headers
+    assert titles(client.get('/api/tasks')) == ['On the replica']
+
+
+def test_sticky_client_skips_stale_cache(tmp_path):
+    """Test that a client in its read-your-writes window is not served cached replica reads."""
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'primary.db'}",
+        'SQLALCHEMY_REPLICA_URI': f"sqlite:///{tmp_path / 'replica.db'}",
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    }, registry=CollectorRegistry())[0]
+    with app.app_context():
+        upgrade(db.engines[REPLICA_BIND])
+        writer = app.test_client()
+        writer.post('/api/tasks', json={'title': 'On the primary'})
+        # Another client caches the (stale) replica view
+        assert app.test_client().get('/api/tasks').json == []
+        assert titles(writer.get('/api/tasks')) == ['On the primary']
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()